@@ -0,0 +1,265 @@
+"""
+Batch race simulator: races N networks at once, each car alone on the same track, with the kinematic model of
+kinematics.py and a single batched forward pass of the N networks per time step (nn.PopulationRecurrentBatch).
+
+The cars are driven as the pytocl drivers (Driver2 or Driver1) would drive them on the SCRC server of
+scrc_server.py, and the statistics of each car are collected as MyDriver does, so that the result rows of each
+network have the format of MyDriver.append_current_results:
+    [time, distance, laps, distance_from_start, damage, penalty, avg_speed]
+one row every 100 time steps plus a final one when the car finishes the race or the time is over.
+
+Usage, to race saved networks (pickle files) on a configuration's track:
+    python batch_race.py [-t track_file] [--timelimit seconds] configuration.xml model.pickle...
+"""
+from __future__ import print_function
+
+import argparse
+import math
+import os.path
+import pickle
+import sys
+
+import numpy as np
+
+import kinematics
+import scrc_server
+
+FILE_PATH = os.path.realpath(__file__)
+DIR_PATH = os.path.dirname(FILE_PATH)
+
+sys.path.insert(0, os.path.join(DIR_PATH, '../../'))
+
+from neatsociety import nn
+
+
+#race duration when no time limit is given (seconds)
+default_timelimit = 300.0
+
+#the drivers append their results every 'results_interval' time steps
+results_interval = 100
+
+
+class BatchRace(object):
+    """
+    Race of 'networks' (RecurrentNetwork or CompiledRecurrentNetwork, with the same inputs and outputs) on
+    'track': every car races alone, starting from the first position of the grid, for 'laps' laps or until
+    'timelimit' seconds of race. 'driver' is the pytocl driver whose outputs and inputs are reproduced.
+    """
+
+    def __init__(self, track, networks, laps=1, timelimit=None, timestep=0.02, driver='Driver2', unstuck=False,
+                 angles=scrc_server.default_angles):
+        if driver not in ('Driver1', 'Driver2'):
+            raise ValueError('Unknown driver {!r} (Driver1 or Driver2)'.format(driver))
+
+        self.track = track
+        self.laps = laps
+        self.timelimit = default_timelimit if timelimit is None else timelimit
+        self.timestep = timestep
+        self.driver = driver
+        self.unstuck = unstuck
+
+        self.batch = nn.PopulationRecurrentBatch(networks)
+        count = self.batch.num_networks
+
+        #range finders directions (degrees positive on the right, as configured by the clients)
+        self.angles = np.radians(-np.asarray(angles, dtype=float))
+        #Driver2 networks with 13 inputs only see one range finder every three
+        smaller = driver == 'Driver2' and self.batch.input_size() == 13
+        self.edges_step = 3 if smaller else 1
+        num_edges = len(range(0, len(angles), self.edges_step))
+        if self.batch.input_size() != num_edges + 6:
+            raise ValueError('The networks have {} inputs, the {} expects {}'.format(
+                self.batch.input_size(), driver, num_edges + 6))
+        self.inputs = np.zeros((count, num_edges + 6))
+
+        self.cars = kinematics.Cars(track, count, np.full(count, -scrc_server.grid_distance))
+
+    def sensor_inputs(self, edges, track_position):
+        """ Network inputs of every car (see pytocl.car.State.to_input_array) """
+        cars = self.cars
+        inputs = self.inputs
+        inputs[:, 0] = -cars.psi / math.pi
+        inputs[:, 1] = cars.speed / 40.0
+        inputs[:, 2] = 0.0
+        edges = edges[:, ::self.edges_step] / 200.0
+        edges[(edges < 0) | (np.abs(track_position) > 1)[:, np.newaxis]] = -1.0
+        inputs[:, 3:-3] = edges
+        inputs[:, -3] = track_position
+        #z of the car (0.35) - 0.36, no vertical speed
+        inputs[:, -2] = -0.01
+        inputs[:, -1] = 0.0
+        return inputs
+
+    def commands(self, output, angle, track_position, stuck_count):
+        """ Commands of every car from the network outputs (see Driver2.drive and Driver1.drive) """
+        cars = self.cars
+        output = np.where(np.isnan(output), 0.0, output)
+        count = cars.count
+
+        current_gear = cars.gear.copy()
+        if self.unstuck:
+            current_gear[current_gear <= 0] = 1
+        gear = current_gear
+
+        if self.driver == 'Driver2':
+            accelerator = np.maximum(output[:, 0], 0.0)
+            brake = np.where(output[:, 0] > 0, 0.0, -output[:, 0])
+            steering = output[:, 1] - (output[:, 2] if output.shape[1] > 2 else 0.0)
+        else:
+            accelerator = output[:, 0]
+            brake = output[:, 1]
+            steering = output[:, 2] - (output[:, 3] if output.shape[1] > 3 else 0.0)
+
+        #MyDriver.shift
+        gear = np.where((gear >= 0) & (brake < 0.1) & (cars.rpm > 8000), np.minimum(6, gear + 1), gear)
+        gear = np.where((cars.rpm < 2500) & (gear > 1), gear - 1, gear)
+        gear = np.where(gear == 0, np.where(current_gear == 0, 1, current_gear), gear)
+
+        if self.unstuck:
+            #MyDriver.reverse
+            stuck = stuck_count > 100
+            accelerator = np.where(stuck, 1.0, accelerator)
+            brake = np.where(stuck, 0.0, brake)
+            gear = np.where(stuck, -1, gear)
+            steering = np.where(stuck, -angle * np.pi / (180.0 * 0.785398), steering)
+
+        return accelerator, brake, np.broadcast_to(gear, (count,)), steering
+
+    def run(self):
+        """ Runs the race and returns the list of the result rows of each network """
+
+        cars = self.cars
+        track = self.track
+        count = cars.count
+        self.batch.reset()
+
+        results = [[] for _ in range(count)]
+        racing = np.ones(count, dtype=bool)
+        crossings = np.zeros(count, dtype=int)
+        stuck_count = np.zeros(count, dtype=int)
+
+        #statistics of the drivers (see MyDriver.update)
+        distance = np.zeros(count)
+        distance_from_start = np.zeros(count)
+        laps = np.full(count, -1)
+        damage = np.zeros(count)
+        offroad_penalty = np.zeros(count)
+        avg_speed = np.zeros(count)
+
+        def append_results(time, iterations, cars_indices):
+            penalty = np.sqrt(offroad_penalty / max(iterations, 1))
+            speed = avg_speed / max(iterations, 1)
+            for i in cars_indices:
+                results[i].append([time, float(distance[i]), int(laps[i]), float(distance_from_start[i]),
+                                   int(damage[i]), float(penalty[i]), float(speed[i])])
+
+        time = 0.0
+        iterations = 0
+        while racing.any() and time < self.timelimit:
+            track_position = cars.track_position()
+            edges = track.edge_distances(cars.s, cars.d, cars.psi, self.angles)
+            angle = -np.degrees(cars.psi)
+
+            #MyDriver.update
+            distance = np.where(racing, cars.distance_raced, distance)
+            distance_from_start = np.where(racing, np.mod(cars.s, track.length), distance_from_start)
+            laps = np.where(racing, crossings - 1, laps)
+            damage = np.where(racing, cars.damage, damage)
+            offroad_penalty += racing * np.maximum(0.0, np.abs(track_position) - 0.95) ** 2
+            avg_speed += racing * cars.speed * np.cos(cars.psi)
+            iterations += 1
+            if iterations % results_interval == 0:
+                append_results(time, iterations, np.flatnonzero(racing))
+
+            if self.unstuck:
+                threshold = 0.95 if self.driver == 'Driver2' else 0.9
+                stuck = ((cars.speed < 2) & (np.abs(track_position) > threshold) & (np.abs(angle) > 15)
+                         & (angle * track_position < 0))
+                stuck_count = np.where(stuck, stuck_count + 1, 0)
+
+            output = self.batch.activate(self.sensor_inputs(edges, track_position))
+            cars.step(self.timestep, *self.commands(output, angle, track_position, stuck_count))
+
+            crossings = np.maximum(crossings, np.floor(cars.s / track.length).astype(int) + 1)
+            finished = racing & (crossings > self.laps)
+            if finished.any():
+                #the race of these cars is over: they receive the shutdown message, and the drivers append the
+                #results of their last update
+                append_results(time, iterations, np.flatnonzero(finished))
+                racing &= ~finished
+            time += self.timestep
+
+        append_results(time - self.timestep, iterations, np.flatnonzero(racing))
+        return results
+
+
+def evaluate(networks, configuration, track_file=None, timelimit=None, unstuck=False, driver='Driver2', **kwargs):
+    """
+    Races the networks on the track of a TORCS race configuration (see scrc_server.server_from_configuration)
+    and returns their lists of result rows, as simulation.EvaluationFarm.evaluate does.
+    """
+
+    race = kinematics.read_configuration(configuration)
+    if track_file is not None:
+        track = kinematics.load_track(track_file)
+    else:
+        track = kinematics.builtin_track(race['name'], race['category'])
+
+    return BatchRace(track, networks, laps=race['laps'], timelimit=timelimit, driver=driver, unstuck=unstuck,
+                     **kwargs).run()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Race saved networks at once on the kinematic model of a track'
+    )
+
+    parser.add_argument(
+        'configuration',
+        help='TORCS race configuration (track name and laps)',
+        type=str
+    )
+
+    parser.add_argument(
+        'models',
+        help='Pickled networks to race',
+        type=str,
+        nargs='+'
+    )
+
+    parser.add_argument(
+        '-t',
+        '--track',
+        help='Track file to race on, instead of the built-in model of the configuration\'s track',
+        type=str,
+        default=None
+    )
+
+    parser.add_argument(
+        '--timelimit',
+        help='Maximum (simulated) duration of the race, in seconds',
+        type=float,
+        default=None
+    )
+
+    parser.add_argument(
+        '-d',
+        '--driver',
+        help='Driver reproduced: Driver2 (default) or Driver1',
+        type=str,
+        default='Driver2'
+    )
+
+    args = parser.parse_args()
+
+    networks = []
+    for path in args.models:
+        with open(path, 'rb') as f:
+            networks.append(pickle.load(f))
+
+    for path, values in zip(args.models, evaluate(networks, args.configuration, args.track, args.timelimit,
+                                                  driver=args.driver)):
+        duration, distance, laps, distance_from_start, damage, penalty, avg_speed = values[-1]
+        print('{}: {} laps, {:.1f} m raced in {:.2f} s, damage {}, penalty {:.4f}, average speed {:.2f} m/s'.format(
+            path, laps, distance, duration, damage, penalty, avg_speed))
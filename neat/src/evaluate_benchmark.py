@@ -0,0 +1,98 @@
+"""
+Benchmark of the overhead of simulation.evaluate (starting, supervising and stopping the client and the server,
+reading the results) with the stub server and client of stub_race.py, whose races last --duration seconds.
+
+Another version of simulation.py can be measured with --simulation, e.g. the previous simulation.py (before the
+exit pipe), which supervises the client with fixed sleeps, saved from the history of the repository:
+
+    python evaluate_benchmark.py --simulation /path/to/previous/simulation.py
+"""
+from __future__ import print_function
+
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+FILE_PATH = os.path.realpath(__file__)
+DIR_PATH = os.path.dirname(FILE_PATH)
+
+STUB = os.path.join(DIR_PATH, 'stub_race.py')
+CONFIGURATION = os.path.join(DIR_PATH, '..', '..', 'config', 'aalborg.xml')
+
+
+def load_simulation(path):
+    spec = importlib.util.spec_from_file_location('simulation_benchmarked', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def benchmark(simulation, evaluations=5, duration=0.2, port=3001):
+    """ Returns the times, in seconds, of the evaluations of stub races lasting 'duration' seconds. """
+    output_dir = tempfile.mkdtemp(prefix='evaluate_benchmark_')
+    debug_path = os.path.join(output_dir, 'debug')
+    for d in [os.path.join(debug_path, 'client'), os.path.join(debug_path, 'server')]:
+        os.makedirs(d)
+
+    configuration = simulation.port_configuration(CONFIGURATION, port, os.path.join(output_dir, 'configuration.xml'))
+
+    times = []
+    for i in range(evaluations):
+        start = time.time()
+        values = simulation.evaluate(float(i),
+                                     configuration=configuration,
+                                     debug_path=debug_path,
+                                     models_path=output_dir,
+                                     results_path=output_dir,
+                                     port=port,
+                                     client_path=DIR_PATH,
+                                     server_command=[sys.executable, STUB, 'server', '--duration', str(duration)],
+                                     client_command=[sys.executable, STUB, 'client'])
+        times.append(time.time() - start)
+        if values is None or values[0][0] != i:
+            raise Exception('Unexpected results: {!r}'.format(values))
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the overhead of an evaluation')
+
+    parser.add_argument(
+        '-s',
+        '--simulation',
+        help='simulation.py to benchmark (by default, the one next to this script)',
+        type=str,
+        default=os.path.join(DIR_PATH, 'simulation.py')
+    )
+
+    parser.add_argument(
+        '-n',
+        '--evaluations',
+        help='Number of evaluations',
+        type=int,
+        default=5
+    )
+
+    parser.add_argument(
+        '-d',
+        '--duration',
+        help='Duration of each stub race, in seconds',
+        type=float,
+        default=0.2
+    )
+
+    args = parser.parse_args()
+
+    #the evaluations print their progress
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        times = benchmark(load_simulation(args.simulation), args.evaluations, args.duration)
+    finally:
+        sys.stdout = stdout
+
+    print('{} evaluations of {:.2f} s races: {:.2f}-{:.2f} s each, overhead {:.3f} s on average'.format(
+        len(times), args.duration, min(times), max(times), sum(times) / len(times) - args.duration))
@@ -0,0 +1,383 @@
+"""
+Kinematic models of the tracks and of the cars, used to simulate races without TORCS.
+
+A track is described by the curvature of its centerline along the distance from the start line (a sequence
+of straights and arcs), from which the range finders are computed exactly. The cars move in the track frame: distance along the
+centerline (s), lateral distance from it (d, positive on the left) and heading relative to it (psi, positive
+towards the left). All the car quantities are arrays, so that any number of cars can be simulated at once.
+"""
+from __future__ import print_function
+
+import math
+import os.path
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+
+GRAVITY = 9.81
+
+#road grip (friction coefficient) of each track category
+category_grip = {'road': 1.1, 'oval': 1.1, 'dirt': 0.7}
+#grip and additional drag out of the track (grass, sand...)
+offtrack_grip_factor = 0.6
+offtrack_drag = 2.0
+#distance of the walls from the track edges
+wall_margin = 3.0
+
+
+def straight(length):
+    return [('straight', length)]
+
+
+def corner(radius, degrees):
+    """ Arc of the given radius; positive degrees turn left """
+    return [('corner', radius, degrees)]
+
+
+#approximations of the tracks used in the configurations: the total length, width and category are the
+#ones of the TORCS tracks, but the layouts are simplified (corners are arcs, straights are stretched to
+#match the length)
+builtin_tracks = {
+    'aalborg': (2587.0, 10.0, 'road',
+                straight(250) + corner(40, 90) + straight(120) + corner(25, -75) + straight(80) + corner(30, 165)
+                + straight(200) + corner(60, 60) + straight(60) + corner(20, -120) + straight(90) + corner(35, 150)
+                + straight(150) + corner(45, 90) + straight(100) + corner(30, -90) + straight(60) + corner(50, 90)),
+    'alpine-1': (6355.0, 10.0, 'road',
+                 straight(500) + corner(80, 90) + straight(300) + corner(40, -120) + straight(250) + corner(60, 150)
+                 + straight(400) + corner(30, -90) + straight(200) + corner(50, 120) + straight(350)
+                 + corner(100, 60) + straight(300) + corner(35, -60) + straight(250) + corner(70, 90)
+                 + straight(300) + corner(45, 120)),
+    'dirt-1': (1072.0, 10.0, 'dirt',
+               straight(120) + corner(30, 120) + straight(60) + corner(20, -60) + straight(80) + corner(25, 150)
+               + straight(100) + corner(35, 150)),
+    'forza': (5784.0, 11.0, 'road',
+              straight(1100) + corner(25, 45) + corner(25, -45) + straight(300) + corner(120, 110) + straight(450)
+              + corner(60, 90) + straight(150) + corner(60, 20) + straight(900) + corner(30, 30) + corner(30, -30)
+              + straight(500) + corner(70, 90) + straight(250) + corner(150, 50) + straight(600)),
+    'mixed-1': (2229.0, 10.0, 'dirt',
+                straight(200) + corner(40, 90) + straight(150) + corner(30, -90) + straight(100) + corner(25, 180)
+                + straight(180) + corner(50, 90) + straight(120) + corner(35, 90)),
+    'mixed-2': (3148.0, 10.0, 'dirt',
+                straight(300) + corner(50, 120) + straight(200) + corner(30, -100) + straight(150) + corner(40, 160)
+                + straight(250) + corner(35, -60) + straight(200) + corner(60, 120) + straight(150)
+                + corner(45, 120)),
+}
+
+
+class Track(object):
+    """
+    Closed track made of a list of segments ('straight', length) and ('corner', radius, degrees), i.e. pieces
+    of constant curvature (the layout is not required to close geometrically: only the curvature along the
+    centerline matters).
+    """
+
+    #range of the range finders (m)
+    sensor_range = 200.0
+    #largest angle (around the center of a corner) covered by a range finder in one step of edge_distances
+    max_sweep = 1.2
+
+    def __init__(self, name, segments, width=10.0, grip=1.1):
+        self.name = name
+        self.width = float(width)
+        self.grip = float(grip)
+
+        curvatures = []
+        lengths = []
+        for segment in segments:
+            if segment[0] == 'straight':
+                lengths.append(float(segment[1]))
+                curvatures.append(0.0)
+            elif segment[0] == 'corner':
+                radius, degrees = float(segment[1]), float(segment[2])
+                if radius <= self.width / 2:
+                    raise ValueError('Corner radius {} too small for a track {} m wide'.format(radius, self.width))
+                lengths.append(radius * math.radians(abs(degrees)))
+                curvatures.append(math.copysign(1.0 / radius, degrees))
+            else:
+                raise ValueError('Unknown track segment {!r}'.format(segment[0]))
+
+        if not lengths or sum(lengths) <= 0:
+            raise ValueError('Track {!r} has no length'.format(name))
+
+        self.curvatures = np.asarray(curvatures)
+        self.ends = np.cumsum(lengths)
+        self.starts = self.ends - np.asarray(lengths)
+        self.length = float(self.ends[-1])
+
+    def __repr__(self):
+        return 'Track({!r}, length={:.1f}, width={:.1f})'.format(self.name, self.length, self.width)
+
+    def _piece(self, s):
+        #index of the segment of the distances s (taken modulo the length)
+        return np.minimum(np.searchsorted(self.starts, s, side='right') - 1, len(self.starts) - 1)
+
+    def curvature(self, s):
+        """ Curvature of the centerline at the distances s (positive turning left) """
+        return self.curvatures[self._piece(np.mod(s, self.length))]
+
+    def edge_distances(self, s, d, psi, angles, max_steps=32):
+        """
+        Distances of the track edges along the range finders of each car (in the track frame): 'angles' are
+        the directions of the range finders (radians, relative to the car axis, positive on the left), the
+        result is an array (cars, range finders), in [0, sensor_range].
+
+        Every range finder is followed one segment at a time: within a straight the edges are lines and within
+        a corner they are concentric circles, so that the intersections are computed exactly.
+        """
+        s = np.atleast_1d(np.asarray(s, dtype=float))
+        shape = (len(s), len(angles))
+        position = np.mod(np.broadcast_to(s[:, np.newaxis], shape), self.length)
+        lateral = np.array(np.broadcast_to(np.atleast_1d(d)[:, np.newaxis], shape), dtype=float)
+        direction = np.atleast_1d(psi)[:, np.newaxis] + np.asarray(angles)[np.newaxis, :]
+
+        half_width = self.width / 2
+        distances = np.full(shape, self.sensor_range)
+        travelled = np.zeros(shape)
+        active = np.ones(shape, dtype=bool)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(max_steps):
+                piece = self._piece(position)
+                curvature = self.curvatures[piece]
+                straight = curvature == 0
+                sin_d, cos_d = np.sin(direction), np.cos(direction)
+                #length of the segment ahead of (or behind) the ray, along the centerline
+                remaining = np.where(cos_d > 0, self.ends[piece] - position, position - self.starts[piece])
+
+                #straights: distance to the edge the ray moves towards, and to the end of the segment
+                straight_edge = np.where(sin_d > 0, half_width - lateral, half_width + lateral) / np.abs(sin_d)
+                straight_exit = remaining / np.abs(cos_d)
+
+                #corners: position relative to the center of the corner (on the left if sigma is 1)
+                sigma = np.sign(curvature)
+                radius = np.where(straight, 1.0, 1.0 / np.abs(curvature))
+                rho = radius - sigma * lateral
+                radial = -sigma * sin_d
+                b = rho * radial
+                outer = -b + np.sqrt(np.maximum(b * b + (radius + half_width) ** 2 - rho * rho, 0.0))
+                inner_discriminant = b * b + (radius - half_width) ** 2 - rho * rho
+                inner = np.where((inner_discriminant >= 0) & (radial < 0),
+                                 -b - np.sqrt(np.maximum(inner_discriminant, 0.0)), np.inf)
+                sweep = np.minimum(remaining / radius, self.max_sweep)
+                tan_sweep = np.tan(sweep)
+                denominator = np.abs(cos_d) - radial * tan_sweep
+                corner_exit = np.where(denominator > 0, rho * tan_sweep / denominator, np.inf)
+
+                edge = np.where(straight, straight_edge, np.minimum(outer, inner))
+                exit = np.where(straight, straight_exit, corner_exit)
+
+                hit = active & (edge <= exit)
+                distances = np.where(hit, travelled + edge, distances)
+                active &= ~hit
+                travelled = np.where(active, travelled + exit, travelled)
+                active &= travelled < self.sensor_range
+                if not active.any():
+                    break
+
+                #move the rays to the next segment
+                forward = np.where(cos_d >= 0, 1.0, -1.0)
+                new_rho = np.sqrt(np.maximum(rho * rho + 2 * exit * rho * radial + exit * exit, 0.0))
+                new_position = np.where(straight, position + exit * cos_d, position + forward * radius * sweep)
+                new_lateral = np.where(straight, lateral + exit * sin_d, sigma * (radius - new_rho))
+                new_direction = np.where(straight, direction, direction - sigma * forward * sweep)
+
+                #(the small step makes sure that the rays leave the segment they reached the end of)
+                position = np.where(active, np.mod(new_position + forward * 1e-6, self.length), position)
+                lateral = np.where(active, new_lateral, lateral)
+                direction = np.where(active, new_direction, direction)
+
+        return np.minimum(distances, self.sensor_range)
+
+
+def load_track(path, name=None):
+    """
+    Reads a track file: one segment per line, 'straight <length>' or 'corner <radius> <degrees>' (positive
+    degrees turn left), plus optional 'width <meters>' and 'grip <friction coefficient>' lines; '#' starts
+    a comment.
+    """
+
+    segments = []
+    parameters = {}
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+
+            try:
+                if fields[0] == 'straight' and len(fields) == 2:
+                    segments += straight(float(fields[1]))
+                elif fields[0] == 'corner' and len(fields) == 3:
+                    segments += corner(float(fields[1]), float(fields[2]))
+                elif fields[0] in ('width', 'grip') and len(fields) == 2:
+                    parameters[fields[0]] = float(fields[1])
+                else:
+                    raise ValueError
+            except ValueError:
+                raise ValueError('{}:{}: invalid track line {!r}'.format(path, line_number, line.strip()))
+
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+
+    return Track(name, segments, **parameters)
+
+
+def builtin_track(name, category=None):
+    """ Builds the approximation of the TORCS track 'name' (see builtin_tracks) """
+
+    if name not in builtin_tracks:
+        raise KeyError('No built-in model of the track {!r} (available: {}); use a track file instead'
+                       .format(name, ', '.join(sorted(builtin_tracks))))
+
+    length, width, default_category, segments = builtin_tracks[name]
+    grip = category_grip.get(category or default_category, category_grip['road'])
+
+    #stretch the straights to match the length of the real track
+    corners_length = sum(s[1] * math.radians(abs(s[2])) for s in segments if s[0] == 'corner')
+    straights_length = sum(s[1] for s in segments if s[0] == 'straight')
+    scale = max(length - corners_length, 0.0) / straights_length
+    segments = [('straight', s[1] * scale) if s[0] == 'straight' else s for s in segments]
+
+    return Track(name, segments, width=width, grip=grip)
+
+
+def _find_section(element, name):
+    for section in element.findall('section'):
+        if section.get('name') == name:
+            return section
+    return None
+
+
+def read_configuration(configuration):
+    """
+    Reads a TORCS race configuration and returns a dictionary with the track 'name' and 'category', the number
+    of 'laps' and the 'drivers' indices of the scr_server drivers (the driver with index i is served on the port
+    3001 + i).
+    """
+
+    root = ElementTree.parse(configuration).getroot()
+
+    tracks = _find_section(root, 'Tracks')
+    track = _find_section(tracks, '1') if tracks is not None else None
+    if track is None:
+        raise ValueError('No track in the configuration {}'.format(configuration))
+    attributes = {a.get('name'): a.get('val') for a in track.findall('attstr')}
+
+    laps = None
+    for attribute in root.iter('attnum'):
+        if attribute.get('name') == 'laps':
+            laps = int(float(attribute.get('val')))
+            break
+
+    drivers = []
+    section = _find_section(root, 'Drivers')
+    for driver in (section.findall('section') if section is not None else []):
+        values = {a.get('name'): a.get('val') for a in driver}
+        if values.get('module') == 'scr_server':
+            drivers.append(int(float(values['idx'])))
+
+    return {'name': attributes.get('name'),
+            'category': attributes.get('category'),
+            'laps': laps if laps is not None else 1,
+            'drivers': drivers}
+
+
+class Cars(object):
+    """
+    Kinematic model of a group of cars (bicycle model with a grip limit) on a track.
+
+    Every attribute is an array with one value per car; step() advances all the cars by one time step given
+    their commands (in the same ranges as the SCRC ones: accelerator and brake in [0, 1], gear in [-1, 6],
+    steering in [-1, 1], positive to the left).
+    """
+
+    wheelbase = 2.7
+    wheel_radius = 0.33
+    #steering angle at full lock (21 degrees, as in TORCS)
+    steer_lock = math.radians(21.0)
+    #maximum acceleration of each gear (index 0 is the reverse, index 1 the neutral)
+    gear_acceleration = np.array([4.0, 0.0, 9.0, 7.0, 5.5, 4.4, 3.6, 3.0])
+    #engine revolutions per km/h in each gear
+    gear_rpm = np.array([190.0, 0.0, 190.0, 120.0, 88.0, 68.0, 56.0, 47.0])
+    idle_rpm = 1000.0
+    max_rpm = 9500.0
+    drag = 0.0004
+    rolling_resistance = 0.15
+    #damage per m/s of speed lost hitting a wall
+    wall_damage = 20.0
+
+    def __init__(self, track, count, start_distances=None):
+        self.track = track
+        self.count = count
+
+        if start_distances is None:
+            start_distances = np.zeros(count)
+        self.s = np.array(start_distances, dtype=float)
+        self.d = np.zeros(count)
+        self.psi = np.zeros(count)
+        self.speed = np.zeros(count)
+        self.gear = np.zeros(count, dtype=int)
+        self.rpm = np.full(count, self.idle_rpm)
+        self.damage = np.zeros(count)
+        self.distance_raced = np.zeros(count)
+
+    def track_position(self):
+        """ Normalized distance from the centerline: -1 right edge, 1 left edge """
+        return self.d / (self.track.width / 2)
+
+    def step(self, dt, accelerator, brake, gear, steering):
+        track = self.track
+        shape = (self.count,)
+        accelerator = np.clip(np.broadcast_to(accelerator, shape), 0.0, 1.0)
+        brake = np.clip(np.broadcast_to(brake, shape), 0.0, 1.0)
+        steering = np.clip(np.broadcast_to(steering, shape), -1.0, 1.0)
+        self.gear = np.clip(np.broadcast_to(gear, shape).astype(int), -1, 6)
+
+        offtrack = np.abs(self.d) > track.width / 2
+        grip = np.where(offtrack, track.grip * offtrack_grip_factor, track.grip)
+
+        #longitudinal dynamics
+        direction = np.sign(self.speed)
+        thrust = self.gear_acceleration[self.gear + 1] * accelerator * np.where(self.gear < 0, -1.0, 1.0)
+        thrust[self.rpm >= self.max_rpm] = 0.0
+        resistance = (self.drag * self.speed ** 2 + self.rolling_resistance + offtrack * offtrack_drag) * direction
+        braking = brake * grip * GRAVITY * direction
+        speed = self.speed + dt * (thrust - resistance - braking)
+        #resistance and brakes stop the car, but do not make it move backwards
+        speed[(direction != 0) & (np.sign(speed) == -direction) & (thrust * direction <= 0)] = 0.0
+        self.speed = speed
+
+        #lateral dynamics: the curvature of the path is limited by the grip
+        curvature = np.tan(steering * self.steer_lock) / self.wheelbase
+        max_curvature = grip * GRAVITY / np.maximum(self.speed ** 2, 1e-6)
+        curvature = np.clip(curvature, -max_curvature, max_curvature)
+
+        #motion in the track frame
+        track_curvature = track.curvature(self.s)
+        ds = dt * self.speed * np.cos(self.psi) / np.maximum(1 - self.d * track_curvature, 0.1)
+        self.s += ds
+        self.distance_raced += ds
+        self.d += dt * self.speed * np.sin(self.psi)
+        self.psi += dt * self.speed * curvature - track_curvature * ds
+        self.psi = (self.psi + math.pi) % (2 * math.pi) - math.pi
+
+        #walls: the car stops against them, losing most of its speed and getting damaged
+        wall = track.width / 2 + wall_margin
+        hit = np.abs(self.d) > wall
+        if hit.any():
+            lost_speed = np.abs(self.speed[hit]) * 0.7
+            self.damage[hit] += self.wall_damage * lost_speed
+            self.speed[hit] *= 0.3
+            self.psi[hit] *= 0.5
+            self.d[hit] = np.clip(self.d[hit], -wall, wall)
+
+        speed_kmh = np.abs(self.speed) * 3.6
+        self.rpm = np.clip(self.idle_rpm + speed_kmh * self.gear_rpm[self.gear + 1], self.idle_rpm, self.max_rpm)
+        self.rpm[self.gear == 0] = self.idle_rpm + accelerator[self.gear == 0] * (self.max_rpm - self.idle_rpm)
+
+    def edge_distances(self, angles):
+        """ Range finders of each car (-1 when the car is out of the track, as in TORCS) """
+        distances = self.track.edge_distances(self.s, self.d, self.psi, angles)
+        distances[np.abs(self.track_position()) > 1] = -1.0
+        return distances
@@ -0,0 +1,74 @@
+"""
+Evaluation of the genomes on several tracks (race configurations), e.g. the ones of config/.
+
+Every generation, a TrackScheduler picks the tracks to race on, rotating over all the configured ones so that
+each generation only races a few of them, and aggregates the fitness values of each genome on these tracks
+(mean, min or CVaR, i.e. the mean of the worst fraction of the values).
+"""
+from __future__ import print_function
+
+import math
+
+import batch_race
+
+
+aggregations = ['mean', 'min', 'cvar']
+
+
+def cvar(values, alpha=0.25):
+    """ Conditional value at risk: mean of the worst 'alpha' fraction of the values (at least one) """
+    worst = sorted(values)[:max(1, int(math.ceil(alpha * len(values))))]
+    return sum(worst) / float(len(worst))
+
+
+class TrackScheduler(object):
+    """
+    Races the genomes on 'tracks_per_generation' of the race configurations each generation (all of them by
+    default), taking them in turn, and aggregates the fitness values of each genome with 'aggregation'.
+    """
+
+    def __init__(self, configurations, tracks_per_generation=None, aggregation='mean', cvar_alpha=0.25):
+        if not configurations:
+            raise ValueError('No race configuration to schedule')
+        if aggregation not in aggregations:
+            raise ValueError('Unknown aggregation {!r} ({})'.format(aggregation, ', '.join(aggregations)))
+
+        self.configurations = list(configurations)
+        if tracks_per_generation is None:
+            tracks_per_generation = len(self.configurations)
+        self.tracks_per_generation = max(1, min(tracks_per_generation, len(self.configurations)))
+        self.aggregation = aggregation
+        self.cvar_alpha = cvar_alpha
+
+    def tracks(self, generation):
+        """ Race configurations of the given generation (numbered as Population.generation: the first one is 0) """
+
+        count = len(self.configurations)
+        start = (generation * self.tracks_per_generation) % count
+        return [self.configurations[(start + i) % count] for i in range(self.tracks_per_generation)]
+
+    def aggregate(self, fitness_values):
+        if self.aggregation == 'min':
+            return min(fitness_values)
+        if self.aggregation == 'cvar':
+            return cvar(fitness_values, self.cvar_alpha)
+        return sum(fitness_values) / float(len(fitness_values))
+
+
+def evaluate_batch(nets, configurations, **kwargs):
+    """
+    Races each network on its race configuration in the batch simulator (one batch for each configuration)
+    and returns their results, in the same order
+    """
+
+    results = [None] * len(nets)
+    groups = {}
+    for i, configuration in enumerate(configurations):
+        groups.setdefault(configuration, []).append(i)
+
+    for configuration, indices in groups.items():
+        values = batch_race.evaluate([nets[i] for i in indices], configuration, **kwargs)
+        for i, v in zip(indices, values):
+            results[i] = v
+
+    return results
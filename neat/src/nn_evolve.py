@@ -7,8 +7,14 @@ import os.path
 import argparse
 import sys
 import simulation
+import batch_race
+import multitrack
 import datetime
 import importlib
+import hashlib
+import math
+
+import numpy as np
 
 FILE_PATH = os.path.realpath(__file__)
 DIR_PATH = os.path.dirname(FILE_PATH)
@@ -17,67 +23,97 @@ DIR_PATH = os.path.dirname(FILE_PATH)
 sys.path.insert(0, os.path.join(DIR_PATH, '../../'))
 
 from neatsociety import nn, population, statistics, visualize
+from neatsociety.fitness_cache import FitnessCache
+from neatsociety.distance_cache import DistanceCache
+
+#torcs-client is on the path since simulation has been imported
+from early_stop import default_fitness
+
 
 
+def compute_fitness(values, fitness_function=None, timelimit=None):
+    
+    if values is None:
+        return -100
+    
+    last_result = []
+    later_time = 0
+    
+    if timelimit is not None:
+        for val in values:
+            if val[0] > later_time and val[0] <= timelimit:
+                last_result = val
+                later_time = val[0]
+            elif val[0] > timelimit:
+                break
+        
+        if last_result[0] < timelimit:
+            last_result[6] *= last_result[0]/timelimit
+            last_result[0] = timelimit
+    else:
+        last_result = values[-1]
+
+    duration, distance, laps, distance_from_start, damage, penalty, avg_speed = last_result[:7]
+    
+    if timelimit is not None:
+        avg_speed *= duration/timelimit
+        duration = timelimit
+    
+    if fitness_function is None:
+        #the formula is shared with the early stop of the drivers, whose fitness bound depends on it
+        fitness = default_fitness(duration, distance, laps, distance_from_start, damage, penalty, avg_speed)
+    else:
+        fitness = fitness_function(*last_result[:7])
+    
+    #fitness = distance - 1000.0 * damage/ (math.fabs(distance) if distance != 0.0 else 1.0) - 100 * penalty
+    print('\tDistance = ', distance)
+    print('\tEstimated Distance = ', avg_speed*duration)
+    print('\tDamage = ', damage)
+    print('\tPenalty = ', penalty)
+    print('\tAvgSpeed = ', avg_speed)
+    
+    return fitness
+
 
-def eval_fitness(genomes, fitness_function=None, evaluate_function=None, cleaner=None, timelimit=None):
+def eval_fitness(genomes, fitness_function=None, evaluate_function=None, cleaner=None, timelimit=None, phenotype_cache=None,
+                 batch_evaluate_function=None, early_stop=None):
+    """
+    Sets the fitness of the genomes from the results of their races.
+    If early_stop is given, it returns the early stop spec of a genome (or None), which is passed to the evaluation
+    functions so that the drivers stop the races which cannot reach its threshold anymore.
+    """
     
     print('\nStarting evaluation...\n\n')
     
     tot = len(genomes)
     
+    if batch_evaluate_function is not None:
+        #evaluate all the genotypes at once (e.g. in parallel on an evaluation farm)
+        nets = [nn.create_recurrent_phenotype(g, compiled=True, cache=phenotype_cache) for g in genomes]
+        if early_stop is not None:
+            all_values = batch_evaluate_function(nets, [early_stop(g) for g in genomes])
+        else:
+            all_values = batch_evaluate_function(nets)
+    else:
+        all_values = None
+    
     #evaluate the genotypes one by one
     for i, g in enumerate(genomes):
         
         print('evaluating', i+1, '/', tot, '\n')
-        net = nn.create_recurrent_phenotype(g)
-        
-        
-        #run the simulation to evaluate the model
-        values = evaluate_function(net)
         
-        if values is None:
-            fitness = -100
+        if all_values is not None:
+            values = all_values[i]
         else:
-            last_result = []
-            later_time = 0
+            net = nn.create_recurrent_phenotype(g, compiled=True, cache=phenotype_cache)
             
-            if timelimit is not None:
-                for val in values:
-                    if val[0] > later_time and val[0] <= timelimit:
-                        last_result = val
-                        later_time = val[0]
-                    elif val[0] > timelimit:
-                        break
-                
-                if last_result[0] < timelimit:
-                    last_result[6] *= last_result[0]/timelimit
-                    last_result[0] = timelimit
+            #run the simulation to evaluate the model
+            if early_stop is not None:
+                values = evaluate_function(net, early_stop(g))
             else:
-                last_result = values[-1]
-
-            duration, distance, laps, distance_from_start, damage, penalty, avg_speed = last_result[:7]
-            
-            if timelimit is not None:
-                avg_speed *= duration/timelimit
-                duration = timelimit
-            
-            if fitness_function is None:
-                #fitness = distance - 0.08*damage - 200*penalty
-                #fitness = avg_speed * duration - 0.08 * damage - 200 * penalty
-                fitness = avg_speed * duration - 0.2 * damage - 300 * penalty
-                if laps >= 2:
-                    fitness += 50.0*avg_speed#distance/(duration+1)
-            else:
-                fitness = fitness_function(*last_result[:7])
-            
-            #fitness = distance - 1000.0 * damage/ (math.fabs(distance) if distance != 0.0 else 1.0) - 100 * penalty
-            print('\tDistance = ', distance)
-            print('\tEstimated Distance = ', avg_speed*duration)
-            print('\tDamage = ', damage)
-            print('\tPenalty = ', penalty)
-            print('\tAvgSpeed = ', avg_speed)
-            
+                values = evaluate_function(net)
+        
+        fitness = compute_fitness(values, fitness_function=fitness_function, timelimit=timelimit)
         
         print('\tFITNESS =', fitness, '\n')
         
@@ -90,8 +126,109 @@ def eval_fitness(genomes, fitness_function=None, evaluate_function=None, cleaner
         cleaner()
 
 
+def eval_fitness_on_tracks(genomes, tracks, tracks_evaluate_function, aggregate, fitness_function=None, cleaner=None,
+                           timelimit=None, phenotype_cache=None):
+    """
+    Races every genome on each of the race configurations 'tracks', all the races at once through
+    tracks_evaluate_function(networks, configurations), and sets its fitness to the aggregate of its fitness
+    values on the tracks.
+    """
+    
+    print('\nStarting evaluation on', len(tracks), 'tracks...\n\n')
+    
+    tot = len(genomes)
+    
+    nets = [nn.create_recurrent_phenotype(g, compiled=True, cache=phenotype_cache) for g in genomes]
+    all_values = tracks_evaluate_function([net for net in nets for t in tracks], [t for net in nets for t in tracks])
+    
+    for i, g in enumerate(genomes):
+        
+        print('evaluating', i+1, '/', tot, '\n')
+        
+        fitness_values = []
+        for t, values in zip(tracks, all_values[i * len(tracks):(i + 1) * len(tracks)]):
+            print('\t' + os.path.basename(t))
+            fitness_values.append(compute_fitness(values, fitness_function=fitness_function, timelimit=timelimit))
+        
+        g.fitness = aggregate(fitness_values)
+        
+        print('\tFITNESS =', g.fitness, fitness_values, '\n')
+    
+    print('\n... finished evaluation\n\n')
+    
+    if cleaner is not None:
+        cleaner()
+
+
+def worst_elites(population):
+    """ Lowest fitness of the genomes of each species which have already been evaluated (its elites) """
     
+    thresholds = {}
+    for s in population.species:
+        evaluated = [g.fitness for g in s.members if g.fitness is not None]
+        if evaluated:
+            thresholds[s.ID] = min(evaluated)
+    return thresholds
+
 
+def select_per_species(genomes, scores, fraction):
+    """ Indices of the best 'fraction' of the genomes of each species according to the scores (at least one) """
+    
+    species = {}
+    for i, g in enumerate(genomes):
+        species.setdefault(g.species_id, []).append(i)
+    
+    selected = []
+    for members in species.values():
+        members.sort(key=lambda i: scores[i], reverse=True)
+        selected += members[:max(1, int(math.ceil(fraction * len(members))))]
+    
+    return sorted(selected)
+
+
+def staged_eval_fitness(genomes, surrogate_function, fraction=0.25, penalty=0.1, surrogate_timelimit=None,
+                        fitness_function=None, phenotype_cache=None, full_evaluation=eval_fitness, **kwargs):
+    """
+    Two-stage evaluation: every genome is first scored by surrogate_function (a cheap proxy of the race, e.g. the
+    batch simulator, which receives the list of networks and returns their results) and only the best 'fraction'
+    of each species is then evaluated by full_evaluation (eval_fitness by default, with the other arguments).
+    The remaining genomes get the fitness extrapolated from their surrogate score, by a linear fit of the full
+    fitness over the surrogate one of the genomes evaluated in both stages, reduced by 'penalty' (relative to its
+    absolute value) and never higher than the lowest full fitness of their species, which they ranked below.
+    Returns the genomes evaluated by full_evaluation, the only ones whose fitness may be cached.
+    """
+    
+    print('\nStarting surrogate evaluation...\n\n')
+    
+    nets = [nn.create_recurrent_phenotype(g, compiled=True, cache=phenotype_cache) for g in genomes]
+    scores = [compute_fitness(values, fitness_function=fitness_function, timelimit=surrogate_timelimit)
+              for values in surrogate_function(nets)]
+    
+    selected = select_per_species(genomes, scores, fraction)
+    print('\nFull evaluation of', len(selected), '/', len(genomes), 'genomes\n')
+    
+    full_evaluation([genomes[i] for i in selected], fitness_function=fitness_function, phenotype_cache=phenotype_cache,
+                    **kwargs)
+    
+    surrogate = np.array([scores[i] for i in selected])
+    full = np.array([genomes[i].fitness for i in selected])
+    if len(selected) > 1 and np.ptp(surrogate) > 0:
+        slope, intercept = np.polyfit(surrogate, full, 1)
+    else:
+        slope, intercept = 1.0, np.mean(full - surrogate)
+    
+    lowest = {}
+    for i in selected:
+        g = genomes[i]
+        lowest[g.species_id] = min(lowest.get(g.species_id, g.fitness), g.fitness)
+    
+    selected = set(selected)
+    for i, g in enumerate(genomes):
+        if i not in selected:
+            fitness = slope * scores[i] + intercept
+            g.fitness = min(fitness - penalty * abs(fitness), lowest[g.species_id])
+    
+    return [genomes[i] for i in sorted(selected)]
 
 
 def get_best_genome(population):
@@ -104,6 +241,12 @@ def get_best_genome(population):
     return best
 
 
+def file_digest(path):
+    
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
 def get_fitness_function(path):
     
     dir, file = os.path.split(os.path.abspath(os.path.splitext(path)[0]))
@@ -114,7 +257,11 @@ def get_fitness_function(path):
     return mod.evaluate
     
 
-def run(output_dir, neat_config=None, generations=20, port=3001, frequency=None, unstuck=False, evaluation=None, checkpoint=None, configuration=None, timelimit=None):
+def run(output_dir, neat_config=None, generations=20, port=3001, frequency=None, unstuck=False, evaluation=None, checkpoint=None, configuration=None, timelimit=None,
+        fitness_cache=None, cache_samples=1, cache_interval=None, workers=1, handoff=False, persistent=False,
+        simulator=False, track=None, batch=False, surrogate=None, surrogate_fraction=0.25, surrogate_penalty=0.1,
+        surrogate_timelimit=None, early_stop=False, tracks=None, tracks_per_generation=None, aggregation='mean',
+        cvar_alpha=0.25, distance_cache=None):
 
     if output_dir is None:
         print('Error! No output dir has been set')
@@ -125,12 +272,84 @@ def run(output_dir, neat_config=None, generations=20, port=3001, frequency=None,
     
     
     if evaluation is None:
-        fitness_function = get_fitness_function(os.path.join(output_dir, 'fitness.py'))
-    else:
-        fitness_function = get_fitness_function(evaluation)
+        evaluation = os.path.join(output_dir, 'fitness.py')
+    
+    fitness_function = get_fitness_function(evaluation)
         
     
-    results_path, models_path, debug_path, checkpoints_path, EVAL_FUNCTION = simulation.initialize_experiments(output_dir, configuration=configuration, unstuck=unstuck, port=port)
+    if tracks and track is not None:
+        #the track file would replace the track of every race configuration
+        raise ValueError('--track cannot be combined with --tracks')
+    
+    #headless SCRC server, racing on the track file if one is given
+    simulator_command = simulation.simulator_command + (['-t', os.path.realpath(track)] if track is not None else [])
+    if simulator:
+        #race on the headless SCRC server instead of TORCS
+        server_command = simulator_command
+    else:
+        server_command = simulation.server_command
+    
+    if tracks and configuration is None:
+        #the genomes race on several tracks: the first one is the race configuration by default
+        configuration = tracks[0]
+    
+    results_path, models_path, debug_path, checkpoints_path, EVAL_FUNCTION = simulation.initialize_experiments(output_dir, configuration=configuration, unstuck=unstuck, port=port, handoff=handoff,
+                                                                                                               persistent=persistent, server_command=server_command)
+    
+    if batch:
+        #race all the genomes at once on the kinematic model of the track (see batch_race.py)
+        race_configuration = configuration if configuration is not None else os.path.join(output_dir, 'configuration.xml')
+        BATCH_EVAL_FUNCTION = lambda nets, unstuck, early_stops=None: batch_race.evaluate(nets, race_configuration, track_file=track,
+                                                                                          timelimit=timelimit, unstuck=unstuck)
+        cleaner = None
+    elif workers > 1 or tracks:
+        #race 'workers' genomes at the same time, on the ports following 'port'
+        farm = simulation.EvaluationFarm(output_dir,
+                                         configuration if configuration is not None else os.path.join(output_dir, 'configuration.xml'),
+                                         ports=range(port, port + workers),
+                                         unstuck=unstuck,
+                                         handoff=handoff,
+                                         persistent=persistent,
+                                         server_command=server_command)
+        BATCH_EVAL_FUNCTION = farm.evaluate
+        cleaner = lambda: (simulation.clean_temp_files(results_path, models_path), farm.clean_temp_files())
+    else:
+        BATCH_EVAL_FUNCTION = None
+        cleaner = lambda: simulation.clean_temp_files(results_path, models_path)
+    
+    if tracks:
+        #race every genome on some of the tracks each generation, in parallel on the farm's slots
+        scheduler = multitrack.TrackScheduler(tracks, tracks_per_generation, aggregation=aggregation, cvar_alpha=cvar_alpha)
+        if batch:
+            TRACKS_EVAL_FUNCTION = lambda nets, configurations, unstuck: multitrack.evaluate_batch(nets, configurations, timelimit=timelimit,
+                                                                                                   unstuck=unstuck)
+        else:
+            TRACKS_EVAL_FUNCTION = lambda nets, configurations, unstuck: farm.evaluate(nets, unstuck, configurations=configurations)
+    
+    if surrogate == 'batch':
+        race_configuration = configuration if configuration is not None else os.path.join(output_dir, 'configuration.xml')
+        SURROGATE_FUNCTION = lambda nets, unstuck: batch_race.evaluate(nets, race_configuration, track_file=track,
+                                                                       timelimit=surrogate_timelimit, unstuck=unstuck)
+    elif surrogate == 'simulator':
+        #same race (and track file) as the full evaluation, on the headless server
+        race_configuration = os.path.realpath(configuration if configuration is not None else os.path.join(output_dir, 'configuration.xml'))
+        SURROGATE_FUNCTION = lambda nets, unstuck: [simulation.evaluate(net, configuration=race_configuration, unstuck=unstuck, port=port,
+                                                                        handoff=handoff, debug_path=debug_path, server_command=simulator_command,
+                                                                        results_path=results_path, models_path=models_path)
+                                                    for net in nets]
+    elif surrogate is not None:
+        raise ValueError('Unknown surrogate evaluation {!r}'.format(surrogate))
+    
+    if surrogate_timelimit is None:
+        surrogate_timelimit = timelimit
+    
+    if early_stop and timelimit is None:
+        print('Warning! The early stop needs a timelimit, it is disabled')
+        early_stop = False
+    
+    if early_stop and tracks:
+        print('Warning! The early stop is not supported on several tracks, it is disabled')
+        early_stop = False
     
     best_model_file = os.path.join(output_dir, 'best.pickle')
     
@@ -139,24 +358,85 @@ def run(output_dir, neat_config=None, generations=20, port=3001, frequency=None,
     
     pop = population.Population(neat_config)
     
+    #phenotypes of the genomes which did not change (e.g. the elites) are built only once
+    phenotype_cache = nn.PhenotypeCache()
+    
     if checkpoint is not None:
         print('Loading from ', checkpoint)
         pop.load_checkpoint(checkpoint)
     
+    if fitness_cache is not None:
+        #the cached fitness values are only valid for the same race, fitness function and time limit
+        race_configuration = configuration if configuration is not None else os.path.join(output_dir, 'configuration.xml')
+        cache_context = (file_digest(race_configuration), file_digest(evaluation), timelimit)
+        if tracks:
+            #the tracks of each generation are added to the context below
+            cache_context = (file_digest(evaluation), timelimit, aggregation, cvar_alpha)
+        pop.fitness_cache = FitnessCache(os.path.join(output_dir, 'fitness_cache.gz'),
+                                         context=cache_context,
+                                         policy=fitness_cache,
+                                         samples=cache_samples,
+                                         interval=cache_interval)
+    
+    if distance_cache is not None:
+        #the distances between genomes compared again (e.g. elites and representatives) are not recomputed
+        pop.distance_cache = DistanceCache(distance_cache)
+    
     for g in range(1, generations+1):
         
-        pop.run(lambda individuals: eval_fitness(individuals,
-                                                 fitness_function=fitness_function,
-                                                 evaluate_function=lambda g : EVAL_FUNCTION(g, pop.generation > 13),
-                                                 cleaner=lambda: simulation.clean_temp_files(results_path, models_path),
-                                                 timelimit=timelimit
-                                                ),
-                1)
+        if pop.fitness_cache is not None:
+            #the drivers start trying to unstuck after generation 13, which changes the fitness
+            pop.fitness_cache.set_context(cache_context + (pop.generation + 1 > 13,)
+                                          + (tuple(file_digest(t) for t in scheduler.tracks(pop.generation + 1)) if tracks else ()))
+        
+        if early_stop:
+            #the races which cannot beat the worst elite of their species anymore are stopped early
+            thresholds = worst_elites(pop)
+            early_stop_function = lambda g: (None if g.species_id not in thresholds else
+                                             (thresholds[g.species_id], timelimit, os.path.realpath(evaluation)))
+        else:
+            early_stop_function = None
+        
+        evaluation_arguments = dict(fitness_function=fitness_function,
+                                    evaluate_function=lambda g, *early_stop_spec: EVAL_FUNCTION(g, pop.generation > 13, *early_stop_spec),
+                                    batch_evaluate_function=None if BATCH_EVAL_FUNCTION is None else
+                                                            lambda nets, *early_stops: BATCH_EVAL_FUNCTION(nets, pop.generation > 13, *early_stops),
+                                    cleaner=cleaner,
+                                    timelimit=timelimit,
+                                    phenotype_cache=phenotype_cache,
+                                    early_stop=early_stop_function)
+        
+        if tracks:
+            generation_tracks = scheduler.tracks(pop.generation + 1)
+            print('Racing on', ', '.join(os.path.basename(t) for t in generation_tracks))
+            full_evaluation = lambda individuals, **kwargs: eval_fitness_on_tracks(individuals, generation_tracks,
+                                                                                   lambda nets, configurations: TRACKS_EVAL_FUNCTION(nets, configurations, pop.generation > 13),
+                                                                                   scheduler.aggregate,
+                                                                                   **kwargs)
+            evaluation_arguments = dict(fitness_function=fitness_function,
+                                        cleaner=cleaner,
+                                        timelimit=timelimit,
+                                        phenotype_cache=phenotype_cache)
+        else:
+            full_evaluation = eval_fitness
+        
+        if surrogate is None:
+            pop.run(lambda individuals: full_evaluation(individuals, **evaluation_arguments), 1)
+        else:
+            #race on the full evaluation only the genomes which look best on the surrogate one
+            pop.run(lambda individuals: staged_eval_fitness(individuals,
+                                                            lambda nets: SURROGATE_FUNCTION(nets, pop.generation > 13),
+                                                            fraction=surrogate_fraction,
+                                                            penalty=surrogate_penalty,
+                                                            surrogate_timelimit=surrogate_timelimit,
+                                                            full_evaluation=full_evaluation,
+                                                            **evaluation_arguments),
+                    1)
         
         if g % frequency == 0:
             print('Saving best net in {}'.format(best_model_file))
             best_genome = get_best_genome(pop)
-            pickle.dump(nn.create_recurrent_phenotype(best_genome), open(best_model_file, "wb"))
+            pickle.dump(nn.create_recurrent_phenotype(best_genome, compiled=True, cache=phenotype_cache), open(best_model_file, "wb"))
             
             new_checkpoint = os.path.join(checkpoints_path, 'neat_gen_{}.checkpoint'.format(pop.generation))
             print('Storing to ', new_checkpoint)
@@ -176,10 +456,13 @@ def run(output_dir, neat_config=None, generations=20, port=3001, frequency=None,
                                show_disabled=False)
                 
                 
+    #stops the workers of the parallel reproduction
+    pop.close()
+    
     print('Number of evaluations: {0}'.format(pop.total_evaluations))
 
     print('Saving best net in {}'.format(best_model_file))
-    pickle.dump(nn.create_recurrent_phenotype(get_best_genome(pop)), open(best_model_file, "wb"))
+    pickle.dump(nn.create_recurrent_phenotype(get_best_genome(pop), compiled=True, cache=phenotype_cache), open(best_model_file, "wb"))
     
     # Display the most fit genome.
     #print('\nBest genome:')
@@ -278,6 +561,144 @@ if __name__ == '__main__':
         default=None
     )
     
+    parser.add_argument(
+        '-w',
+        '--workers',
+        help='Number of races to run in parallel, on the ports following --port (at most 10)',
+        type=int,
+        default=1
+    )
+
+    parser.add_argument(
+        '--handoff',
+        help='Send the models to the clients and receive their results over a socket instead of temporary files',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '--persistent',
+        help='Keep the driver clients running between races and send them the models over a socket',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '--simulator',
+        help='Race on the headless SCRC server (kinematic car model) instead of TORCS',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '--track',
+        help='Track file for the headless SCRC server (by default, the model of the configuration\'s track)',
+        type=str,
+        default=None
+    )
+
+    parser.add_argument(
+        '--batch',
+        help='Race the whole population at once in the batch simulator (kinematic car model, no server nor clients)',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '-s',
+        '--surrogate',
+        help='Score every genome first with a cheap evaluation, "batch" (batch simulator) or "simulator" (headless SCRC server), and give the full evaluation only to the best --surrogate_fraction of each species',
+        type=str,
+        choices=['batch', 'simulator'],
+        default=None
+    )
+
+    parser.add_argument(
+        '--surrogate_fraction',
+        help='Fraction of each species which gets the full evaluation after the surrogate one',
+        type=float,
+        default=0.25
+    )
+
+    parser.add_argument(
+        '--surrogate_penalty',
+        help='Relative penalty of the fitness extrapolated from the surrogate evaluation',
+        type=float,
+        default=0.1
+    )
+
+    parser.add_argument(
+        '--surrogate_timelimit',
+        help='Timelimit for the surrogate evaluation (by default, the one of the full evaluation)',
+        type=int,
+        default=None
+    )
+
+    parser.add_argument(
+        '--tracks',
+        help='Race every genome on several race configurations (e.g. config/*.xml), in parallel on the --workers ports',
+        type=str,
+        nargs='+',
+        default=None
+    )
+
+    parser.add_argument(
+        '--tracks_per_generation',
+        help='Number of the --tracks raced each generation, taken in turn (by default, all of them)',
+        type=int,
+        default=None
+    )
+
+    parser.add_argument(
+        '--aggregation',
+        help='Aggregation of the fitness values of a genome on the tracks',
+        type=str,
+        choices=multitrack.aggregations,
+        default='mean'
+    )
+
+    parser.add_argument(
+        '--cvar_alpha',
+        help='Fraction of the worst fitness values averaged by the "cvar" aggregation',
+        type=float,
+        default=0.25
+    )
+
+    parser.add_argument(
+        '--early_stop',
+        help='Let the drivers stop the races which cannot beat the worst elite of their species anymore (needs --timelimit)',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '-m',
+        '--fitness_cache',
+        help='Reuse the fitness of already evaluated genomes: "always", "average" (average over --cache_samples races) or "interval" (race again every --cache_interval generations)',
+        type=str,
+        choices=FitnessCache.allowed_policies,
+        default=None
+    )
+
+    parser.add_argument(
+        '--cache_samples',
+        help='Number of fitness values averaged by the fitness cache',
+        type=int,
+        default=1
+    )
+
+    parser.add_argument(
+        '--cache_interval',
+        help='Generations after which a cached genome is evaluated again ("interval" policy)',
+        type=int,
+        default=None
+    )
+    
+    parser.add_argument(
+        '--distance_cache',
+        help='Remember up to this number of genome distances computed by the speciation',
+        type=int,
+        default=None
+    )
+    
     args, _ = parser.parse_known_args()
     
+    if args.tracks and args.track is not None:
+        parser.error('--track cannot be combined with --tracks (every track would race the same track file)')
+    
     run(**args.__dict__)
@@ -0,0 +1,309 @@
+"""
+Headless stand-in for the TORCS SCRC server, to evaluate drivers without running TORCS.
+
+It speaks the same UDP protocol as the scr_server driver module (identification, sensor and command messages,
+'***identified***' and '***shutdown***'), one port for each scr_server driver of the race configuration, but the
+cars are simulated by the kinematic model of kinematics.py on a track built from the configuration's track name
+(see kinematics.builtin_tracks) or read from a track file. The simulation runs as fast as the clients answer.
+
+Usage, as a replacement of 'torcs -r configuration.xml':
+    python scrc_server.py [-t track_file] [--timelimit seconds] configuration.xml
+"""
+from __future__ import print_function
+
+import argparse
+import re
+import select
+import socket
+import sys
+import time
+
+import numpy as np
+
+import kinematics
+
+
+MSG_IDENTIFIED = b'***identified***'
+MSG_SHUTDOWN = b'***shutdown***'
+
+#the driver with index i of the configuration is served on this port + i
+base_port = 3001
+
+#default directions of the range finders (degrees, positive on the right), if the client does not send them
+default_angles = [-90, -75, -60, -45, -30, -20, -15, -10, -5, 0, 5, 10, 15, 20, 30, 45, 60, 75, 90]
+
+#distance of the first car from the start line and between the cars of the starting grid
+grid_distance = 25.0
+grid_spacing = 10.0
+
+SENSOR_TEMPLATE = ('(angle {:.6f})(curLapTime {:.3f})(damage {:.0f})(distFromStart {:.4f})(distRaced {:.4f})'
+                   '(fuel 94)(gear {:d})(lastLapTime {:.3f})(opponents' + ' 200' * 36 + ')(racePos {:d})'
+                   '(rpm {:.3f})(speedX {:.5f})(speedY 0)(speedZ 0)(track {})(trackPos {:.6f})'
+                   '(wheelSpinVel {w:.4f} {w:.4f} {w:.4f} {w:.4f})(z 0.35)(focus -1 -1 -1 -1 -1)')
+
+_init_regex = re.compile(br'\(init ([^)]*)\)')
+_command_regex = re.compile(br'\((\w+) ([^)]*)\)')
+
+
+def parse_command(buffer):
+    """ Returns the dictionary of the (numeric) values of a command message """
+    command = {}
+    for key, value in _command_regex.findall(buffer):
+        try:
+            command[key.decode()] = float(value.split()[0])
+        except (ValueError, IndexError):
+            pass
+    return command
+
+
+class SCRCServer(object):
+    """
+    Simulates a race of the clients connecting to the given ports on 'track'. The race ends when every car
+    has completed 'laps' laps, after 'timelimit' seconds of race, when a client asks to stop it (meta command)
+    or when no client answers for 'abandon_timeout' seconds.
+    """
+
+    def __init__(self, track, ports, laps=1, timelimit=None, timestep=0.02, client_timeout=1.0,
+                 abandon_timeout=10.0, verbose=True):
+        self.track = track
+        self.ports = list(ports)
+        self.laps = laps
+        self.timelimit = timelimit
+        self.timestep = timestep
+        self.client_timeout = client_timeout
+        self.abandon_timeout = abandon_timeout
+        self.verbose = verbose
+
+        count = len(self.ports)
+        self.cars = kinematics.Cars(track, count, -(grid_distance + grid_spacing * np.arange(count)))
+
+        self.sockets = []
+        for port in self.ports:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.bind(('', port))
+            self.sockets.append(s)
+
+        self.addresses = [None] * count
+        self.angles = [np.radians(-np.asarray(default_angles, dtype=float))] * count
+
+        self.time = 0.0
+        self.lap_start = np.zeros(count)
+        self.last_lap_time = np.zeros(count)
+        #number of times each car crossed the start line (the first crossing starts the first lap)
+        self.crossings = np.zeros(count, dtype=int)
+        self.finished = np.zeros(count, dtype=bool)
+
+        self.accelerator = np.zeros(count)
+        self.brake = np.zeros(count)
+        self.gear = np.zeros(count, dtype=int)
+        self.steering = np.zeros(count)
+        self.stop_requested = False
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+            sys.stdout.flush()
+
+    def close(self):
+        for s in self.sockets:
+            s.close()
+
+    def _identify(self, i, buffer, address):
+        match = _init_regex.search(buffer)
+        if match is not None:
+            angles = [float(a) for a in match.group(1).split()]
+            if len(angles) == len(default_angles):
+                self.angles[i] = np.radians(-np.asarray(angles))
+        self.addresses[i] = address
+        self.sockets[i].sendto(MSG_IDENTIFIED, address)
+        self.log('Client identified on port', self.ports[i])
+
+    def wait_for_clients(self, timeout=None):
+        """ Waits for the identification of a client on every port; returns False on timeout """
+
+        deadline = None if timeout is None else time.time() + timeout
+        while None in self.addresses:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+
+            ready, _, _ = select.select(self.sockets, [], [], remaining)
+            for s in ready:
+                i = self.sockets.index(s)
+                buffer, address = s.recvfrom(1000)
+                if _init_regex.search(buffer) is not None:
+                    self._identify(i, buffer, address)
+        return True
+
+    def sensors(self, i, edges, race_positions):
+        cars = self.cars
+        distances = ' '.join('{:.4f}'.format(v) for v in edges[i])
+        return SENSOR_TEMPLATE.format(
+            -cars.psi[i],
+            self.time - self.lap_start[i],
+            cars.damage[i],
+            cars.s[i] % self.track.length,
+            cars.distance_raced[i],
+            int(cars.gear[i]),
+            self.last_lap_time[i],
+            int(race_positions[i]),
+            cars.rpm[i],
+            cars.speed[i] * 3.6,
+            distances,
+            cars.track_position()[i],
+            w=cars.speed[i] / cars.wheel_radius
+        ).encode()
+
+    def send_sensors(self):
+        cars = self.cars
+        edges = np.stack([cars.track.edge_distances(cars.s[i:i + 1], cars.d[i:i + 1], cars.psi[i:i + 1],
+                                                    self.angles[i])[0]
+                          for i in range(cars.count)])
+        edges[np.abs(cars.track_position()) > 1] = -1.0
+        race_positions = np.empty(cars.count, dtype=int)
+        race_positions[np.argsort(-cars.s, kind='stable')] = np.arange(1, cars.count + 1)
+
+        for i, s in enumerate(self.sockets):
+            s.sendto(self.sensors(i, edges, race_positions), self.addresses[i])
+
+    def receive_commands(self):
+        """ Waits for a command from every client; returns the number of commands received """
+
+        waiting = set(range(len(self.sockets)))
+        received = 0
+        deadline = time.time() + self.client_timeout
+        while waiting:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            ready, _, _ = select.select([self.sockets[i] for i in waiting], [], [], remaining)
+            for s in ready:
+                i = self.sockets.index(s)
+                buffer, address = s.recvfrom(1000)
+                if _init_regex.search(buffer) is not None:
+                    #the client has been restarted
+                    self._identify(i, buffer, address)
+                    continue
+
+                command = parse_command(buffer)
+                self.accelerator[i] = command.get('accel', self.accelerator[i])
+                self.brake[i] = command.get('brake', self.brake[i])
+                self.gear[i] = int(command.get('gear', self.gear[i]))
+                self.steering[i] = command.get('steer', self.steering[i])
+                if command.get('meta', 0) == 1:
+                    self.log('Client on port', self.ports[i], 'asked to stop the race')
+                    self.stop_requested = True
+                waiting.discard(i)
+                received += 1
+        return received
+
+    def step(self):
+        cars = self.cars
+        cars.step(self.timestep, self.accelerator, self.brake, self.gear, self.steering)
+        self.time += self.timestep
+
+        crossings = np.floor(cars.s / self.track.length).astype(int) + 1
+        crossed = crossings > self.crossings
+        if crossed.any():
+            self.last_lap_time[crossed] = self.time - self.lap_start[crossed]
+            self.lap_start[crossed] = self.time
+            self.crossings[crossed] = crossings[crossed]
+            #a lap is completed at every crossing after the first one
+            self.finished |= self.crossings > self.laps
+
+    def run(self):
+        """ Runs the race and returns the final state of the cars """
+
+        self.log('Waiting for', len(self.ports), 'client(s) on ports', self.ports, 'to race on', self.track)
+        self.wait_for_clients()
+        self.log('Race started')
+
+        last_answer = time.time()
+        while not self.finished.all() and not self.stop_requested:
+            if self.timelimit is not None and self.time >= self.timelimit:
+                self.log('Time limit reached')
+                break
+
+            self.send_sensors()
+            if self.receive_commands() > 0:
+                last_answer = time.time()
+            elif time.time() - last_answer > self.abandon_timeout:
+                self.log('No answer from the clients, race abandoned')
+                break
+            self.step()
+
+        for i, s in enumerate(self.sockets):
+            s.sendto(MSG_SHUTDOWN, self.addresses[i])
+
+        results = self.results()
+        for port, r in zip(self.ports, results):
+            self.log('Port {}: {} laps, {:.1f} m raced, {:.2f} s, damage {:.0f}'.format(
+                port, r['laps'], r['distance'], r['time'], r['damage']))
+        return results
+
+    def results(self):
+        return [{'laps': max(int(self.crossings[i]) - 1, 0),
+                 'distance': float(self.cars.distance_raced[i]),
+                 'time': self.time,
+                 'damage': float(self.cars.damage[i])}
+                for i in range(self.cars.count)]
+
+
+def server_from_configuration(configuration, track_file=None, **kwargs):
+    """ Creates the server of a TORCS race configuration (optionally on the track of a track file) """
+
+    race = kinematics.read_configuration(configuration)
+    if not race['drivers']:
+        raise ValueError('No scr_server driver in the configuration {}'.format(configuration))
+
+    if track_file is not None:
+        track = kinematics.load_track(track_file)
+    else:
+        track = kinematics.builtin_track(race['name'], race['category'])
+
+    return SCRCServer(track, [base_port + i for i in race['drivers']], laps=race['laps'], **kwargs)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Headless SCRC server simulating races with a kinematic car model'
+    )
+
+    parser.add_argument(
+        'configuration',
+        help='TORCS race configuration (track name, laps and scr_server drivers)',
+        type=str
+    )
+
+    parser.add_argument(
+        '-t',
+        '--track',
+        help='Track file to race on, instead of the built-in model of the configuration\'s track',
+        type=str,
+        default=None
+    )
+
+    parser.add_argument(
+        '--timelimit',
+        help='Maximum (simulated) duration of the race, in seconds',
+        type=float,
+        default=None
+    )
+
+    parser.add_argument(
+        '-q',
+        '--quiet',
+        help='Do not print the progress of the race',
+        action='store_true'
+    )
+
+    args = parser.parse_args()
+
+    server = server_from_configuration(args.configuration, args.track, timelimit=args.timelimit,
+                                       verbose=not args.quiet)
+    try:
+        server.run()
+    finally:
+        server.close()
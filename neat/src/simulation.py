@@ -13,6 +13,17 @@ import traceback
 import time
 import signal
 import glob
+import hashlib
+import re
+import select
+import socket
+import errno
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 sys.path.insert(0, '../')
 
@@ -25,10 +36,104 @@ FILE_PATH = os.path.realpath(__file__)
 DIR_PATH = os.path.dirname(FILE_PATH)
 
 client_path = os.path.join(DIR_PATH, '../../torcs-client/')
+
+#framing of the in-memory model/results handoff is shared with the client
+sys.path.append(client_path)
+import handoff as client_handoff
 shutdown_wait = 10
-result_saving_wait = 1
 timeout_server = 100
 
+#commands used to start the simulator and the driver client; they can be replaced by stubs (e.g. stub_race.py, for
+#testing) by passing them to evaluate, since its defaults are bound to these lists when it is defined
+server_command = ['time', 'torcs', '-nofuel', '-nolaptime', '-r']
+client_command = ['./start.sh']
+
+#headless SCRC server (kinematic car model, see scrc_server.py), which can replace TORCS as server_command
+simulator_command = [sys.executable, os.path.join(DIR_PATH, 'scrc_server.py'), '-q']
+
+#ports of the SCRC servers: port 3001 + i is served to the i-th scr_server driver of the race
+scrc_ports = list(range(3001, 3011))
+
+
+def wait_for_exit(pipe, timeout):
+    """
+    Waits until every process holding the write end of 'pipe' has exited (the read end reaches EOF),
+    or until 'timeout' seconds have passed. Returns True if all the processes exited.
+    """
+    
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        
+        try:
+            ready, _, _ = select.select([pipe], [], [], remaining)
+        except (OSError, select.error) as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        
+        if ready and not os.read(pipe, 4096):
+            return True
+
+
+def wait_for_race(server, client_end, timeout):
+    """
+    Waits until the server exits or 'client_end' (a pipe or socket) becomes readable, i.e. the client ended the
+    race on its own (e.g. its driver stopped a hopeless race early). Returns True in the latter case.
+    Raises subprocess.TimeoutExpired if neither happens within 'timeout' seconds.
+    """
+    
+    deadline = time.time() + timeout
+    while server.poll() is None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(server.args, timeout)
+        
+        try:
+            ready, _, _ = select.select([client_end], [], [], min(remaining, 0.5))
+        except (OSError, select.error) as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        
+        if ready:
+            return True
+    
+    return False
+
+
+def stop_server(server, wait=shutdown_wait):
+    """ Stops a server whose race is over for the client """
+    
+    print('Client ended the race, stopping the server')
+    signal_group(server, signal.SIGTERM)
+    try:
+        server.wait(timeout=wait)
+    except subprocess.TimeoutExpired:
+        signal_group(server, signal.SIGKILL)
+        server.wait()
+
+
+def early_stop_args(early_stop):
+    """ Client arguments of an early stop (threshold, timelimit, fitness file) spec """
+    
+    if early_stop is None:
+        return []
+    
+    threshold, timelimit, fitness_path = early_stop
+    return (['--stop_threshold', repr(float(threshold)), '--timelimit', repr(float(timelimit))]
+            + (['--fitness', fitness_path] if fitness_path is not None else []))
+
+
+def signal_group(process, sig):
+    """ Sends the signal to the process group of 'process' (if it still exists) """
+    try:
+        os.killpg(os.getpgid(process.pid), sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
 
 def evaluate(net,
              configuration,
@@ -38,9 +143,20 @@ def evaluate(net,
              port=3001,
              client_path = client_path,
              shutdown_wait = shutdown_wait,
-             result_saving_wait = result_saving_wait,
              timeout_server = timeout_server,
-             unstuck=False):
+             unstuck=False,
+             server_command = server_command,
+             client_command = client_command,
+             handoff = False,
+             early_stop = None):
+    """
+    Races the network and returns the list of result rows saved by the driver (None if there are none).
+    
+    If handoff is True, the network is sent to the client and the results are received back over an
+    inherited Unix socket, instead of going through the model and results files.
+    early_stop is the (threshold, timelimit, fitness file) spec with which the driver stops a race that
+    cannot reach the threshold anymore (see torcs-client/early_stop.py), or None.
+    """
     
     
     
@@ -52,9 +168,15 @@ def evaluate(net,
     results_file = os.path.join(results_path, 'results_{}'.format(current_time))
     phenotype_file = os.path.join(models_path, "model_{}.pickle".format(current_time))
     
-    pickle.dump(net, open(phenotype_file, "wb"))
-    
-    print('Results at', results_file)
+    if handoff:
+        parent_socket, child_socket = socket.socketpair()
+        client_args = ['-s', str(child_socket.fileno())]
+        client_fds = (child_socket.fileno(),)
+    else:
+        pickle.dump(net, open(phenotype_file, "wb"))
+        print('Results at', results_file)
+        client_args = ['-w', phenotype_file, '-o', results_file]
+        client_fds = ()
     
     client_stdout_path = os.path.join(debug_path, 'client/out.log')
     client_stderr_path = os.path.join(debug_path, 'client/err.log')
@@ -71,14 +193,23 @@ def evaluate(net,
     
     server = None
 
+    #every process of the client inherits the write end of this pipe: the read end reaches EOF as soon as
+    #all of them have exited, i.e. as soon as the results file has been written and closed
+    exit_pipe, exit_pipe_w = os.pipe()
+
     print('Starting Client')
-    client = subprocess.Popen(['./start.sh', '-p', str(port), '-w', phenotype_file, '-o', results_file, '-d', 'Driver2']
-                                    + (['-u'] if unstuck else []),
+    client = subprocess.Popen(client_command + ['-p', str(port)] + client_args + ['-d', 'Driver2']
+                                    + (['-u'] if unstuck else []) + early_stop_args(early_stop),
                               stdout=client_stdout,
                               stderr=client_stderr,
                               cwd=client_path,
-                              preexec_fn=os.setsid
+                              preexec_fn=os.setsid,
+                              pass_fds=(exit_pipe_w,) + client_fds
                               )
+    os.close(exit_pipe_w)
+    
+    if handoff:
+        child_socket.close()
     
     
     # wait a second to let client start
@@ -87,20 +218,20 @@ def evaluate(net,
     timeout = False
     try:
         
+        if handoff:
+            client_handoff.send_model(parent_socket, net)
+        
         print('Waiting for server to stop')
         server = subprocess.Popen(
-                                ['time',
-                                'torcs',
-                                '-nofuel',
-                                '-nolaptime',
-                                '-r',
-                                configuration],
+                                server_command + [configuration],
                                 stdout=server_stdout,
                                 stderr=server_stderr,
                                 preexec_fn=os.setsid
                                 )
         
-        server.wait(timeout=timeout_server)
+        #the client exits at the end of the race, or as soon as its driver stops it
+        if wait_for_race(server, exit_pipe, timeout_server):
+            stop_server(server)
     
     except subprocess.TimeoutExpired:
         print('SERVER TIMED-OUT!')
@@ -108,25 +239,32 @@ def evaluate(net,
         
         if server is not None:
             print('Killing server and its children')
-            os.killpg(os.getpgid(server.pid), signal.SIGTERM)
+            signal_group(server, signal.SIGTERM)
         
         copy_path = os.path.join(debug_path, 'model_timedout_{}.pickle'.format(current_time))
         
         print('Copying the model which caused the timeout to:', copy_path)
-        copyfile(phenotype_file, copy_path)
+        if handoff:
+            pickle.dump(net, open(copy_path, "wb"))
+        else:
+            copyfile(phenotype_file, copy_path)
     except:
         print('Ops! Something happened"')
         traceback.print_exc()
 
         if server is not None:
             print('Killing server and its children')
-            os.killpg(os.getpgid(server.pid), signal.SIGTERM)
+            signal_group(server, signal.SIGTERM)
 
         client.terminate()
-        time.sleep(1)
-        if client.poll() is None:
+        try:
+            client.wait(timeout=1)
+        except subprocess.TimeoutExpired:
             client.kill()
         
+        os.close(exit_pipe)
+        if handoff:
+            parent_socket.close()
         for file in opened_files:
             file.close()
             
@@ -140,17 +278,18 @@ def evaluate(net,
     
     print('Killing client')
 
-    #Try to be gentle
-    os.killpg(os.getpgid(client.pid), signal.SIGTERM)
+    #Try to be gentle (the client usually already stopped by itself when the server shut down)
+    signal_group(client, signal.SIGTERM)
     
-    #give it some time to stop gracefully
-    client.wait(timeout=shutdown_wait)
-    
-    #if it is still running, kill it
-    if client.poll() is None:
+    #give it some time to save the results and stop gracefully
+    if not wait_for_exit(exit_pipe, shutdown_wait):
+        #if it is still running, kill it
         print('\tTrying to kill client')
-        os.killpg(os.getpgid(client.pid), signal.SIGKILL)
-        time.sleep(shutdown_wait)
+        signal_group(client, signal.SIGKILL)
+        wait_for_exit(exit_pipe, shutdown_wait)
+    
+    client.wait()
+    os.close(exit_pipe)
     
     for file in opened_files:
         file.close()
@@ -164,17 +303,23 @@ def evaluate(net,
     
     print('Simulation ended')
     
-
-    #wait a second for the results file to be created
-    time.sleep(2)
-    
-    #if the result file hasn't been created yet, try 10 times waiting 'result_saving_wait' seconds between each attempt
-    attempts = 0
-    while not os.path.exists(results_file) and attempts < 10:
-        attempts += 1
-        print('Attempt', attempts, 'Time =', datetime.datetime.now().isoformat())
-        time.sleep(result_saving_wait + attempts -1)
+    if handoff:
+        #the client has exited, so the socket holds all the results it sent
+        values = client_handoff.recv_results(parent_socket)
+        parent_socket.close()
+        
+        if values is None:
+            print("No results received from the client!")
+            copyfile(client_stdout_path, os.path.join(debug_path, 'client/ERROR_out_{}.log'.format(current_time)))
+            copyfile(client_stderr_path, os.path.join(debug_path, 'client/ERROR_err_{}.log'.format(current_time)))
+            copyfile(server_stdout_path, os.path.join(debug_path, 'server/ERROR_out_{}.log'.format(current_time)))
+            copyfile(server_stderr_path, os.path.join(debug_path, 'server/ERROR_err_{}.log'.format(current_time)))
+        
+        print('Total Execution Time =', time.time() - start_time, 'seconds')
         
+        return values
+    
+    #all the client processes have exited: if the results file exists, it is complete
     #try opening the file
     try:
         results = open(results_file, 'r')
@@ -210,6 +355,168 @@ def evaluate(net,
 
 
 
+class ClientWorker(object):
+    """
+    Persistent driver client (run.py in worker mode), reused across evaluations: it receives the
+    networks to race over a Unix socket and sends back their results, so that each evaluation does
+    not pay for the client start-up (Python, NumPy, socket setup...).
+    """
+    
+    def __init__(self, debug_path, client_path=client_path, client_command=client_command, driver='Driver2'):
+        self.client_path = client_path
+        self.client_command = client_command
+        self.driver = driver
+        self.stdout_path = os.path.join(debug_path, 'client/worker_out.log')
+        self.stderr_path = os.path.join(debug_path, 'client/worker_err.log')
+        self.process = None
+        self.socket = None
+    
+    def start(self):
+        self.socket, child_socket = socket.socketpair()
+        
+        with open(self.stdout_path, 'a') as stdout, open(self.stderr_path, 'a') as stderr:
+            self.process = subprocess.Popen(self.client_command + ['--worker', '-s', str(child_socket.fileno()), '-d', self.driver],
+                                            stdout=stdout,
+                                            stderr=stderr,
+                                            cwd=self.client_path,
+                                            preexec_fn=os.setsid,
+                                            pass_fds=(child_socket.fileno(),)
+                                            )
+        child_socket.close()
+    
+    def restart(self):
+        print('Restarting client worker')
+        self.close(timeout=0)
+        self.start()
+    
+    def submit(self, net, port, unstuck, early_stop=None):
+        #the worker is started by the first job
+        if self.process is None:
+            self.start()
+        try:
+            client_handoff.send_job(self.socket, net, port, unstuck, early_stop)
+        except OSError:
+            #the worker died after its last job
+            self.restart()
+            client_handoff.send_job(self.socket, net, port, unstuck, early_stop)
+    
+    def collect(self, timeout):
+        """
+        Waits for the results of the current job. If they do not arrive within 'timeout' seconds, the race is
+        interrupted, and if the worker still does not answer it is restarted. Returns None if there are no results.
+        """
+        
+        values, status = client_handoff.recv_job_results(self.socket, timeout)
+        
+        if status == 'timeout':
+            print('\tInterrupting client worker')
+            try:
+                os.kill(self.process.pid, signal.SIGUSR1)
+            except ProcessLookupError:
+                pass
+            more_values, status = client_handoff.recv_job_results(self.socket, timeout)
+            if more_values is not None:
+                values = more_values
+        
+        if status != 'done':
+            self.restart()
+        
+        return values
+    
+    def close(self, timeout=shutdown_wait):
+        if self.process is None:
+            return
+        
+        #the worker exits when its socket is closed
+        self.socket.close()
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            signal_group(self.process, signal.SIGKILL)
+            self.process.wait()
+        self.process = None
+
+
+def evaluate_on_worker(net,
+                       worker,
+                       configuration,
+                       debug_path,
+                       port=3001,
+                       shutdown_wait = shutdown_wait,
+                       timeout_server = timeout_server,
+                       unstuck=False,
+                       server_command = server_command,
+                       early_stop = None):
+    """ Same as evaluate, but the network is raced by a persistent ClientWorker """
+    
+    current_time = datetime.datetime.now().isoformat()
+    start_time = time.time()
+    
+    server_stdout_path = os.path.join(debug_path, 'server/out.log')
+    server_stderr_path = os.path.join(debug_path, 'server/err.log')
+    
+    def save_logs(label):
+        copyfile(worker.stdout_path, os.path.join(debug_path, 'client/{}_out_{}.log'.format(label, current_time)))
+        copyfile(worker.stderr_path, os.path.join(debug_path, 'client/{}_err_{}.log'.format(label, current_time)))
+        copyfile(server_stdout_path, os.path.join(debug_path, 'server/{}_out_{}.log'.format(label, current_time)))
+        copyfile(server_stderr_path, os.path.join(debug_path, 'server/{}_err_{}.log'.format(label, current_time)))
+    
+    server = None
+    timeout = False
+    with open(server_stdout_path, 'w') as server_stdout, open(server_stderr_path, 'w') as server_stderr:
+        try:
+            worker.submit(net, port, unstuck, early_stop)
+            
+            print('Waiting for server to stop')
+            server = subprocess.Popen(
+                                    server_command + [configuration],
+                                    stdout=server_stdout,
+                                    stderr=server_stderr,
+                                    preexec_fn=os.setsid
+                                    )
+            
+            #the worker sends its results at the end of the race, or as soon as its driver stops it
+            if wait_for_race(server, worker.socket, timeout_server):
+                stop_server(server)
+        
+        except subprocess.TimeoutExpired:
+            print('SERVER TIMED-OUT!')
+            timeout = True
+            
+            print('Killing server and its children')
+            signal_group(server, signal.SIGTERM)
+            
+            copy_path = os.path.join(debug_path, 'model_timedout_{}.pickle'.format(current_time))
+            print('Copying the model which caused the timeout to:', copy_path)
+            pickle.dump(net, open(copy_path, "wb"))
+        except:
+            print('Ops! Something happened"')
+            traceback.print_exc()
+            
+            if server is not None:
+                print('Killing server and its children')
+                signal_group(server, signal.SIGTERM)
+            
+            worker.restart()
+            save_logs('ERROR')
+            raise
+    
+    values = worker.collect(shutdown_wait)
+    
+    if timeout:
+        save_logs('timeout')
+    
+    print('Simulation ended')
+    
+    if values is None:
+        print("No results received from the client!")
+        save_logs('ERROR')
+    
+    print('Total Execution Time =', time.time() - start_time, 'seconds')
+    
+    return values
+
+
 def clean_temp_files(results_path, models_path):
     print('Cleaning directories')
     for zippath in glob.iglob(os.path.join(DIR_PATH, results_path, 'results_*')):
@@ -223,7 +530,10 @@ def initialize_experiments(
             output_dir,
             configuration=None,
             port=3001,
-            unstuck=False):
+            unstuck=False,
+            handoff=False,
+            persistent=False,
+            server_command=server_command):
         
     results_path = os.path.join(output_dir, 'results')
     models_path = os.path.join(output_dir, 'models')
@@ -254,8 +564,161 @@ def initialize_experiments(
         raise FileNotFoundError('Error! Configuration file "{}" does not exist in {}'.format(configuration))
     
     
-    eval = lambda net, unstuck=unstuck: evaluate(net, configuration=configuration, unstuck=unstuck, port=port,
-                                                         debug_path=debug_path,
-                                                         results_path=results_path, models_path=models_path)
+    if persistent:
+        worker = ClientWorker(debug_path)
+        eval = lambda net, unstuck=unstuck, early_stop=None: evaluate_on_worker(net, worker, configuration=configuration, unstuck=unstuck, port=port,
+                                                                                debug_path=debug_path, server_command=server_command,
+                                                                                early_stop=early_stop)
+    else:
+        eval = lambda net, unstuck=unstuck, early_stop=None: evaluate(net, configuration=configuration, unstuck=unstuck, port=port, handoff=handoff,
+                                                                      debug_path=debug_path, server_command=server_command,
+                                                                      results_path=results_path, models_path=models_path,
+                                                                      early_stop=early_stop)
+        
+    return results_path, models_path, debug_path, checkpoints_path, eval
+
+
+
+def port_configuration(configuration, port, destination):
+    """
+    Copies the race configuration to 'destination', changing the index of its (first) scr_server driver
+    so that the server listens on the given port (index i is served on port 3001 + i).
+    The other scr_server drivers (e.g. of config/quickrace_multiplayer.xml) are removed from the copy: their server
+    would wait for clients on the ports of the other slots, so the network of the slot races alone.
+    """
+    
+    with open(configuration, 'r') as f:
+        xml = f.read()
+    
+    driver_pattern = re.compile(r'(\s*<section name="\d+">\s*<attnum name="idx" val=")(\d+)'
+                                r'("/>\s*<attstr name="module" val="scr_server"/>\s*</section>)')
+    
+    drivers = list(driver_pattern.finditer(xml))
+    if not drivers:
+        raise ValueError('Configuration "{}" does not contain any scr_server driver'.format(configuration))
+    
+    first = drivers[0]
+    copy = [xml[:first.start()], first.group(1), str(port - scrc_ports[0]), first.group(3)]
+    end = first.end()
+    for driver in drivers[1:]:
+        copy.append(xml[end:driver.start()])
+        end = driver.end()
+    copy.append(xml[end:])
+    
+    with open(destination, 'w') as f:
+        f.write(''.join(copy))
+    
+    return destination
+
+
+class EvaluationFarm(object):
+    """
+    Pool of simulator slots, one for each port, which evaluates many networks at the same time.
+    
+    Each slot runs its own server/client pair, with its own copy of the race configuration and its own
+    results, models and debug directories (in <output_dir>/slots/port_<port>/).
+    The networks to evaluate are queued and each one is raced by the first slot which gets free, on the
+    farm's race configuration or on its own one (e.g. to race on several tracks).
+    """
+    
+    def __init__(self, output_dir, configuration, ports=scrc_ports, unstuck=False, persistent=False, **evaluate_args):
+        
+        for port in ports:
+            if port not in scrc_ports:
+                raise ValueError('Port {} is not a SCRC port ({}-{})'.format(port, scrc_ports[0], scrc_ports[-1]))
         
-    return results_path, models_path, debug_path, checkpoints_path, eval
\ No newline at end of file
+        if persistent:
+            #persistent workers always exchange models and results over their socket
+            evaluate_args.pop('handoff', None)
+        
+        self.unstuck = unstuck
+        self.evaluate_args = evaluate_args
+        self.slots = []
+        
+        for port in ports:
+            slot_dir = os.path.realpath(os.path.join(output_dir, 'slots', 'port_{}'.format(port)))
+            results_path = os.path.join(slot_dir, 'results')
+            models_path = os.path.join(slot_dir, 'models')
+            debug_path = os.path.join(slot_dir, 'debug')
+            
+            for d in [os.path.join(debug_path, 'client'), os.path.join(debug_path, 'server'), models_path, results_path]:
+                if not os.path.exists(d):
+                    os.makedirs(d)
+            
+            self.slots.append({'port': port,
+                               'dir': slot_dir,
+                               'configuration': port_configuration(configuration, port, os.path.join(slot_dir, 'configuration.xml')),
+                               'configurations': {},
+                               'results_path': results_path,
+                               'models_path': models_path,
+                               'debug_path': debug_path,
+                               'worker': ClientWorker(debug_path) if persistent else None})
+    
+    def size(self):
+        return len(self.slots)
+    
+    def slot_configuration(self, slot, configuration):
+        """ Copy of a race configuration for the port of the slot (made once for each configuration) """
+        
+        if configuration is None:
+            return slot['configuration']
+        
+        configuration = os.path.realpath(configuration)
+        if configuration not in slot['configurations']:
+            #configurations with the same name in different directories get different copies
+            digest = hashlib.sha1(configuration.encode()).hexdigest()[:10]
+            name = 'configuration_{}_{}'.format(digest, os.path.basename(configuration))
+            slot['configurations'][configuration] = port_configuration(configuration, slot['port'],
+                                                                       os.path.join(slot['dir'], name))
+        return slot['configurations'][configuration]
+    
+    def evaluate(self, nets, unstuck=None, early_stops=None, configurations=None):
+        """
+        Races all the networks and returns the list of their results (in the same order).
+        early_stops is the list of the early stop specs of the networks (see evaluate), or None.
+        configurations is the list of the race configurations of the networks, or None to race all of them
+        on the farm's one.
+        """
+        
+        if unstuck is None:
+            unstuck = self.unstuck
+        if early_stops is None:
+            early_stops = [None] * len(nets)
+        if configurations is None:
+            configurations = [None] * len(nets)
+        
+        free_slots = queue.Queue()
+        for slot in self.slots:
+            free_slots.put(slot)
+        
+        def run(net, early_stop, configuration):
+            slot = free_slots.get()
+            try:
+                print('Evaluating on port', slot['port'], 'in thread', threading.current_thread().name)
+                if slot['worker'] is not None:
+                    return evaluate_on_worker(net,
+                                              slot['worker'],
+                                              configuration=self.slot_configuration(slot, configuration),
+                                              debug_path=slot['debug_path'],
+                                              port=slot['port'],
+                                              unstuck=unstuck,
+                                              early_stop=early_stop,
+                                              **self.evaluate_args)
+                return evaluate(net,
+                                configuration=self.slot_configuration(slot, configuration),
+                                debug_path=slot['debug_path'],
+                                models_path=slot['models_path'],
+                                results_path=slot['results_path'],
+                                port=slot['port'],
+                                unstuck=unstuck,
+                                early_stop=early_stop,
+                                **self.evaluate_args)
+            finally:
+                free_slots.put(slot)
+        
+        with ThreadPoolExecutor(max_workers=len(self.slots)) as executor:
+            return list(executor.map(run, nets, early_stops, configurations))
+    
+    def clean_temp_files(self):
+        for slot in self.slots:
+            clean_temp_files(slot['results_path'], slot['models_path'])
@@ -0,0 +1,109 @@
+"""
+Stub server and client replacing TORCS and the driver client of simulation.evaluate, e.g. for tests and
+benchmarks of the evaluation machinery (no simulator nor display is needed).
+
+The server reads the index of the scr_server driver of its race configuration and listens on the matching port
+(3001 + index), like TORCS. The client, started with the arguments of run.py, greets the server on its port until
+it answers, waits for the end of the "race" and saves one result row: the network (a number), the port, then
+zeros. The server ends the race after --duration seconds, then exits.
+
+    python stub_race.py server [--duration 0.2] configuration
+    python stub_race.py client -p port (-w model -o results | -s handoff_fd) [other run.py arguments]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import pickle
+import re
+import socket
+import sys
+import time
+
+FILE_PATH = os.path.realpath(__file__)
+DIR_PATH = os.path.dirname(FILE_PATH)
+
+sys.path.append(os.path.join(DIR_PATH, '../../torcs-client/'))
+import handoff
+
+#seconds the server waits for its client
+connect_timeout = 30
+
+
+def server_port(configuration):
+    with open(configuration) as f:
+        xml = f.read()
+    index = re.search(r'<attnum name="idx" val="(\d+)"/>\s*<attstr name="module" val="scr_server"/>', xml)
+    return 3001 + int(index.group(1))
+
+
+def run_server(configuration, duration):
+    port = server_port(configuration)
+    print('Listening on port', port)
+    sys.stdout.flush()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('localhost', port))
+    sock.settimeout(connect_timeout)
+    _, client = sock.recvfrom(1024)
+    sock.sendto(b'***identified***', client)
+
+    time.sleep(duration)
+    sock.sendto(b'***shutdown***', client)
+    sock.close()
+
+
+def run_client(port, parameters_file, output_file, handoff_fd):
+    if handoff_fd is not None:
+        handoff_socket = socket.socket(fileno=handoff_fd)
+        net = handoff.recv_model(handoff_socket)
+    else:
+        with open(parameters_file, 'rb') as f:
+            net = pickle.load(f)
+
+    #the server may start after the client: greet it until it answers
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.05)
+    while True:
+        sock.sendto(b'stub(init)', ('localhost', port))
+        try:
+            if sock.recv(1024) == b'***identified***':
+                break
+        except (socket.timeout, ConnectionRefusedError):
+            pass
+
+    sock.settimeout(None)
+    while sock.recv(1024) != b'***shutdown***':
+        pass
+
+    rows = [[float(net), port, 0, 0, 0, 0, 0]]
+    if handoff_fd is not None:
+        handoff.send_results(handoff_socket, rows)
+        handoff_socket.close()
+    else:
+        with open(output_file, 'w') as f:
+            for row in rows:
+                f.write(','.join(str(v) for v in row) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub TORCS server and driver client')
+    subparsers = parser.add_subparsers(dest='role')
+
+    server_parser = subparsers.add_parser('server')
+    server_parser.add_argument('--duration', help='Duration of the race, in seconds', type=float, default=0.2)
+    server_parser.add_argument('configuration', help='Race configuration', type=str)
+
+    client_parser = subparsers.add_parser('client')
+    client_parser.add_argument('-p', '--port', type=int, default=3001)
+    client_parser.add_argument('-w', '--parameters_file', type=str)
+    client_parser.add_argument('-o', '--output_file', type=str)
+    client_parser.add_argument('-s', '--handoff_fd', type=int)
+
+    args, _ = parser.parse_known_args()
+
+    if args.role == 'server':
+        run_server(args.configuration, args.duration)
+    else:
+        run_client(args.port, args.parameters_file, args.output_file, args.handoff_fd)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_PATH)
+
+import multitrack
+
+
+def test_first_generation_races_the_first_tracks():
+    scheduler = multitrack.TrackScheduler(['a', 'b', 'c', 'd', 'e'], tracks_per_generation=2)
+
+    # the generations are numbered as Population.generation, from 0
+    assert scheduler.tracks(0) == ['a', 'b']
+    assert scheduler.tracks(1) == ['c', 'd']
+    assert scheduler.tracks(2) == ['e', 'a']
+
+
+def test_aggregations():
+    values = [4.0, 1.0, 3.0, 8.0]
+    assert multitrack.TrackScheduler(['a'], aggregation='mean').aggregate(values) == 4.0
+    assert multitrack.TrackScheduler(['a'], aggregation='min').aggregate(values) == 1.0
+    assert multitrack.TrackScheduler(['a'], aggregation='cvar', cvar_alpha=0.5).aggregate(values) == 2.0
@@ -0,0 +1,83 @@
+import glob
+import os
+import sys
+
+import pytest
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_PATH)
+
+import simulation
+
+STUB = os.path.join(SRC_PATH, 'stub_race.py')
+CONFIGURATION = os.path.join(SRC_PATH, '..', '..', 'config', 'aalborg.xml')
+
+
+def stub_commands(duration=0.3):
+    """ evaluate binds its default commands when it is defined, so the stubs are always passed explicitly """
+    return dict(server_command=[sys.executable, STUB, 'server', '--duration', str(duration)],
+                client_command=[sys.executable, STUB, 'client'],
+                client_path=SRC_PATH)
+
+
+@pytest.mark.parametrize('handoff', [False, True])
+def test_farm_races_on_every_port(tmp_path, handoff):
+    ports = [3005, 3006, 3007]
+    farm = simulation.EvaluationFarm(str(tmp_path), CONFIGURATION, ports=ports, handoff=handoff, **stub_commands())
+    nets = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+
+    results = farm.evaluate(nets)
+
+    # the results come back in the order of the networks, each from the client of one slot
+    assert [rows[0][0] for rows in results] == nets
+    assert set(rows[0][1] for rows in results) == set(ports)
+
+    # each slot races on its own copy of the configuration, served on its own port
+    for port in ports:
+        with open(os.path.join(str(tmp_path), 'slots', 'port_{}'.format(port), 'debug', 'server', 'out.log')) as f:
+            assert f.read().split() == ['Listening', 'on', 'port', str(port)]
+
+
+def test_farm_races_other_configurations(tmp_path):
+    farm = simulation.EvaluationFarm(str(tmp_path), CONFIGURATION, ports=[3005, 3006], **stub_commands(0.1))
+    other = os.path.join(SRC_PATH, '..', '..', 'config', 'forza.xml')
+
+    results = farm.evaluate([1.0, 2.0, 3.0], configurations=[other, None, other])
+
+    assert [rows[0][0] for rows in results] == [1.0, 2.0, 3.0]
+    # the other configuration is copied for the port of the slots which raced on it
+    assert glob.glob(os.path.join(str(tmp_path), 'slots', 'port_*', 'configuration_*forza*'))
+
+
+def test_farm_rejects_other_ports(tmp_path):
+    with pytest.raises(ValueError):
+        simulation.EvaluationFarm(str(tmp_path), CONFIGURATION, ports=[3001, 4000], **stub_commands())
+
+
+def test_configurations_with_the_same_name_get_their_own_copies(tmp_path):
+    farm = simulation.EvaluationFarm(str(tmp_path / 'farm'), CONFIGURATION, ports=[3005], **stub_commands())
+    slot = farm.slots[0]
+    copies = []
+    for track in ['first', 'second']:
+        os.makedirs(str(tmp_path / track))
+        with open(CONFIGURATION) as f, open(str(tmp_path / track / 'race.xml'), 'w') as copy:
+            copy.write(f.read().replace('aalborg', track))
+        copies.append(farm.slot_configuration(slot, str(tmp_path / track / 'race.xml')))
+
+    assert copies[0] != copies[1]
+    for track, copy in zip(['first', 'second'], copies):
+        with open(copy) as f:
+            assert track in f.read()
+
+
+@pytest.mark.parametrize('configuration', sorted(glob.glob(os.path.join(SRC_PATH, '..', '..', 'config', '*.xml'))),
+                         ids=os.path.basename)
+def test_farm_slots_are_built_from_every_shipped_configuration(tmp_path, configuration):
+    farm = simulation.EvaluationFarm(str(tmp_path), CONFIGURATION, ports=[3005], **stub_commands())
+
+    with open(farm.slot_configuration(farm.slots[0], configuration)) as f:
+        xml = f.read()
+
+    # a single scr_server driver, served on the port of the slot
+    assert xml.count('<attstr name="module" val="scr_server"/>') == 1
+    assert '<attnum name="idx" val="4"/>' in xml
@@ -22,7 +22,7 @@ def gauss_activation(z):
 
 
 def relu_activation(z):
-    return z if z > 0.0 else 0
+    return np.maximum(z, 0.0)
 
 
 def identity_activation(z):
@@ -37,10 +37,9 @@ def linear_logistic_activation(z):
 
 
 def inv_activation(z):
-    if z == 0:
-        return 0.0
-
-    return 1.0 / z
+    z = np.asarray(z, dtype=float)
+    zero = z == 0
+    return np.where(zero, 0.0, 1.0 / np.where(zero, 1.0, z))[()]
 
 
 def log_activation(z):
@@ -0,0 +1,118 @@
+"""
+Benchmark of the compatibility distances computed during speciation: Genome.distance on the gene dictionaries
+against PackedGenome.distance on the gene arrays (including the time to pack the genomes) and the distance
+matrix of neatsociety.speciation (including the time to build the gene index), optionally on a process pool.
+
+Run with ``python -m neatsociety.benchmark config_file [--pop_size 1000] [--species 60] [--workers N]``.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+from multiprocessing import Pool
+
+import numpy as np
+
+from neatsociety.config import Config
+from neatsociety.indexer import InnovationIndexer
+from neatsociety.speciation import GeneIndex, sharded_distance_matrix
+
+
+def create_genomes(config, pop_size, max_mutations=30, seed=0):
+    """ Random genomes, mutated a random number of times so that their structures differ. """
+    random.seed(seed)
+    innovation_indexer = InnovationIndexer(0)
+    genomes = []
+    for i in range(pop_size):
+        g = config.genotype.create_unconnected(i + 1, config)
+        if config.hidden_nodes > 0:
+            g.add_hidden_nodes(config.hidden_nodes)
+        if config.initial_connection == 'partial':
+            g.connect_partial(innovation_indexer, config.connection_fraction)
+        else:
+            g.connect_full(innovation_indexer)
+        for _ in range(random.randint(0, max_mutations)):
+            g.mutate(innovation_indexer)
+        genomes.append(g)
+    return genomes
+
+
+def speciation_distances(genomes, representatives):
+    return [[g.distance(r) for r in representatives] for g in genomes]
+
+
+def packed_speciation_distances(genomes, representatives):
+    representatives = [r.pack() for r in representatives]
+    return [[p.distance(r) for r in representatives] for p in (g.pack() for g in genomes)]
+
+
+def matrix_speciation_distances(genomes, representatives, pool=None):
+    config = genomes[0].config
+    coefficients = (config.excess_coefficient, config.disjoint_coefficient, config.weight_coefficient)
+    index = GeneIndex(genomes + representatives)
+    return sharded_distance_matrix(index.take(np.arange(len(genomes))),
+                                   index.take(np.arange(len(genomes), len(index))), coefficients, pool)
+
+
+def benchmark(config, pop_size=1000, num_species=60, repeat=1, pool=None):
+    """ Returns the best time, in seconds, of the distances of every genome to every species representative. """
+    genomes = create_genomes(config, pop_size)
+    representatives = random.sample(genomes, num_species)
+
+    distances = speciation_distances(genomes, representatives)
+    if distances != packed_speciation_distances(genomes, representatives):
+        raise Exception('The packed distances differ from Genome.distance')
+    # the sums of the matrix are not computed in the same order
+    if not np.allclose(distances, matrix_speciation_distances(genomes, representatives, pool), rtol=1e-12):
+        raise Exception('The distance matrix differs from Genome.distance')
+
+    steps = {
+        'Genome.distance': lambda: speciation_distances(genomes, representatives),
+        'PackedGenome.distance': lambda: packed_speciation_distances(genomes, representatives),
+        'distance matrix': lambda: matrix_speciation_distances(genomes, representatives),
+    }
+    if pool is not None:
+        steps['sharded distance matrix'] = lambda: matrix_speciation_distances(genomes, representatives, pool)
+
+    return dict((name, min(timeit.repeat(step, number=1, repeat=repeat))) for name, step in steps.items())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the speciation distances')
+
+    parser.add_argument(
+        'config',
+        help='NEAT configuration file',
+        type=str
+    )
+
+    parser.add_argument(
+        '-p',
+        '--pop_size',
+        help='Number of genomes',
+        type=int,
+        default=1000
+    )
+
+    parser.add_argument(
+        '-s',
+        '--species',
+        help='Number of species representatives',
+        type=int,
+        default=60
+    )
+
+    parser.add_argument(
+        '-w',
+        '--workers',
+        help='Number of processes computing the sharded distance matrix (none by default)',
+        type=int,
+        default=0
+    )
+
+    args = parser.parse_args()
+
+    pool = Pool(args.workers) if args.workers > 0 else None
+    for name, seconds in benchmark(Config(args.config), args.pop_size, args.species, pool=pool).items():
+        print('{:<25}{:8.3f} s ({} distances)'.format(name, seconds, args.pop_size * args.species))
@@ -110,12 +110,27 @@ class Config(object):
         self.prob_mutate_activation = float(parameters.get('genetic', 'prob_mutate_activation'))
         self.prob_toggle_link = float(parameters.get('genetic', 'prob_toggle_link'))
         self.reset_on_extinction = bool(int(parameters.get('genetic', 'reset_on_extinction')))
+        # Seed of the random streams of the evolution (see neatsociety.rng), None to use the random module.
+        try:
+            self.seed = int(parameters.get('genetic', 'seed'))
+        except Exception as e:
+            self.seed = None
 
         # genotype compatibility
         self.compatibility_threshold = float(parameters.get('genotype compatibility', 'compatibility_threshold'))
         self.excess_coefficient = float(parameters.get('genotype compatibility', 'excess_coefficient'))
         self.disjoint_coefficient = float(parameters.get('genotype compatibility', 'disjoint_coefficient'))
         self.weight_coefficient = float(parameters.get('genotype compatibility', 'weight_coefficient'))
+        # Compute the distances on packed genomes (arrays of genes) during speciation.
+        try:
+            self.packed_distance = bool(int(parameters.get('genotype compatibility', 'packed_distance')))
+        except Exception as e:
+            self.packed_distance = False
+        # Speciate the whole population with a batched distance matrix (see neatsociety.speciation).
+        try:
+            self.distance_matrix = bool(int(parameters.get('genotype compatibility', 'distance_matrix')))
+        except Exception as e:
+            self.distance_matrix = False
 
         # Gene types
         self.node_gene_type = NodeGene
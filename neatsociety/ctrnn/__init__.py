@@ -18,31 +18,31 @@ class CTNodeGene(NodeGene):
         super(CTNodeGene, self).__init__(ID, node_type, bias, response, activation_type)
         self.time_constant = time_constant
 
-    def mutate(self, config):
-        super(CTNodeGene, self).mutate(config)
+    def mutate(self, config, rng=random):
+        super(CTNodeGene, self).mutate(config, rng)
         # mutating the time constant could bring numerical instability
         # do it with caution
         # if random.random() < 0.1:
         #    self.mutate_time_constant()
 
-    def mutate_time_constant(self, config):
+    def mutate_time_constant(self, config, rng=random):
         """ Warning: perturbing the time constant (tau) may result in numerical instability """
-        self.time_constant += random.gauss(1.0, 0.5) * 0.001
+        self.time_constant += rng.gauss(1.0, 0.5) * 0.001
         if self.time_constant > config.max_weight:
             self.time_constant = config.max_weight
         elif self.time_constant < config.min_weight:
             self.time_constant = config.min_weight
         return self
 
-    def get_child(self, other):
+    def get_child(self, other, rng=random):
         """ Creates a new NodeGene randomly inheriting its attributes from parents """
         assert (self.ID == other.ID)
 
         ng = CTNodeGene(self.ID, self.type,
-                        random.choice((self.bias, other.bias)),
-                        random.choice((self.response, other.response)),
-                        random.choice((self.activation_type, other.activation_type)),
-                        random.choice((self.time_constant, other.time_constant)))
+                        rng.choice((self.bias, other.bias)),
+                        rng.choice((self.response, other.response)),
+                        rng.choice((self.activation_type, other.activation_type)),
+                        rng.choice((self.time_constant, other.time_constant)))
         return ng
 
     def __str__(self):
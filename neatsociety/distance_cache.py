@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+
+class DistanceCache(object):
+    """
+    Bounded memo of the compatibility distances computed during speciation, so that the pairs of genomes
+    compared again in the following generations (the elites, which are carried over unchanged, and the
+    representatives chosen among them) are not compared again.
+
+    Entries are keyed by the ID and the mutation version (see Genome.mutate) of both genomes, in order (the
+    distance is not symmetric when both genomes have the same number of connection genes): a genome which is
+    mutated gets new keys, and its old entries are never used again. When the cache holds more than
+    max_entries distances, the least recently used ones are dropped.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(genome, other):
+        return genome.ID, getattr(genome, 'version', 0), other.ID, getattr(other, 'version', 0)
+
+    def distance(self, genome, other, compute=None):
+        """
+        Returns the distance of genome to other, computed by compute() (or genome.distance(other) if None) when
+        it is not cached.
+        """
+        key = self.key(genome, other)
+        distance = self.entries.get(key)
+        if distance is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return distance
+
+        self.misses += 1
+        distance = compute() if compute is not None else genome.distance(other)
+        self.entries[key] = distance
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return distance
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,403 @@
+'''
+Evaluation of the genomes on several machines: a broker (DistributedEvaluator, in the process running the
+Population) hands out jobs to the workers (DistributedWorker) which connect to it over TCP, possibly from
+other hosts, and evaluate the genomes with their own eval_function.
+
+The connections are multiprocessing.connection ones: both ends first prove to each other that they know the
+shared authkey (HMAC challenges), and only then exchange pickled tuples, so that no peer without the authkey can
+have anything unpickled by the broker (or by a worker):
+    worker -> broker: ('hello', capacity), ('heartbeat',), ('result', job_id, fitness), ('error', job_id, message)
+    broker -> worker: ('job', job_id, genome_id, serialized genome), ('shutdown',)
+
+A worker runs at most 'capacity' jobs at the same time (e.g. the number of simulator slots of its host) and
+sends a heartbeat every few seconds. The jobs of a worker which disconnects or stops sending heartbeats are
+given to the other workers, as are the jobs whose evaluation failed, up to max_retries times.
+
+The broker only listens on localhost by default. A worker can also be started from the command line, with the
+evaluation function given as module:function and the authkey of the broker in the NEATSOCIETY_AUTHKEY
+environment variable (or --authkey, visible to the other users of the host):
+    python -m neatsociety.distributed broker_host:port module:function [--capacity N]
+'''
+from __future__ import print_function
+
+import argparse
+import collections
+import importlib
+import os
+import pickle
+import socket
+import sys
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, answer_challenge, deliver_challenge
+
+
+def _set_no_delay(fileno):
+    ''' Disables Nagle's algorithm on the TCP socket of a file descriptor (the messages are small). '''
+    sock = socket.socket(fileno=os.dup(fileno))
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    finally:
+        sock.close()
+
+
+class _WorkerConnection(object):
+    def __init__(self, sock, connection, address, capacity):
+        self.sock = sock
+        self.connection = connection
+        self.address = address
+        self.capacity = capacity
+        self.jobs = set()
+        self.last_seen = time.time()
+        self.alive = True
+        self.send_lock = threading.Lock()
+
+    def send(self, message):
+        with self.send_lock:
+            self.connection.send(message)
+
+    def close(self):
+        self.alive = False
+        # the shutdown wakes up the thread receiving from the connection
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+        self.sock.close()
+
+
+class DistributedEvaluator(object):
+    def __init__(self, host='localhost', port=0, authkey=None, heartbeat_timeout=10.0, max_retries=3, timeout=None,
+                 verbose=0):
+        '''
+        Broker listening on (host, port) for the workers (port 0 picks a free port, see self.address; host ''
+        listens on every interface). Only the workers knowing authkey (bytes) are accepted; if it is None, a
+        random one is generated (see self.authkey).
+        A worker is dropped if it does not send anything for heartbeat_timeout seconds; a job is given to
+        another worker at most max_retries times; evaluate raises an exception after timeout seconds
+        (if not None) without completing.
+        '''
+        self.authkey = authkey if authkey is not None else os.urandom(32)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.verbose = verbose
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(16)
+        self.address = self.server.getsockname()
+
+        self.condition = threading.Condition()
+        self.workers = []
+        # job id -> [genome, attempts]; only the jobs of the current evaluation
+        self.jobs = {}
+        self.pending = collections.deque()
+        self.results = {}
+        self.failures = {}
+        self.next_job_id = 0
+        self.closed = False
+
+        self.accept_thread = threading.Thread(target=self._accept, name='broker-accept')
+        self.accept_thread.daemon = True
+        self.accept_thread.start()
+
+    def log(self, *args):
+        if self.verbose != 0:
+            print('##', *args)
+
+    def num_workers(self):
+        with self.condition:
+            return len(self.workers)
+
+    def capacity(self):
+        with self.condition:
+            return sum(w.capacity for w in self.workers)
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                sock, address = self.server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            thread = threading.Thread(target=self._serve, args=(sock, address), name='broker-{}:{}'.format(*address))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock, address):
+        connection = Connection(os.dup(sock.fileno()))
+        try:
+            # the peer has to know the authkey before anything it sends is unpickled
+            deliver_challenge(connection, self.authkey)
+            answer_challenge(connection, self.authkey)
+            hello = connection.recv()
+        except (OSError, EOFError, AuthenticationError, pickle.UnpicklingError):
+            hello = None
+        if not isinstance(hello, tuple) or len(hello) != 2 or hello[0] != 'hello':
+            self.log('Rejected connection from {}:{}'.format(address[0], address[1]))
+            connection.close()
+            sock.close()
+            return
+
+        worker = _WorkerConnection(sock, connection, address, max(1, int(hello[1])))
+        with self.condition:
+            self.workers.append(worker)
+            self.condition.notify_all()
+        self.log('Worker {}:{} connected, capacity {}'.format(address[0], address[1], worker.capacity))
+
+        while worker.alive:
+            try:
+                message = connection.recv()
+            except (OSError, EOFError, pickle.UnpicklingError):
+                break
+
+            with self.condition:
+                worker.last_seen = time.time()
+                if message[0] == 'result':
+                    job_id, fitness = message[1], message[2]
+                    worker.jobs.discard(job_id)
+                    if job_id in self.jobs and job_id not in self.results:
+                        self.results[job_id] = fitness
+                elif message[0] == 'error':
+                    job_id = message[1]
+                    worker.jobs.discard(job_id)
+                    self.log('Job {} failed on {}:{}: {}'.format(job_id, address[0], address[1], message[2]))
+                    self._retry(job_id, message[2])
+                self.condition.notify_all()
+
+        with self.condition:
+            self._drop(worker, 'disconnected')
+
+    def _retry(self, job_id, reason):
+        # called with the condition held
+        if job_id not in self.jobs or job_id in self.results:
+            return
+        job = self.jobs[job_id]
+        job[1] += 1
+        if job[1] > self.max_retries:
+            self.failures[job_id] = reason
+        else:
+            self.pending.appendleft(job_id)
+
+    def _drop(self, worker, reason):
+        # called with the condition held: the jobs of the worker are given to the others
+        if worker in self.workers:
+            self.workers.remove(worker)
+            self.log('Worker {}:{} {}, {} job(s) to retry'.format(worker.address[0], worker.address[1], reason,
+                                                                 len(worker.jobs)))
+        for job_id in worker.jobs:
+            self._retry(job_id, 'worker {}'.format(reason))
+        worker.jobs.clear()
+        if worker.alive:
+            worker.close()
+        self.condition.notify_all()
+
+    def _dispatch(self):
+        # called with the condition held
+        now = time.time()
+        for worker in list(self.workers):
+            if now - worker.last_seen > self.heartbeat_timeout:
+                self._drop(worker, 'timed out')
+
+        for worker in list(self.workers):
+            while self.pending and len(worker.jobs) < worker.capacity:
+                job_id = self.pending.popleft()
+                genome = self.jobs[job_id][0]
+                try:
+                    worker.send(('job', job_id, genome.ID, pickle.dumps(genome, protocol=pickle.HIGHEST_PROTOCOL)))
+                except OSError:
+                    self.pending.appendleft(job_id)
+                    self._drop(worker, 'disconnected')
+                    break
+                worker.jobs.add(job_id)
+
+    def evaluate(self, genomes):
+        '''
+        Evaluates the genomes on the connected workers (waiting for at least one to connect) and sets their
+        fitness.
+        '''
+        start_time = time.time()
+        with self.condition:
+            self.jobs = {}
+            self.results = {}
+            self.failures = {}
+            self.pending.clear()
+            ids = []
+            for genome in genomes:
+                self.jobs[self.next_job_id] = [genome, 0]
+                self.pending.append(self.next_job_id)
+                ids.append(self.next_job_id)
+                self.next_job_id += 1
+
+            self.log('Dispatching {} jobs to {} worker(s)'.format(len(ids), len(self.workers)))
+            while len(self.results) + len(self.failures) < len(ids):
+                if self.timeout is not None and time.time() - start_time > self.timeout:
+                    raise Exception('Distributed evaluation did not complete in {} seconds'.format(self.timeout))
+
+                self._dispatch()
+                self.condition.wait(min(1.0, self.heartbeat_timeout / 2))
+
+            if self.failures:
+                job_id, reason = next(iter(self.failures.items()))
+                raise Exception('Evaluation of genome {} failed {} times: {}'.format(
+                    self.jobs[job_id][0].ID, self.max_retries + 1, reason))
+
+            for job_id, genome in zip(ids, genomes):
+                genome.fitness = self.results[job_id]
+            self.jobs = {}
+
+        self.log('Evaluation completed in {:.2f} seconds'.format(time.time() - start_time))
+
+    def close(self):
+        ''' Stops the workers and the broker. '''
+        self.closed = True
+        with self.condition:
+            for worker in list(self.workers):
+                try:
+                    worker.send(('shutdown',))
+                except OSError:
+                    pass
+                worker.close()
+            self.workers = []
+        self.server.close()
+
+
+class DistributedWorker(object):
+    def __init__(self, eval_function, address, authkey, capacity=1, heartbeat_interval=2.0, connect_timeout=None,
+                 verbose=0):
+        '''
+        Worker evaluating at most 'capacity' genomes at the same time with eval_function (which takes a genome
+        object and returns its fitness), for the broker at 'address' (host, port) whose authkey is 'authkey'.
+        It waits for the broker to be up for at most connect_timeout seconds (forever if None).
+        '''
+        self.eval_function = eval_function
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.capacity = capacity
+        self.heartbeat_interval = heartbeat_interval
+        self.connect_timeout = connect_timeout
+        self.verbose = verbose
+        self.send_lock = threading.Lock()
+        self.slots = threading.Semaphore(capacity)
+        self.stopped = threading.Event()
+
+    def _connect(self):
+        start_time = time.time()
+        while True:
+            try:
+                # raises AuthenticationError if the broker does not have the same authkey
+                connection = Client(self.address, authkey=self.authkey)
+                _set_no_delay(connection.fileno())
+                return connection
+            except OSError:
+                if self.connect_timeout is not None and time.time() - start_time > self.connect_timeout:
+                    raise
+                time.sleep(0.5)
+
+    def _send(self, connection, message):
+        with self.send_lock:
+            connection.send(message)
+
+    def _heartbeat(self, connection):
+        while not self.stopped.wait(self.heartbeat_interval):
+            try:
+                self._send(connection, ('heartbeat',))
+            except OSError:
+                break
+
+    def _run_job(self, connection, job_id, genome_id, payload):
+        try:
+            genome = pickle.loads(payload)
+            message = ('result', job_id, self.eval_function(genome))
+        except Exception:
+            message = ('error', job_id, traceback.format_exc())
+        finally:
+            self.slots.release()
+
+        try:
+            self._send(connection, message)
+        except OSError:
+            pass
+
+    def run(self):
+        ''' Evaluates the jobs of the broker until it shuts down or disconnects. '''
+        connection = self._connect()
+        self._send(connection, ('hello', self.capacity))
+        if self.verbose != 0:
+            print('## Connected to broker {}:{} with capacity {}'.format(self.address[0], self.address[1],
+                                                                      self.capacity))
+
+        heartbeat = threading.Thread(target=self._heartbeat, args=(connection,), name='worker-heartbeat')
+        heartbeat.daemon = True
+        heartbeat.start()
+
+        try:
+            while True:
+                try:
+                    message = connection.recv()
+                except (OSError, EOFError):
+                    break
+                if message[0] == 'shutdown':
+                    break
+                if message[0] == 'job':
+                    self.slots.acquire()
+                    thread = threading.Thread(target=self._run_job, args=(connection,) + tuple(message[1:]),
+                                              name='worker-job-{}'.format(message[1]))
+                    thread.daemon = True
+                    thread.start()
+        finally:
+            self.stopped.set()
+            connection.close()
+
+
+def load_function(name):
+    ''' Imports a function given as module:function. '''
+    module, function = name.rsplit(':', 1)
+    return getattr(importlib.import_module(module), function)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Worker of a distributed NEAT evaluation')
+
+    parser.add_argument(
+        'broker',
+        help='Address of the broker, host:port',
+        type=str
+    )
+
+    parser.add_argument(
+        'function',
+        help='Evaluation function, module:function (it takes a genome and returns its fitness)',
+        type=str
+    )
+
+    parser.add_argument(
+        '-c',
+        '--capacity',
+        help='Number of genomes evaluated at the same time',
+        type=int,
+        default=1
+    )
+
+    parser.add_argument(
+        '-k',
+        '--authkey',
+        help='Authkey of the broker (by default, the NEATSOCIETY_AUTHKEY environment variable)',
+        type=str,
+        default=os.environ.get('NEATSOCIETY_AUTHKEY')
+    )
+
+    args = parser.parse_args()
+
+    if not args.authkey:
+        parser.error('the authkey of the broker is required (NEATSOCIETY_AUTHKEY or --authkey)')
+
+    host, port = args.broker.rsplit(':', 1)
+    sys.path.insert(0, '')
+    DistributedWorker(load_function(args.function), (host, int(port)), args.authkey.encode(),
+                      capacity=args.capacity, verbose=1).run()
@@ -0,0 +1,114 @@
+from __future__ import print_function
+
+import gzip
+import hashlib
+import os
+import pickle
+
+from neatsociety.math_util import mean
+from neatsociety.nn import genome_hash
+
+
+class FitnessCache(object):
+    """
+    Persistent memo of genome fitness values, so that genomes which did not change (e.g. the
+    elites) do not have to be simulated again.
+
+    Entries are keyed by the genome structure (see neatsociety.nn.genome_hash) plus a context,
+    which should identify everything else the fitness depends on (race configuration, fitness
+    function, time limit...).
+
+    The policy decides when a cached genome is evaluated again:
+        'always':   never, the first fitness value is always reused;
+        'average':  until `samples` values have been collected, the fitness is their mean;
+        'interval': every `interval` generations, the fitness is the mean of the last `samples` values.
+    """
+
+    allowed_policies = ['always', 'average', 'interval']
+
+    def __init__(self, filename=None, context=(), policy='always', samples=1, interval=None):
+        if policy not in self.allowed_policies:
+            raise Exception("Invalid fitness cache policy: {!r}".format(policy))
+        if policy == 'interval' and not interval:
+            raise Exception("The 'interval' fitness cache policy requires an interval.")
+
+        self.filename = filename
+        self.set_context(context)
+        self.policy = policy
+        self.samples = max(1, int(samples))
+        self.interval = interval
+
+        # key -> (list of fitness values, generation of the last evaluation)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+        if filename is not None and os.path.isfile(filename):
+            self.load(filename)
+
+    def set_context(self, context):
+        """ Sets the (tuple of) values identifying the conditions the next evaluations run in. """
+        self.context = hashlib.sha1(repr(tuple(context)).encode()).hexdigest()
+
+    def key(self, genome):
+        return self.context, genome_hash(genome)
+
+    def needs_evaluation(self, key, generation):
+        entry = self.entries.get(key)
+        if entry is None:
+            return True
+
+        values, last_generation = entry
+        if self.policy == 'average':
+            return len(values) < self.samples
+        if self.policy == 'interval':
+            return generation - last_generation >= self.interval
+        return False
+
+    def evaluate(self, fitness_function, genomes, generation):
+        """
+        Sets the fitness of the cached genomes and calls fitness_function on the remaining ones.
+        Returns the number of (hits, misses) of this call.
+
+        If fitness_function returns a list of genomes, only their fitness values are cached: the fitness of the
+        others is only an estimate (e.g. extrapolated from a cheaper surrogate evaluation), which is kept for this
+        generation but never reused.
+        """
+        keys = [self.key(g) for g in genomes]
+        to_evaluate = [(g, k) for g, k in zip(genomes, keys) if self.needs_evaluation(k, generation)]
+
+        evaluated = None
+        if to_evaluate:
+            evaluated = fitness_function([g for g, k in to_evaluate])
+        if evaluated is not None:
+            evaluated = set(id(g) for g in evaluated)
+
+        for g, k in to_evaluate:
+            if evaluated is not None and id(g) not in evaluated:
+                continue
+            values = self.entries.get(k, ([], generation))[0]
+            values = (values + [g.fitness])[-self.samples:]
+            self.entries[k] = (values, generation)
+
+        for g, k in zip(genomes, keys):
+            if k in self.entries:
+                g.fitness = mean(self.entries[k][0])
+
+        misses = len(to_evaluate)
+        hits = len(genomes) - misses
+        self.hits += hits
+        self.misses += misses
+        return hits, misses
+
+    def load(self, filename):
+        with gzip.open(filename) as f:
+            self.entries = pickle.load(f)
+
+    def save(self, filename=None):
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            return
+
+        with gzip.open(filename, 'w', compresslevel=5) as f:
+            pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
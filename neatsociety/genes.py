@@ -20,39 +20,39 @@ class NodeGene(object):
         return 'NodeGene(id={0}, type={1}, bias={2}, response={3}, activation={4})'.format(
             self.ID, self.type, self.bias, self.response, self.activation_type)
 
-    def get_child(self, other):
+    def get_child(self, other, rng=random):
         """ Creates a new NodeGene randomly inheriting attributes from its parents."""
         assert (self.ID == other.ID)
 
         ng = NodeGene(self.ID, self.type,
-                      random.choice((self.bias, other.bias)),
-                      random.choice((self.response, other.response)),
-                      random.choice((self.activation_type, other.activation_type)))
+                      rng.choice((self.bias, other.bias)),
+                      rng.choice((self.response, other.response)),
+                      rng.choice((self.activation_type, other.activation_type)))
         return ng
 
-    def mutate_bias(self, config):
-        new_bias = self.bias + random.gauss(0, 1) * config.bias_mutation_power
+    def mutate_bias(self, config, rng=random):
+        new_bias = self.bias + rng.gauss(0, 1) * config.bias_mutation_power
         self.bias = max(config.min_weight, min(config.max_weight, new_bias))
 
-    def mutate_response(self, config):
+    def mutate_response(self, config, rng=random):
         """ Mutates the neuron's average firing response. """
-        new_response = self.response + random.gauss(0, 1) * config.response_mutation_power
+        new_response = self.response + rng.gauss(0, 1) * config.response_mutation_power
         self.response = max(config.min_weight, min(config.max_weight, new_response))
 
-    def mutate_activation(self, config):
-        self.activation_type = random.choice(config.activation_functions)
+    def mutate_activation(self, config, rng=random):
+        self.activation_type = rng.choice(config.activation_functions)
 
     def copy(self):
         return NodeGene(self.ID, self.type, self.bias,
                         self.response, self.activation_type)
 
-    def mutate(self, config):
-        if random.random() < config.prob_mutate_bias:
-            self.mutate_bias(config)
-        if random.random() < config.prob_mutate_response:
-            self.mutate_response(config)
-        if random.random() < config.prob_mutate_activation:
-            self.mutate_activation(config)
+    def mutate(self, config, rng=random):
+        if rng.random() < config.prob_mutate_bias:
+            self.mutate_bias(config, rng)
+        if rng.random() < config.prob_mutate_response:
+            self.mutate_response(config, rng)
+        if rng.random() < config.prob_mutate_activation:
+            self.mutate_activation(config, rng)
 
 
 class ConnectionGene(object):
@@ -72,15 +72,15 @@ class ConnectionGene(object):
     # Key for dictionaries, avoids two connections between the same nodes.
     key = property(lambda self: (self.in_node_id, self.out_node_id))
 
-    def mutate(self, config):
-        r = random.random
+    def mutate(self, config, rng=random):
+        r = rng.random
         if r() < config.prob_mutate_weight:
             if r() < config.prob_replace_weight:
                 # Replace weight with a random value.
-                self.weight = random.gauss(0, config.weight_stdev)
+                self.weight = rng.gauss(0, config.weight_stdev)
             else:
                 # Perturb weight.
-                new_weight = self.weight + random.gauss(0, 1) * config.weight_mutation_power
+                new_weight = self.weight + rng.gauss(0, 1) * config.weight_mutation_power
                 self.weight = max(config.min_weight, min(config.max_weight, new_weight))
 
         if r() < config.prob_toggle_link:
@@ -115,6 +115,6 @@ class ConnectionGene(object):
     def is_same_innov(self, cg):
         return self.innovation_id == cg.innovation_id
 
-    def get_child(self, cg):
+    def get_child(self, cg, rng=random):
         # TODO: average both weights (Stanley, p. 38)
-        return random.choice((self, cg)).copy()
+        return rng.choice((self, cg)).copy()
@@ -1,5 +1,7 @@
-from random import choice, gauss, randint, random, shuffle
 import math
+import random
+
+from neatsociety.packed_genome import PackedGenome
 
 
 class Genome(object):
@@ -18,39 +20,44 @@ class Genome(object):
         self.fitness = None
         self.species_id = None
 
+        # incremented by each mutation, so that the values computed from the genes can be invalidated
+        self.version = 0
+
         # my parents id: helps in tracking genome's genealogy
         self.parent1_id = parent1_id
         self.parent2_id = parent2_id
 
-    def mutate(self, innovation_indexer):
+    def mutate(self, innovation_indexer, rng=random):
         """ Mutates this genome """
 
         # TODO: Make a configuration item to choose whether or not multiple mutations can happen at once.
 
-        if random() < self.config.prob_add_node:
-            self.mutate_add_node(innovation_indexer)
+        self.version += 1
 
-        if random() < self.config.prob_add_conn:
-            self.mutate_add_connection(innovation_indexer)
+        if rng.random() < self.config.prob_add_node:
+            self.mutate_add_node(innovation_indexer, rng)
 
-        if random() < self.config.prob_delete_node:
-            self.mutate_delete_node()
+        if rng.random() < self.config.prob_add_conn:
+            self.mutate_add_connection(innovation_indexer, rng)
 
-        if random() < self.config.prob_delete_conn:
-            self.mutate_delete_connection()
+        if rng.random() < self.config.prob_delete_node:
+            self.mutate_delete_node(rng)
+
+        if rng.random() < self.config.prob_delete_conn:
+            self.mutate_delete_connection(rng)
 
         # Mutate connection genes (weights, enabled, etc.).
         for cg in self.conn_genes.values():
-            cg.mutate(self.config)
+            cg.mutate(self.config, rng)
 
         # Mutate node genes (bias, response, etc.).
         for ng in self.node_genes.values():
             if ng.type != 'INPUT':
-                ng.mutate(self.config)
+                ng.mutate(self.config, rng)
 
         return self
 
-    def crossover(self, other, child_id):
+    def crossover(self, other, child_id, rng=random):
         """ Crosses over parents' genomes and returns a child. """
 
         # Parents must belong to the same species.
@@ -68,13 +75,13 @@ class Genome(object):
         # creates a new child
         child = self.__class__(child_id, self.config, self.ID, other.ID)
 
-        child.inherit_genes(parent1, parent2)
+        child.inherit_genes(parent1, parent2, rng)
 
         child.species_id = parent1.species_id
 
         return child
 
-    def inherit_genes(self, parent1, parent2):
+    def inherit_genes(self, parent1, parent2, rng=random):
         """ Applies the crossover operator. """
         assert (parent1.fitness >= parent2.fitness)
 
@@ -88,7 +95,7 @@ class Genome(object):
             else:
                 if cg2.is_same_innov(cg1):  # Always true for *global* INs
                     # Homologous gene found
-                    new_gene = cg1.get_child(cg2)
+                    new_gene = cg1.get_child(cg2, rng)
                 else:
                     new_gene = cg1.copy()
                 self.conn_genes[new_gene.key] = new_gene
@@ -101,7 +108,7 @@ class Genome(object):
                 new_gene = ng1.copy()
             else:
                 # matching node genes: randomly selects the neuron's bias and response
-                new_gene = ng1.get_child(ng2)
+                new_gene = ng1.get_child(ng2, rng)
 
             assert new_gene.ID not in self.node_genes
             self.node_genes[new_gene.ID] = new_gene
@@ -112,14 +119,14 @@ class Genome(object):
             new_id += 1
         return new_id
 
-    def mutate_add_node(self, innovation_indexer):
+    def mutate_add_node(self, innovation_indexer, rng=random):
         if not self.conn_genes:
             return None
 
         # Choose a random connection to split
-        conn_to_split = choice(list(self.conn_genes.values()))
+        conn_to_split = rng.choice(list(self.conn_genes.values()))
         new_node_id = self.get_new_hidden_id()
-        act_func = choice(self.config.activation_functions)
+        act_func = rng.choice(self.config.activation_functions)
         ng = self.config.node_gene_type(new_node_id, 'HIDDEN', activation_type=act_func)
         assert ng.ID not in self.node_genes
         self.node_genes[ng.ID] = ng
@@ -128,17 +135,17 @@ class Genome(object):
         self.conn_genes[new_conn2.key] = new_conn2
         return ng, conn_to_split  # the return is only used in genome_feedforward
 
-    def mutate_add_connection(self, innovation_indexer):
+    def mutate_add_connection(self, innovation_indexer, rng=random):
         '''
         Attempt to add a new connection, the only restriction being that the output
         node cannot be one of the network input nodes.
         '''
-        in_node = choice(list(self.node_genes.values()))
+        in_node = rng.choice(list(self.node_genes.values()))
 
         # TODO: We do this filtering of input/output/hidden nodes a lot;
         # they should probably be separate collections.
         possible_outputs = [n for n in self.node_genes.values() if n.type != 'INPUT']
-        out_node = choice(possible_outputs)
+        out_node = rng.choice(possible_outputs)
         
         if in_node.type != 'INPUT' and out_node.type == 'HIDDEN':
             print('RECURRENT LINK!!!')
@@ -146,20 +153,20 @@ class Genome(object):
         # Only create the connection if it doesn't already exist.
         key = (in_node.ID, out_node.ID)
         if key not in self.conn_genes:
-            weight = gauss(0, self.config.weight_stdev)
-            enabled = choice([False, True])
+            weight = rng.gauss(0, self.config.weight_stdev)
+            enabled = rng.choice([False, True])
             innovation_id = innovation_indexer.get_innovation_id(in_node.ID, out_node.ID)
             cg = self.config.conn_gene_type(innovation_id, in_node.ID, out_node.ID, weight, enabled)
             self.conn_genes[cg.key] = cg
 
-    def mutate_delete_node(self):
+    def mutate_delete_node(self, rng=random):
         # Do nothing if there are no hidden nodes.
         if len(self.node_genes) <= self.num_inputs + self.num_outputs:
             return -1
 
         idx = None
         while 1:
-            idx = choice(list(self.node_genes.keys()))
+            idx = rng.choice(list(self.node_genes.keys()))
             if self.node_genes[idx].type == 'HIDDEN':
                 break
 
@@ -185,9 +192,9 @@ class Genome(object):
 
         return node_id
 
-    def mutate_delete_connection(self):
+    def mutate_delete_connection(self, rng=random):
         if len(self.conn_genes) > self.num_inputs + self.num_outputs:
-            key = choice(list(self.conn_genes.keys()))
+            key = rng.choice(list(self.conn_genes.keys()))
             del self.conn_genes[key]
 
             assert len(self.conn_genes) > 0
@@ -260,6 +267,10 @@ class Genome(object):
 
         return distance
 
+    def pack(self):
+        """ Returns the array representation of the genes, whose distance is faster to compute. """
+        return PackedGenome(self)
+
     def size(self):
         '''Returns genome 'complexity', taken to be (number of hidden nodes, number of enabled connections)'''
         num_hidden_nodes = len(self.node_genes) - self.num_inputs - self.num_outputs
@@ -284,7 +295,7 @@ class Genome(object):
     def add_hidden_nodes(self, num_hidden):
         node_id = self.get_new_hidden_id()
         for i in range(num_hidden):
-            act_func = choice(self.config.activation_functions)
+            act_func = random.choice(self.config.activation_functions)
             node_gene = self.config.node_gene_type(node_id,
                                                    node_type='HIDDEN',
                                                    activation_type=act_func)
@@ -309,7 +320,7 @@ class Genome(object):
             if len(config.output_activation_functions) > 0:
                 act_func = config.output_activation_functions[i]
             else:
-                act_func = choice(config.activation_functions)
+                act_func = random.choice(config.activation_functions)
             
             node_gene = config.node_gene_type(node_id,
                                               node_type='OUTPUT',
@@ -327,9 +338,9 @@ class Genome(object):
         hid_genes = [g for g in self.node_genes.values() if g.type == 'HIDDEN']
         out_genes = [g for g in self.node_genes.values() if g.type == 'OUTPUT']
 
-        ig = choice(in_genes)
+        ig = random.choice(in_genes)
         for og in hid_genes + out_genes:
-            weight = gauss(0, self.config.weight_stdev)
+            weight = random.gauss(0, self.config.weight_stdev)
             innovation_id = innovation_indexer.get_innovation_id(ig.ID, og.ID)
             cg = self.config.conn_gene_type(innovation_id, ig.ID, og.ID, weight, True)
             self.conn_genes[cg.key] = cg
@@ -378,14 +389,14 @@ class Genome(object):
             for g2 in hid_genes + out_genes:
                 recurrent.append((g1.ID, g2.ID))
         
-        shuffle(recurrent)
+        random.shuffle(recurrent)
                         
         return connections + recurrent[:int(p*len(recurrent))]
 
     def connect_full(self, innovation_indexer):
         """ Create a fully-connected genome. """
         for input_id, output_id in self.compute_full_connections():
-            weight = gauss(0, self.config.weight_stdev)
+            weight = random.gauss(0, self.config.weight_stdev)
             innovation_id = innovation_indexer.get_innovation_id(input_id, output_id)
             cg = self.config.conn_gene_type(innovation_id, input_id, output_id, weight, True)
             self.conn_genes[cg.key] = cg
@@ -393,15 +404,15 @@ class Genome(object):
     def connect_partial(self, innovation_indexer, fraction):
         assert 0 <= fraction <= 1
         
-        if random() < 0.35:
+        if random.random() < 0.35:
             all_connections = self.compute_full_connections()
         else:
             all_connections = self.compute_full_connections_partial_recursive()
         
-        shuffle(all_connections)
+        random.shuffle(all_connections)
         num_to_add = int(round(len(all_connections) * fraction))
         for input_id, output_id in all_connections[:num_to_add]:
-            weight = gauss(0, self.config.weight_stdev)
+            weight = random.gauss(0, self.config.weight_stdev)
             innovation_id = innovation_indexer.get_innovation_id(input_id, output_id)
             cg = self.config.conn_gene_type(innovation_id, input_id, output_id, weight, True)
             self.conn_genes[cg.key] = cg
@@ -416,15 +427,15 @@ class FFGenome(Genome):
         super(FFGenome, self).__init__(ID, config, parent1_id, parent2_id)
         self.node_order = []  # hidden node order
 
-    def inherit_genes(self, parent1, parent2):
-        super(FFGenome, self).inherit_genes(parent1, parent2)
+    def inherit_genes(self, parent1, parent2, rng=random):
+        super(FFGenome, self).inherit_genes(parent1, parent2, rng)
 
         self.node_order = list(parent1.node_order)
 
         assert (len(self.node_order) == len([n for n in self.node_genes.values() if n.type == 'HIDDEN']))
 
-    def mutate_add_node(self, innovation_indexer):
-        result = super(FFGenome, self).mutate_add_node(innovation_indexer)
+    def mutate_add_node(self, innovation_indexer, rng=random):
+        result = super(FFGenome, self).mutate_add_node(innovation_indexer, rng)
         if result is None:
             return
 
@@ -441,11 +452,11 @@ class FFGenome(Genome):
         else:
             # Postsynaptic node is an output node, not hidden node
             maxi = len(self.node_order)
-        self.node_order.insert(randint(mini, maxi), ng.ID)
+        self.node_order.insert(rng.randint(mini, maxi), ng.ID)
         assert (len(self.node_order) == len([n for n in self.node_genes.values() if n.type == 'HIDDEN']))
         return ng, split_conn
 
-    def mutate_add_connection(self, innovation_indexer):
+    def mutate_add_connection(self, innovation_indexer, rng=random):
         '''
         Attempt to add a new connection, with the restrictions that (1) the output node
         cannot be one of the network input nodes, and (2) the connection must be feed-forward.
@@ -453,21 +464,21 @@ class FFGenome(Genome):
         possible_inputs = [n for n in self.node_genes.values() if n.type != 'OUTPUT']
         possible_outputs = [n for n in self.node_genes.values() if n.type != 'INPUT']
 
-        in_node = choice(possible_inputs)
-        out_node = choice(possible_outputs)
+        in_node = rng.choice(possible_inputs)
+        out_node = rng.choice(possible_outputs)
 
         # Only create the connection if it's feed-forward and it doesn't already exist.
         if self.__is_connection_feedforward(in_node, out_node):
             key = (in_node.ID, out_node.ID)
             if key not in self.conn_genes:
-                weight = gauss(0, self.config.weight_stdev)
-                enabled = choice([False, True])
+                weight = rng.gauss(0, self.config.weight_stdev)
+                enabled = rng.choice([False, True])
                 innovation_id = innovation_indexer.get_innovation_id(in_node.ID, out_node.ID)
                 cg = self.config.conn_gene_type(innovation_id, in_node.ID, out_node.ID, weight, enabled)
                 self.conn_genes[cg.key] = cg
 
-    def mutate_delete_node(self):
-        deleted_id = super(FFGenome, self).mutate_delete_node()
+    def mutate_delete_node(self, rng=random):
+        deleted_id = super(FFGenome, self).mutate_delete_node(rng)
         if deleted_id != -1:
             self.node_order.remove(deleted_id)
 
@@ -484,7 +495,7 @@ class FFGenome(Genome):
     def add_hidden_nodes(self, num_hidden):
         node_id = self.get_new_hidden_id()
         for i in range(num_hidden):
-            act_func = choice(self.config.activation_functions)
+            act_func = random.choice(self.config.activation_functions)
             node_gene = self.config.node_gene_type(node_id,
                                                    node_type='HIDDEN',
                                                    activation_type=act_func)
@@ -28,3 +28,27 @@ class InnovationIndexer(object):
             self.innovations[in_node_id, out_node_id] = innovation_id
 
         return innovation_id
+
+
+class RecordingInnovationIndexer(object):
+    '''
+    Innovation indexer used where the global InnovationIndexer is not available (e.g. in the worker processes
+    of the parallel reproduction): the known innovations keep their number, the new ones get a provisional
+    negative number (-1, -2...) and are recorded in the order they are requested, to be numbered later by
+    the global indexer.
+    '''
+    def __init__(self, innovations):
+        self.innovations = innovations
+        self.requests = []
+        self.provisional = {}
+
+    def get_innovation_id(self, in_node_id, out_node_id):
+        innovation_id = self.innovations.get((in_node_id, out_node_id))
+        if innovation_id is None:
+            innovation_id = self.provisional.get((in_node_id, out_node_id))
+        if innovation_id is None:
+            self.requests.append((in_node_id, out_node_id))
+            innovation_id = -len(self.requests)
+            self.provisional[in_node_id, out_node_id] = innovation_id
+
+        return innovation_id
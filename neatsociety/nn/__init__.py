@@ -1,46 +1,138 @@
+from collections import OrderedDict
+import copy
+import hashlib
+
 from neatsociety import activation_functions
 import numpy as np
 
 
-def find_feed_forward_layers(inputs, connections):
+def find_feed_forward_layers(inputs, connections, outputs=None):
     '''
     Collect the layers whose members can be evaluated in parallel in a feed-forward network.
     :param inputs: list of the network input nodes
     :param connections: list of (input, output) connections in the network.
+    :param outputs: optional list of the network output nodes; if given, the nodes whose output
+                    never reaches one of them are omitted from the layers.
 
     Returns a list of layers, with each layer consisting of a set of node identifiers.
+
+    The layers are built with Kahn's algorithm over the in-degree of each node, so the running
+    time is linear in the number of connections.
     '''
 
-    # TODO: Detect and omit nodes whose output is ultimately never used.
+    successors = {}
+    in_degree = {}
+    for a, b in connections:
+        successors.setdefault(a, []).append(b)
+        in_degree[b] = in_degree.get(b, 0) + 1
 
     layers = []
     S = set(inputs)
+    frontier = set(inputs)
     while 1:
-        # Find candidate nodes C for the next layer.  These nodes should connect
-        # a node in S to a node not in S.
-        C = set(b for (a, b) in connections if a in S and b not in S)
-        # Keep only the nodes whose entire input set is contained in S.
+        # A node enters the next layer once all of its incoming connections come from nodes in S.
         T = set()
-        for n in C:
-            if all(a in S for (a, b) in connections if b == n):
-                T.add(n)
+        for a in frontier:
+            for b in successors.get(a, ()):
+                if b in S:
+                    continue
+                in_degree[b] -= 1
+                if in_degree[b] == 0:
+                    T.add(b)
 
         if not T:
             break
 
         layers.append(T)
-        S = S.union(T)
+        S.update(T)
+        frontier = T
+
+    if outputs is not None:
+        required = required_for_output(outputs, connections)
+        layers = [layer & required for layer in layers]
+        layers = [layer for layer in layers if layer]
 
     return layers
 
 
+def required_for_output(outputs, connections):
+    '''
+    Collect the nodes whose output is (directly or indirectly) used by the given output nodes.
+    :param outputs: list of the network output nodes
+    :param connections: list of (input, output) connections in the network.
+
+    Returns the set of the required node identifiers, including the output nodes themselves.
+    '''
+
+    predecessors = {}
+    for a, b in connections:
+        predecessors.setdefault(b, []).append(a)
+
+    required = set(outputs)
+    stack = list(outputs)
+    while stack:
+        for a in predecessors.get(stack.pop(), ()):
+            if a not in required:
+                required.add(a)
+                stack.append(a)
+
+    return required
+
+
 class FeedForwardNetwork(object):
     def __init__(self, max_node, inputs, outputs, node_evals):
         self.node_evals = node_evals
         self.input_nodes = inputs
         self.output_nodes = outputs
-        self.values = [0.0] * (1 + max_node)
         self.num_nodes = 1 + max_node
+        self.layers = self._compile_layers(node_evals)
+        self.reset()
+
+    def reset(self):
+        self.values = [0.0] * self.num_nodes
+
+    @staticmethod
+    def _compile_layers(node_evals):
+        """
+        Groups the (topologically ordered) node evaluations into layers of nodes which only depend
+        on nodes of previous layers, and packs each layer into a weight matrix.
+
+        Returns a list of (sources, weights, biases, responses, activation groups) tuples, where
+        weights has shape (len(sources), len(layer)) and each activation group is a
+        (function, columns of the layer, nodes) tuple.
+        """
+        depth = {}
+        layer_evals = []
+        for node_eval in node_evals:
+            node, func, bias, response, links = node_eval
+            d = 1 + max([depth.get(i, 0) for i, w in links] or [0])
+            depth[node] = d
+            while len(layer_evals) < d:
+                layer_evals.append([])
+            layer_evals[d - 1].append(node_eval)
+
+        layers = []
+        for evals in layer_evals:
+            sources = sorted(set(i for node, func, bias, response, links in evals for i, w in links))
+            source_column = dict((i, k) for k, i in enumerate(sources))
+            weights = np.zeros((len(sources), len(evals)))
+            biases = np.zeros(len(evals))
+            responses = np.zeros(len(evals))
+            groups = {}
+            for col, (node, func, bias, response, links) in enumerate(evals):
+                for i, w in links:
+                    weights[source_column[i], col] += w
+                biases[col] = bias
+                responses[col] = response
+                groups.setdefault(func, []).append((col, node))
+
+            activation_groups = [(func,
+                                  np.array([c for c, n in members], dtype=int),
+                                  np.array([n for c, n in members], dtype=int))
+                                 for func, members in groups.items()]
+            layers.append((np.array(sources, dtype=int), weights, biases, responses, activation_groups))
+
+        return layers
 
     def serial_activate(self, inputs):
         if len(self.input_nodes) != len(inputs):
@@ -70,40 +162,49 @@ class FeedForwardNetwork(object):
         if num_features != len(self.input_nodes):
             raise Exception('Number of inputs is not equal to the number of columns in the array. Can not be used.')
         
-        for i, v in zip(self.input_nodes, range(num_features)):
-            values_array[:,i] = inputs[:,v]
+        values_array[:, self.input_nodes] = inputs
+
+        # each layer is a single matrix product over the columns of its source nodes
+        for sources, weights, biases, responses, activation_groups in self.layers:
+            z = biases + responses * values_array[:, sources].dot(weights)
+            for func, columns, nodes in activation_groups:
+                values_array[:, nodes] = func(z[:, columns])
+
+        return values_array[:, self.output_nodes]
 
-        for node, func, bias, response, links in self.node_evals:
-            s = np.zeros(num_datapoints)
-            for i, w in links:
-                s += values_array[:,i] * w
-                
-            values_array[:,node] = func(bias + response * s)
-            
-        
-        return np.array([values_array[:,i] for i in self.output_nodes]).T
 
+def create_feed_forward_phenotype(genome, cache=None):
+    """
+    Receives a genome and returns its phenotype (a neural network).
+    If a PhenotypeCache is given, a genome with the same structure is only built once.
+    """
 
-def create_feed_forward_phenotype(genome):
-    """ Receives a genome and returns its phenotype (a neural network). """
+    if cache is not None:
+        key = ('feed_forward', genome_hash(genome))
+        net = cache.get(key)
+        if net is None:
+            net = create_feed_forward_phenotype(genome)
+            cache.put(key, net)
+        return net
 
     # Gather inputs and expressed connections.
     input_nodes = [ng.ID for ng in genome.node_genes.values() if ng.type == 'INPUT']
     output_nodes = [ng.ID for ng in genome.node_genes.values() if ng.type == 'OUTPUT']
     connections = [(cg.in_node_id, cg.out_node_id) for cg in genome.conn_genes.values() if cg.enabled]
 
-    layers = find_feed_forward_layers(input_nodes, connections)
+    # Index the expressed connections by their output node.
+    node_inputs = {}
+    for cg in genome.conn_genes.values():
+        if cg.enabled:
+            node_inputs.setdefault(cg.out_node_id, []).append((cg.in_node_id, cg.weight))
+
+    layers = find_feed_forward_layers(input_nodes, connections, output_nodes)
     node_evals = []
     used_nodes = set(input_nodes + output_nodes)
     for layer in layers:
         for node in layer:
-            inputs = []
-            # TODO: This could be more efficient.
-            for cg in genome.conn_genes.values():
-                if cg.out_node_id == node and cg.enabled:
-                    inputs.append((cg.in_node_id, cg.weight))
-                    used_nodes.add(cg.in_node_id)
-
+            inputs = node_inputs[node]
+            used_nodes.update(i for i, w in inputs)
             used_nodes.add(node)
             ng = genome.node_genes[node]
             activation_function = activation_functions.get(ng.activation_type)
@@ -151,8 +252,86 @@ class RecurrentNetwork(object):
         return [ovalues[i] for i in self.output_nodes]
 
 
-def create_recurrent_phenotype(genome):
-    """ Receives a genome and returns its phenotype (a recurrent neural network). """
+class CompiledRecurrentNetwork(object):
+    """
+    Matrix form of a RecurrentNetwork: the links of all the evaluated nodes are packed into a
+    dense weight matrix and the nodes are grouped by activation function, so that one step is a
+    single mat-vec product followed by one vectorized call per activation function.
+
+    It keeps the same double-buffered state as RecurrentNetwork. The outputs only differ from
+    RecurrentNetwork.activate by the summation order of the dot products, i.e. they agree within a
+    relative tolerance of 1e-9; recurrent loops through unbounded activations (identity, inv, exp, ...)
+    can still amplify these rounding differences over long runs.
+    """
+
+    def __init__(self, max_node, inputs, outputs, node_evals):
+        self.max_node = max_node
+        self.node_evals = node_evals
+        self.input_nodes = inputs
+        self.output_nodes = outputs
+
+        num_nodes = 1 + max_node
+        self.weights = np.zeros((len(node_evals), num_nodes))
+        self.biases = np.zeros(len(node_evals))
+        self.responses = np.zeros(len(node_evals))
+
+        groups = {}
+        for row, (node, func, bias, response, links) in enumerate(node_evals):
+            for i, w in links:
+                self.weights[row, i] += w
+            self.biases[row] = bias
+            self.responses[row] = response
+            groups.setdefault(func, []).append((row, node))
+
+        # (activation function, rows in the weight matrix, corresponding nodes in the state)
+        self.activation_groups = [(func,
+                                   np.array([r for r, n in members], dtype=int),
+                                   np.array([n for r, n in members], dtype=int))
+                                  for func, members in groups.items()]
+
+        self.input_indices = np.array(inputs, dtype=int)
+        self.output_indices = np.array(outputs, dtype=int)
+        self.reset()
+
+    def input_size(self):
+        return len(self.input_nodes)
+
+    def output_size(self):
+        return len(self.output_nodes)
+
+    def reset(self):
+        self.values = np.zeros((2, 1 + self.max_node))
+        self.active = 0
+
+    def activate(self, inputs):
+        ivalues = self.values[self.active]
+        ovalues = self.values[1 - self.active]
+        self.active = 1 - self.active
+
+        ivalues[self.input_indices] = inputs
+        ovalues[self.input_indices] = inputs
+
+        z = self.biases + self.responses * self.weights.dot(ivalues)
+        for func, rows, nodes in self.activation_groups:
+            ovalues[nodes] = func(z[rows])
+
+        return ovalues[self.output_indices].tolist()
+
+
+def create_recurrent_phenotype(genome, compiled=False, cache=None):
+    """
+    Receives a genome and returns its phenotype (a recurrent neural network).
+    If compiled is True, the network is returned in its matrix form (CompiledRecurrentNetwork).
+    If a PhenotypeCache is given, a genome with the same structure is only built once.
+    """
+
+    if cache is not None:
+        key = ('compiled_recurrent' if compiled else 'recurrent', genome_hash(genome))
+        net = cache.get(key)
+        if net is None:
+            net = create_recurrent_phenotype(genome, compiled)
+            cache.put(key, net)
+        return net
 
     # Gather inputs and expressed connections.
     input_nodes = [ng.ID for ng in genome.node_genes.values() if ng.type == 'INPUT']
@@ -178,4 +357,177 @@ def create_recurrent_phenotype(genome):
         activation_function = activation_functions.get(ng.activation_type)
         node_evals.append((onode, activation_function, ng.bias, ng.response, inputs))
 
+    if compiled:
+        return CompiledRecurrentNetwork(max(used_nodes), input_nodes, output_nodes, node_evals)
+
     return RecurrentNetwork(max(used_nodes), input_nodes, output_nodes, node_evals)
+
+
+def genome_hash(genome):
+    """
+    Returns a stable (across runs and processes) hash of everything the phenotype depends on:
+    the node genes and the enabled connection genes, with their ids, weights, bias, response and
+    activation function.
+    """
+    h = hashlib.sha1()
+    for ng in sorted(genome.node_genes.values(), key=lambda ng: ng.ID):
+        h.update(repr((ng.ID, ng.type, ng.bias, ng.response, ng.activation_type)).encode())
+    for cg in sorted(genome.conn_genes.values(), key=lambda cg: cg.key):
+        if cg.enabled:
+            h.update(repr((cg.in_node_id, cg.out_node_id, cg.weight)).encode())
+    return h.hexdigest()
+
+
+class PhenotypeCache(object):
+    """
+    Least recently used cache of phenotypes, keyed by genome_hash, holding at most max_bytes
+    (estimated) of networks.
+
+    The networks are stateful, so get returns a reset copy which shares the (read-only)
+    connection data with the cached network.
+    """
+
+    # rough memory cost of a node evaluation tuple and of a (node, weight) link
+    node_bytes = 200
+    link_bytes = 120
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        net = copy.copy(entry[0])
+        net.reset()
+        return net
+
+    def put(self, key, net):
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)[1]
+
+        size = self.estimate_size(net)
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = (net, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    @classmethod
+    def estimate_size(cls, net):
+        size = sum(v.nbytes for v in vars(net).values() if isinstance(v, np.ndarray))
+        for node, func, bias, response, links in net.node_evals:
+            size += cls.node_bytes + cls.link_bytes * len(links)
+        return size
+
+
+class PopulationRecurrentBatch(object):
+    """
+    Steps N recurrent networks at once. The networks are packed into one (N, max_nodes) state
+    array and one (N, max_rows, max_nodes) weight tensor, padded with zeros, so that one call to
+    activate with an (N, num_inputs) array advances all of them with a single batched product.
+
+    Each network follows exactly the same update as CompiledRecurrentNetwork.
+    """
+
+    def __init__(self, networks):
+        if not networks:
+            raise Exception('Cannot build a batch from an empty list of networks.')
+
+        num_inputs = len(networks[0].input_nodes)
+        num_outputs = len(networks[0].output_nodes)
+        for net in networks:
+            if len(net.input_nodes) != num_inputs or len(net.output_nodes) != num_outputs:
+                raise Exception('All the networks in a batch must have the same number of inputs and outputs.')
+
+        self.networks = networks
+        self.num_networks = len(networks)
+        self.num_nodes = 1 + max(net.max_node for net in networks)
+        self.num_rows = max(1, max(len(net.node_evals) for net in networks))
+
+        self.weights = np.zeros((self.num_networks, self.num_rows, self.num_nodes))
+        self.biases = np.zeros((self.num_networks, self.num_rows))
+        self.responses = np.zeros((self.num_networks, self.num_rows))
+
+        # Indices are flattened so that a group can be gathered and scattered in a single step:
+        # rows index the (N * num_rows) pre-activations, nodes index the (N * num_nodes) state.
+        groups = {}
+        for n, net in enumerate(networks):
+            for row, (node, func, bias, response, links) in enumerate(net.node_evals):
+                for i, w in links:
+                    self.weights[n, row, i] += w
+                self.biases[n, row] = bias
+                self.responses[n, row] = response
+                rows, nodes = groups.setdefault(func, ([], []))
+                rows.append(n * self.num_rows + row)
+                nodes.append(n * self.num_nodes + node)
+
+        self.activation_groups = [(func, np.array(rows, dtype=int), np.array(nodes, dtype=int))
+                                  for func, (rows, nodes) in groups.items()]
+
+        self.input_indices = np.array([net.input_nodes for net in networks], dtype=int).reshape(-1, num_inputs)
+        self.output_indices = np.array([net.output_nodes for net in networks], dtype=int).reshape(-1, num_outputs)
+        self.input_indices += self.num_nodes * np.arange(self.num_networks)[:, None]
+        self.output_indices += self.num_nodes * np.arange(self.num_networks)[:, None]
+        self.reset()
+
+    def input_size(self):
+        return self.input_indices.shape[1]
+
+    def output_size(self):
+        return self.output_indices.shape[1]
+
+    def reset(self):
+        self.values = np.zeros((2, self.num_networks, self.num_nodes))
+        self.active = 0
+
+    def activate(self, inputs):
+        """
+        inputs is an (N, num_inputs) array, one row per network.
+        Returns the (N, num_outputs) array of the networks' outputs.
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.shape != self.input_indices.shape:
+            raise Exception('Expected inputs of shape {}, got {}'.format(self.input_indices.shape, inputs.shape))
+
+        ivalues = self.values[self.active]
+        ovalues = self.values[1 - self.active]
+        self.active = 1 - self.active
+
+        iflat = ivalues.reshape(-1)
+        oflat = ovalues.reshape(-1)
+        iflat[self.input_indices] = inputs
+        oflat[self.input_indices] = inputs
+
+        s = np.matmul(self.weights, ivalues[:, :, None])[:, :, 0]
+        z = (self.biases + self.responses * s).reshape(-1)
+        for func, rows, nodes in self.activation_groups:
+            oflat[nodes] = func(z[rows])
+
+        return oflat[self.output_indices]
+
+
+def create_population_batch(genomes):
+    """ Receives a list of genomes and returns a PopulationRecurrentBatch of their phenotypes. """
+    return PopulationRecurrentBatch([create_recurrent_phenotype(g) for g in genomes])
@@ -0,0 +1,104 @@
+"""
+Benchmark of find_feed_forward_layers against the previous implementation, which scanned every connection for
+every candidate node (quadratic in the number of connections), on random layered DAGs.
+
+Run with ``python -m neatsociety.nn.benchmark [--connections 5000 10000 ...] [--fan_in 10] [--quadratic 5000]``.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from neatsociety.nn import find_feed_forward_layers
+
+
+def quadratic_feed_forward_layers(inputs, connections):
+    """ The previous find_feed_forward_layers, kept as the reference of the layers. """
+    layers = []
+    S = set(inputs)
+    while 1:
+        # Find candidate nodes C for the next layer.  These nodes should connect
+        # a node in S to a node not in S.
+        C = set(b for (a, b) in connections if a in S and b not in S)
+        # Keep only the nodes whose entire input set is contained in S.
+        T = set()
+        for n in C:
+            if all(a in S for (a, b) in connections if b == n):
+                T.add(n)
+
+        if not T:
+            break
+
+        layers.append(T)
+        S = S.union(T)
+
+    return layers
+
+
+def random_dag(num_connections, fan_in=10, num_inputs=20, seed=0):
+    """
+    Returns (inputs, connections) of a random DAG where each new node takes fan_in connections from the
+    inputs and the nodes created before it.
+    """
+    rng = random.Random(seed)
+    inputs = list(range(num_inputs))
+    nodes = list(inputs)
+    connections = []
+    while len(connections) < num_connections:
+        node = len(nodes)
+        for a in rng.sample(nodes, min(fan_in, len(nodes))):
+            connections.append((a, node))
+        nodes.append(node)
+    rng.shuffle(connections)
+    return inputs, connections
+
+
+def benchmark(num_connections, fan_in=10, quadratic=False, repeat=3):
+    """ Returns the number of layers and the best times, in seconds, of the layers of a random DAG. """
+    inputs, connections = random_dag(num_connections, fan_in)
+    layers = find_feed_forward_layers(inputs, connections)
+    times = {'linear': min(timeit.repeat(lambda: find_feed_forward_layers(inputs, connections),
+                                         number=1, repeat=repeat))}
+    if quadratic:
+        if layers != quadratic_feed_forward_layers(inputs, connections):
+            raise Exception('The layers differ from the quadratic implementation')
+        times['quadratic'] = min(timeit.repeat(lambda: quadratic_feed_forward_layers(inputs, connections),
+                                               number=1, repeat=1))
+    return len(layers), times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the feed-forward layers')
+
+    parser.add_argument(
+        '-c',
+        '--connections',
+        help='Numbers of connections of the random networks',
+        type=int,
+        nargs='+',
+        default=[5000, 10000, 20000, 40000, 80000, 160000]
+    )
+
+    parser.add_argument(
+        '-f',
+        '--fan_in',
+        help='Number of incoming connections of each node',
+        type=int,
+        default=10
+    )
+
+    parser.add_argument(
+        '-q',
+        '--quadratic',
+        help='Largest number of connections on which the quadratic implementation is also timed',
+        type=int,
+        default=5000
+    )
+
+    args = parser.parse_args()
+
+    for num_connections in args.connections:
+        num_layers, times = benchmark(num_connections, args.fan_in, num_connections <= args.quadratic)
+        print('{:>8} connections, {:>5} layers: {}'.format(
+            num_connections, num_layers, ', '.join('{} {:.3f} s'.format(k, v) for k, v in sorted(times.items()))))
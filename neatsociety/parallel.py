@@ -8,13 +8,64 @@ except ImportError:
     no_progress_lib = 1
     pass
 
+import signal
 import time
 
+
+# not an Exception, so that an eval_function catching every Exception does not swallow it
+class GenomeTimeout(BaseException):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise GenomeTimeout()
+
+
+class _TimedEvaluation(object):
+    '''
+    Evaluates chunks of (index, genome) jobs in the worker processes and returns the (index, fitness, timed out)
+    of each job. The evaluation of a genome is interrupted (by SIGALRM) after genome_timeout seconds, if not None.
+    '''
+    def __init__(self, eval_function, genome_timeout=None):
+        self.eval_function = eval_function
+        self.genome_timeout = genome_timeout
+
+    def __call__(self, chunk):
+        return [self.evaluate(index, genome) for index, genome in chunk]
+
+    def evaluate(self, index, genome):
+        if self.genome_timeout is None:
+            return index, self.eval_function(genome), False
+
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, self.genome_timeout)
+        # the timer is stopped inside the try, so that GenomeTimeout (which the pool would not catch) never
+        # escapes, even if the timer expires as the evaluation returns
+        try:
+            try:
+                fitness = self.eval_function(genome)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except GenomeTimeout:
+            return index, None, True
+        finally:
+            signal.signal(signal.SIGALRM, previous_handler)
+        return index, fitness, False
+
+
 class ParallelEvaluator(object):
-    def __init__(self, eval_function, num_workers=mp.cpu_count(), timeout=None, sleep_time=0.1,progress_bar=False,verbose=0):
+    def __init__(self, eval_function, num_workers=mp.cpu_count(), timeout=None, sleep_time=0.1,progress_bar=False,verbose=0,
+                 chunksize=1, genome_timeout=None, timeout_fitness=None):
         '''
         eval_function should take one argument (a genome object) and return
         a single float (the genome's fitness).
+
+        The genomes are sent to the workers in chunks of chunksize genomes and their fitness is assigned as
+        soon as each result arrives. The evaluation of a genome is interrupted after genome_timeout seconds
+        (in its worker, which goes on with the next genomes) and a generation is stopped after timeout seconds,
+        killing the workers which are still running. The genomes which timed out get timeout_fitness or, if
+        it is None, evaluate raises an exception.
+        sleep_time is not used anymore (results are not polled).
         '''
         self.num_workers = num_workers
         self.eval_function = eval_function
@@ -26,51 +77,79 @@ class ParallelEvaluator(object):
         else:
             self.progress_bar = False
         self.verbose = verbose
+        self.chunksize = max(1, chunksize)
+        if genome_timeout is not None and not hasattr(signal, 'setitimer'):
+            raise Exception('Per-genome timeouts need signal.setitimer, which is not available on this platform.')
+        self.genome_timeout = genome_timeout
+        self.timeout_fitness = timeout_fitness
+        # genomes per second of the last evaluation
+        self.throughput = None
+
+    def _kill_workers(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = Pool(self.num_workers)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
 
     def evaluate(self, genomes):
-        jobs = []
         if self.verbose != 0:
             print("## Dispatching all jobs")
-        for genome in genomes:
-            jobs.append(self.pool.apply_async(self.eval_function, (genome,)))
+        jobs = list(enumerate(genomes))
+        chunks = [jobs[i:i + self.chunksize] for i in range(0, len(jobs), self.chunksize)]
+        results = self.pool.imap_unordered(_TimedEvaluation(self.eval_function, self.genome_timeout), chunks)
         if self.verbose != 0:
             print("## Done dispatching all jobs")
-        
+
         if self.verbose != 0:
             print("## Evaluating Individuals")
-        
+
         if self.progress_bar:
             pbar = tqdm(total=len(genomes))
-            curr_incomplete = len(genomes)
-        
+
         start_time = time.time()
-        
-        while True:
-            incomplete_count = sum(1 for x in jobs if not x.ready())
-            if incomplete_count == 0:
+        evaluated = [False] * len(genomes)
+        timed_out = []
+
+        try:
+            for _ in range(len(chunks)):
+                remaining = None
+                if self.timeout is not None:
+                    remaining = self.timeout - (time.time() - start_time)
+                    if remaining <= 0:
+                        raise mp.TimeoutError()
+
+                # assign the fitness back to the genomes as soon as their chunk is evaluated
+                chunk_results = results.next(timeout=remaining)
+                for index, fitness, genome_timed_out in chunk_results:
+                    evaluated[index] = True
+                    if genome_timed_out:
+                        timed_out.append(genomes[index])
+                    else:
+                        genomes[index].fitness = fitness
+
                 if self.progress_bar:
-                    pbar.close()
-                break
-            
-            if self.progress_bar:
-                diff_incomplete = curr_incomplete - incomplete_count
-                if diff_incomplete > 0:
-                    pbar.update(diff_incomplete)
-            
+                    pbar.update(len(chunk_results))
+
+        except mp.TimeoutError:
+            print("Evaluation time is more than the time allowed: killing the workers.")
+            self._kill_workers()
+            timed_out += [g for g, done in zip(genomes, evaluated) if not done]
+
+        finally:
             if self.progress_bar:
-                curr_incomplete = incomplete_count
-                
-            if self.timeout != None:
-                time_diff = start_time - time.time()
-                if time_diff > self.timeout:
-                    print("Evaluation time is more than the time allowed.")
-                    exit(1)
-            
-            time.sleep(self.sleep_time)
-        
-    
-        # assign the fitness back to each genome
-        for job, genome in zip(jobs, genomes):
-            genome.fitness = job.get(timeout=None)
-        
-        
+                pbar.close()
+
+        elapsed = time.time() - start_time
+        self.throughput = len(genomes) / elapsed if elapsed > 0 else float('inf')
+        if self.verbose != 0:
+            print("## Evaluated {0} genomes in {1:.2f} seconds ({2:.2f} genomes/s), {3} timed out".format(
+                len(genomes), elapsed, self.throughput, len(timed_out)))
+
+        if timed_out:
+            if self.timeout_fitness is None:
+                raise Exception('The evaluation of {0} genome(s) timed out.'.format(len(timed_out)))
+            for genome in timed_out:
+                genome.fitness = self.timeout_fitness
@@ -9,7 +9,9 @@ import os
 from neatsociety.config import Config
 from neatsociety.indexer import Indexer, InnovationIndexer
 from neatsociety.reporting import ReporterSet, StatisticsReporter, StdOutReporter
+from neatsociety.rng import RandomStreams
 from neatsociety.species import Species
+from neatsociety.speciation import speciate
 
 
 class CompleteExtinctionException(Exception):
@@ -53,6 +55,14 @@ class Population(object):
                 print("Society Directory")
 
 
+        # With a seed, the initial population is created from it and each later random step draws its numbers
+        # from a stream of its own (see neatsociety.rng), so that the run does not depend on the parallelism.
+        if config.seed is not None:
+            random.seed(config.seed)
+            self.streams = RandomStreams(config.seed)
+        else:
+            self.streams = None
+
         self.species_indexer = Indexer(1)
         self.genome_indexer = Indexer(1)
         self.innovation_indexer = InnovationIndexer(0)
@@ -63,6 +73,16 @@ class Population(object):
         self.generation = -1
         self.total_evaluations = 0
 
+        # Optional neatsociety.fitness_cache.FitnessCache used to skip the evaluation of unchanged genomes.
+        self.fitness_cache = None
+
+        # Optional multiprocessing Pool computing the speciation distance matrix (with distance_matrix).
+        self.speciation_pool = None
+
+        # Optional neatsociety.distance_cache.DistanceCache used to skip the distances already computed in the
+        # previous generations (without distance_matrix, which computes all the distances at once).
+        self.distance_cache = None
+
         # Create a population if one is not given, then partition into species.
         self.population = self._create_population()
         self._speciate(self.population)
@@ -73,15 +93,41 @@ class Population(object):
     def remove_reporter(self, reporter):
         self.reporters.remove(reporter)
 
+    def close(self):
+        """ Releases the processes started by the reproduction (the ones of speciation_pool are the caller's). """
+        if hasattr(self.reproduction, 'close'):
+            self.reproduction.close()
+
+    def _indexer_state(self):
+        """ Everything the next IDs, innovation numbers and stagnation of a resumed run depend on. """
+        stagnation = self.reproduction.stagnation
+        return {'species': self.species_indexer.next_id,
+                'genomes': self.genome_indexer.next_id,
+                'innovations': (self.innovation_indexer.indexer.next_id, self.innovation_indexer.innovations),
+                'stagnation': (getattr(stagnation, 'previous_fitnesses', None),
+                               getattr(stagnation, 'stagnant_counts', None))}
+
+    def _set_indexer_state(self, state):
+        # the reproduction shares the indexers, so they are updated in place
+        self.species_indexer.next_id = state['species']
+        self.genome_indexer.next_id = state['genomes']
+        self.innovation_indexer.indexer.next_id, self.innovation_indexer.innovations = state['innovations']
+        previous_fitnesses, stagnant_counts = state['stagnation']
+        if previous_fitnesses is not None:
+            self.reproduction.stagnation.previous_fitnesses = previous_fitnesses
+            self.reproduction.stagnation.stagnant_counts = stagnant_counts
+
     def load_checkpoint(self, filename):
         '''Resumes the simulation from a previous saved point.'''
         self.reporters.loading_checkpoint(filename)
         with gzip.open(filename) as f:
-            (self.species,
-             self.generation,
-             random_state) = pickle.load(f)
+            data = pickle.load(f)
 
-            random.setstate(random_state)
+        self.species, self.generation, random_state = data[:3]
+        random.setstate(random_state)
+        # the checkpoints saved before the indexers were added only resume the species
+        if len(data) > 3:
+            self._set_indexer_state(data[3])
 
     def save_checkpoint(self, filename=None, checkpoint_type="user"):
         """ Save the current simulation state. """
@@ -93,7 +139,8 @@ class Population(object):
         with gzip.open(filename, 'w', compresslevel=5) as f:
             data = (self.species,
                     self.generation,
-                    random.getstate())
+                    random.getstate(),
+                    self._indexer_state())
             pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
 
     def _create_population(self):
@@ -138,12 +185,48 @@ class Population(object):
         assumption, you should make sure other necessary parts of the code are updated to reflect
         the new behavior.
         """
+        if self.config.distance_matrix:
+            # All the distances to the representatives at once, see neatsociety.speciation.
+            speciate(population, self.species, self.config, self.species_indexer, self.speciation_pool)
+        elif self.distance_cache is not None:
+            hits, misses = self.distance_cache.hits, self.distance_cache.misses
+            self._speciate_pairwise(population)
+            self.reporters.cache_statistics('distance', self.distance_cache.hits - hits,
+                                            self.distance_cache.misses - misses)
+        else:
+            self._speciate_pairwise(population)
+
+        # Only keep non-empty species.
+        self.species = [s for s in self.species if s.members]
+
+        # Select a random current member as the new representative.
+        rng = self.streams.speciation(self.generation) if self.streams is not None else random
+        for s in self.species:
+            s.representative = rng.choice(s.members)
+
+    def _speciate_pairwise(self, population):
+        """ Places the genomes into species with one distance computation for each (genome, species) pair. """
+        # With packed_distance, every genome is packed once and the distances are computed on the arrays.
+        packed = {}
+
+        def compute_distance(individual, representative):
+            if not self.config.packed_distance:
+                return individual.distance(representative)
+            for g in (individual, representative):
+                if g.ID not in packed:
+                    packed[g.ID] = g.pack()
+            return packed[individual.ID].distance(packed[representative.ID])
+
         for individual in population:
             # Find the species with the most similar representative.
             min_distance = None
             closest_species = None
             for s in self.species:
-                distance = individual.distance(s.representative)
+                if self.distance_cache is not None:
+                    distance = self.distance_cache.distance(individual, s.representative,
+                                                            lambda: compute_distance(individual, s.representative))
+                else:
+                    distance = compute_distance(individual, s.representative)
                 if distance < self.config.compatibility_threshold:
                     if min_distance is None or distance < min_distance:
                         closest_species = s
@@ -155,21 +238,15 @@ class Population(object):
                 # No species is similar enough, create a new species for this individual.
                 self.species.append(Species(individual, self.species_indexer.next()))
 
-        # Only keep non-empty species.
-        self.species = [s for s in self.species if s.members]
-
-        # Select a random current member as the new representative.
-        for s in self.species:
-            s.representative = random.choice(s.members)
-
     def run(self, fitness_function, n):
         """
         Runs NEAT's genetic algorithm for n generations.
 
         The user-provided fitness_function should take one argument, a list of all genomes in the population,
-        and its return value is ignored.  This function is free to maintain external state, perform evaluations
-        in parallel, and probably any other thing you want.  The only requirement is that each individual's
-        fitness member must be set to a floating point value after this function returns.
+        and its return value is ignored (unless a fitness cache is set, see FitnessCache.evaluate).  This
+        function is free to maintain external state, perform evaluations in parallel, and probably any other
+        thing you want.  The only requirement is that each individual's fitness member must be set to a
+        floating point value after this function returns.
 
         It is assumed that fitness_function does not modify the list of genomes, or the genomes themselves, apart
         from updating the fitness member.
@@ -189,17 +266,21 @@ class Population(object):
                 population.extend(s.members)
 
             # Evaluate all individuals in the population using the user-provided function.
-            # TODO: Add an option to only evaluate each genome once, to reduce number of
-            # fitness evaluations in cases where the fitness is known to be the same if the
-            # genome doesn't change--in these cases, evaluating unmodified elites in each
-            # generation is a waste of time.
+            # If a fitness cache is set, genomes whose structure has already been evaluated
+            # (e.g. unmodified elites) reuse the cached fitness according to its policy.
             if self.config.reevaluate:
                 unevaluated_population = [p for p in population]
             else:
                 unevaluated_population = [p for p in population if p.fitness == None]            
                 
-            fitness_function(unevaluated_population)
-            self.total_evaluations += len(unevaluated_population)
+            if self.fitness_cache is not None:
+                hits, misses = self.fitness_cache.evaluate(fitness_function, unevaluated_population, self.generation)
+                self.reporters.cache_statistics('fitness', hits, misses)
+                self.fitness_cache.save()
+                self.total_evaluations += misses
+            else:
+                fitness_function(unevaluated_population)
+                self.total_evaluations += len(unevaluated_population)
 
             # Gather and report statistics.
             best = max(population)
@@ -216,7 +297,8 @@ class Population(object):
                 break
 
             # Create the next generation from the current generation.
-            self.species, new_population = self.reproduction.reproduce(self.species, self.config.pop_size)
+            self.species, new_population = self.reproduction.reproduce(self.species, self.config.pop_size,
+                                                                       self.generation)
 
             # Check for complete extinction
             #if not self.species:
@@ -48,6 +48,10 @@ class ReporterSet(object):
         for r in self.reporters:
             r.species_stagnant(species)
 
+    def cache_statistics(self, name, hits, misses):
+        for r in self.reporters:
+            r.cache_statistics(name, hits, misses)
+
     def info(self, msg):
         for r in self.reporters:
             r.info(msg)
@@ -79,6 +83,9 @@ class BaseReporter(object):
     def species_stagnant(self, species):
         pass
 
+    def cache_statistics(self, name, hits, misses):
+        pass
+
     def info(self, msg):
         pass
 
@@ -125,6 +132,11 @@ class StdOutReporter(BaseReporter):
     def species_stagnant(self, species):
         print("\nSpecies {0} with {1} members is stagnated: removing it".format(species.ID, len(species.members)))
 
+    def cache_statistics(self, name, hits, misses):
+        total = hits + misses
+        print('{0} cache: {1:d} hits, {2:d} misses ({3:.1f}% hit rate)'.format(
+            name.capitalize(), hits, misses, 100.0 * hits / total if total else 0.0))
+
     def info(self, msg):
         print(msg)
 
@@ -134,6 +146,7 @@ class StatisticsReporter(BaseReporter):
         BaseReporter.__init__(self)
         self.most_fit_genomes = []
         self.generation_statistics = []
+        self.cache_history = {}
 
     def post_evaluate(self, population, species, best):
         self.most_fit_genomes.append(copy.deepcopy(best))
@@ -144,6 +157,9 @@ class StatisticsReporter(BaseReporter):
             species_stats[s.ID] = [m.fitness for m in s.members]
         self.generation_statistics.append(species_stats)
 
+    def cache_statistics(self, name, hits, misses):
+        self.cache_history.setdefault(name, []).append((hits, misses))
+
     def get_average_fitness(self):
         """Get the per-generation average fitness."""
         avg_fitness = []
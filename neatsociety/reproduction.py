@@ -1,5 +1,9 @@
 import math
 import random
+from multiprocessing import Pool
+
+from neatsociety.indexer import RecordingInnovationIndexer
+from neatsociety.rng import RandomStreams
 
 
 # TODO: Provide some sort of optional cross-species performance criteria, which
@@ -17,13 +21,20 @@ class DefaultReproduction(object):
         params = config.get_type_config(self)
         self.elitism = int(params.get('elitism'))
         self.survival_threshold = float(params.get('survival_threshold'))
+        # Number of processes building the children (crossover and mutation), 1 to build them here.
+        self.workers = int(params.get('workers', 1))
+        self.pool = None
+
+        self.config = config
+        # With a seed, the parents and the children draw their random numbers from streams of their own.
+        self.streams = RandomStreams(config.seed) if getattr(config, 'seed', None) is not None else None
 
         self.reporters = reporters
         self.genome_indexer = genome_indexer
         self.innovation_indexer = innovation_indexer
         self.stagnation = config.stagnation_type(config, reporters)
 
-    def reproduce(self, species, pop_size):
+    def reproduce(self, species, pop_size, generation=None):
         # Filter out stagnated species and collect the set of non-stagnated species members.
         remaining_species = {}
         species_fitness = []
@@ -71,6 +82,7 @@ class DefaultReproduction(object):
 
         new_population = []
         new_species = []
+        jobs = []
         for spawn, (s, sfitness) in zip(spawn_amounts, species_fitness):
             # If elitism is enabled, each species always at least gets to retain its elites.
             spawn = max(spawn, self.elitism)
@@ -101,18 +113,100 @@ class DefaultReproduction(object):
             old_members = old_members[:repro_cutoff]
 
             # Randomly choose parents and produce the number of offspring allotted to the species.
-            while spawn > 0:
-                spawn -= 1
-
-                parent1 = random.choice(old_members)
-                parent2 = random.choice(old_members)
-
-                # Note that if the parents are not distinct, crossover will produce a
-                # genetically identical clone of the parent (but with a different ID).
-                child = parent1.crossover(parent2, self.genome_indexer.next())
-                new_population.append(child.mutate(self.innovation_indexer))
+            if self.streams is not None:
+                parents_rng = self.streams.parents(generation, s.ID)
+            else:
+                parents_rng = random
+            pairs = []
+            for index in range(spawn):
+                parent1 = parents_rng.randrange(len(old_members))
+                parent2 = parents_rng.randrange(len(old_members))
+                child_id = self.genome_indexer.next()
+                if self.streams is not None:
+                    seed = self.streams.child_seed(generation, s.ID, index)
+                elif self.workers > 1:
+                    seed = random.getrandbits(64)
+                else:
+                    seed = None
+
+                if self.workers > 1:
+                    # the children are built by the pool after the loop
+                    pairs.append((parent1, parent2, child_id, seed))
+                else:
+                    # Note that if the parents are not distinct, crossover will produce a
+                    # genetically identical clone of the parent (but with a different ID).
+                    new_population.append(build_child(old_members, parent1, parent2, child_id, seed,
+                                                      self.innovation_indexer))
+
+            if pairs:
+                jobs.append((len(new_population), old_members, pairs))
+
+        if jobs:
+            # Insert the children of each species after its elites, starting from the last species.
+            children = self.reproduce_parallel([(parents, pairs) for position, parents, pairs in jobs])
+            for (position, parents, pairs), species_children in reversed(list(zip(jobs, children))):
+                new_population[position:position] = species_children
 
         # Sort species by ID (purely for ease of reading the reported list).
         new_species.sort(key=lambda s: s.ID)
 
-        return new_species, new_population
\ No newline at end of file
+        return new_species, new_population
+
+    def close(self):
+        """ Stops the processes building the children, if they have been started. """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def reproduce_parallel(self, species_jobs):
+        """
+        Builds the children of each (parents, [(parent1 index, parent2 index, child ID, seed)...]) job of
+        species_jobs in the pool, and returns the list of the children of each job.
+
+        The workers number the new innovations provisionally: they are numbered here by the innovation indexer,
+        in the order of the children and of their requests, as if the children had been built one after the
+        other, so that the innovation numbers only depend on the seed (and are the same as in a serial
+        reproduction with the same random streams).
+        """
+        if self.pool is None:
+            self.pool = Pool(self.workers)
+
+        innovations = dict(self.innovation_indexer.innovations)
+        results = self.pool.map(_build_children, [(parents, pairs, innovations) for parents, pairs in species_jobs])
+
+        children = []
+        for species_results in results:
+            species_children = []
+            for child, requests in species_results:
+                innovation_ids = dict((-1 - i, self.innovation_indexer.get_innovation_id(*key))
+                                      for i, key in enumerate(requests))
+                for cg in child.conn_genes.values():
+                    if cg.innovation_id < 0:
+                        cg.innovation_id = innovation_ids[cg.innovation_id]
+                # the child shares the configuration instead of its unpickled copy
+                child.config = self.config
+                species_children.append(child)
+            children.append(species_children)
+
+        return children
+
+
+def build_child(parents, parent1, parent2, child_id, seed, innovation_indexer):
+    """
+    Crossover of parents[parent1] and parents[parent2] and mutation of the child, with the random numbers of
+    random.Random(seed), or of the random module if seed is None.
+    """
+    rng = random.Random(seed) if seed is not None else random
+    child = parents[parent1].crossover(parents[parent2], child_id, rng)
+    return child.mutate(innovation_indexer, rng)
+
+
+def _build_children(job):
+    """ Crossover and mutation of the children of a species, in a worker process. """
+    parents, pairs, innovations = job
+    children = []
+    for parent1, parent2, child_id, seed in pairs:
+        indexer = RecordingInnovationIndexer(innovations)
+        children.append((build_child(parents, parent1, parent2, child_id, seed, indexer), indexer.requests))
+    return children
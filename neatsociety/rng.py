@@ -0,0 +1,45 @@
+"""
+Deterministic random number streams, so that a seeded evolution gives the same results whatever the order in
+which (and the process where) its random steps run.
+
+Every stream is a random.Random seeded from a numpy SeedSequence of the run's seed and of a spawn key naming
+the step: the speciation of a generation, the choice of the parents of a species in a generation, the
+crossover and mutation of each of its children. A stream only depends on the seed and on its key, never on
+the other streams, so a child built in a worker process draws exactly the numbers it would draw in a serial
+run, and a run resumed from a checkpoint (which also saves the genome, species and innovation indexers and the
+stagnation) draws the same numbers, and gives the same IDs, as an uninterrupted one.
+"""
+import random
+
+import numpy as np
+
+# first element of the spawn keys of each kind of stream
+SPECIATION = 0
+PARENTS = 1
+CHILD = 2
+
+
+class RandomStreams(object):
+    def __init__(self, seed):
+        self.seed = seed
+
+    def stream_seed(self, *key):
+        """ Integer seed of the stream identified by key (non-negative integers). """
+        state = np.random.SeedSequence(self.seed, spawn_key=key).generate_state(4, dtype=np.uint32)
+        return int.from_bytes(state.tobytes(), 'little')
+
+    def stream(self, *key):
+        return random.Random(self.stream_seed(*key))
+
+    # the generations start at -1 (the initial population), the spawn keys at 0
+    def speciation(self, generation):
+        """ Stream of the speciation of the population of a generation. """
+        return self.stream(SPECIATION, generation + 1)
+
+    def parents(self, generation, species_id):
+        """ Stream choosing the parents of the children of a species. """
+        return self.stream(PARENTS, generation + 1, species_id)
+
+    def child_seed(self, generation, species_id, index):
+        """ Seed of the stream of the crossover and mutation of the index-th child of a species. """
+        return self.stream_seed(CHILD, generation + 1, species_id, index)
@@ -0,0 +1,206 @@
+"""
+Whole-population speciation with a batched compatibility distance kernel.
+
+A GeneIndex maps every node id and connection key found in a generation (the new population plus the species
+representatives) to a column, and stores the genes of each genome as one row of dense arrays: presence, bias,
+response and activation of the nodes, presence, weight, enabled flag and innovation number of the connections.
+The distances between sets of rows are then computed for all the pairs at once, with the same terms as
+Genome.distance (they only differ by the rounding of the sums, whose order is not the same), and the genomes
+are assigned to the closest species under compatibility_threshold with an argmin.
+"""
+import numpy as np
+
+from neatsociety.packed_genome import _activation_code
+from neatsociety.species import Species
+
+
+class GeneIndex(object):
+    """
+    Dense arrays of the genes of 'genomes' over the shared gene keys: one row per gene key and one column per
+    genome, so that the genes of a set of keys are contiguous.
+    """
+
+    def __init__(self, genomes=None):
+        if genomes is None:
+            return
+
+        node_rows = {}
+        conn_rows = {}
+        for g in genomes:
+            for n in g.node_genes:
+                node_rows.setdefault(n, len(node_rows))
+            for key in g.conn_genes:
+                conn_rows.setdefault(key, len(conn_rows))
+
+        shape = (len(node_rows), len(genomes))
+        self.node_present = np.zeros(shape, dtype=bool)
+        self.biases = np.zeros(shape)
+        self.responses = np.zeros(shape)
+        self.activations = np.full(shape, -1, dtype=np.int64)
+
+        shape = (len(conn_rows), len(genomes))
+        self.conn_present = np.zeros(shape, dtype=bool)
+        self.weights = np.zeros(shape)
+        self.enabled = np.zeros(shape, dtype=bool)
+        # -1 for the missing genes
+        self.innovations = np.full(shape, -1, dtype=np.int64)
+
+        for column, g in enumerate(genomes):
+            for n, ng in g.node_genes.items():
+                row = node_rows[n]
+                self.node_present[row, column] = True
+                self.biases[row, column] = ng.bias
+                self.responses[row, column] = ng.response
+                self.activations[row, column] = _activation_code(ng.activation_type)
+            for key, cg in g.conn_genes.items():
+                row = conn_rows[key]
+                self.conn_present[row, column] = True
+                self.weights[row, column] = cg.weight
+                self.enabled[row, column] = cg.enabled
+                self.innovations[row, column] = cg.innovation_id
+
+        self.num_nodes = self.node_present.sum(axis=0)
+        self.num_connections = self.conn_present.sum(axis=0)
+        # -1 for the genomes without connection genes
+        self.max_innovation = self.innovations.max(axis=0, initial=-1)
+        # innovation numbers of each genome, sorted (after the -1 of its missing genes)
+        self.sorted_innovations = np.sort(self.innovations, axis=0)
+
+    def __len__(self):
+        return len(self.num_nodes)
+
+    def take(self, genomes):
+        """ Returns the index of the given genomes (column numbers) only, with the same gene keys. """
+        index = GeneIndex()
+        for name, value in self.__dict__.items():
+            setattr(index, name, value[..., genomes])
+        return index
+
+
+def distance_matrix(index1, index2, coefficients):
+    """
+    Returns the matrix of the distances between the genomes of index1 (rows) and index2 (columns), two
+    GeneIndex with the same gene keys: element (i, j) is the distance genome1[i].distance(genome2[j]).
+    coefficients are the (excess, disjoint, weight) coefficients of the configuration.
+    """
+    excess_coefficient, disjoint_coefficient, weight_coefficient = coefficients
+    distances = np.zeros((len(index1), len(index2)))
+
+    # number of connection genes of each genome of index1 with a later innovation than the last one of each
+    # genome of index2
+    num_keys = index1.sorted_innovations.shape[0]
+    later = np.empty((len(index1), len(index2)), dtype=np.int64)
+    for i in range(len(index1)):
+        later[i] = num_keys - np.searchsorted(index1.sorted_innovations[:, i], index2.max_innovation, 'right')
+
+    for j in range(len(index2)):
+        # Compute node gene differences.
+        common = index1.node_present & index2.node_present[:, j, np.newaxis]
+        num_common = np.count_nonzero(common, axis=0)
+        excess_nodes = index1.num_nodes + index2.num_nodes[j] - 2 * num_common
+        bias_diff = (np.abs(index1.biases - index2.biases[:, j, np.newaxis]) * common).sum(axis=0)
+        response_diff = (np.abs(index1.responses - index2.responses[:, j, np.newaxis]) * common).sum(axis=0)
+        different = index1.activations != index2.activations[:, j, np.newaxis]
+        activation_diff = np.count_nonzero(common & different, axis=0)
+
+        most_nodes = np.maximum(index1.num_nodes, index2.num_nodes[j])
+        distance = (excess_coefficient * excess_nodes / most_nodes
+                    + excess_coefficient * activation_diff / most_nodes
+                    + weight_coefficient * (bias_diff + response_diff) / num_common)
+
+        # Compute connection gene differences, on the connection genes of the representative only: genome1 is the
+        # genome with more connections (the representative on a tie), its excess genes are the ones missing from
+        # the other genome with a later innovation than all the other genome's genes.
+        keys = np.flatnonzero(index2.conn_present[:, j])
+        present = index1.conn_present[keys]
+        matching = np.count_nonzero(present, axis=0)
+        first_is_row = index1.num_connections > index2.num_connections[j]
+        N = np.where(first_is_row, index1.num_connections, index2.num_connections[j])
+
+        if len(keys):
+            max_innovation = index2.max_innovation[j]
+            matching_later = present & (index1.innovations[keys] > max_innovation)
+            excess_row = later[:, j] - np.count_nonzero(matching_later, axis=0)
+        else:
+            excess_row = np.zeros(len(index1), dtype=np.int64)
+        innovations = index2.innovations[keys, j, np.newaxis]
+        excess_column = np.count_nonzero(~present & (innovations > index1.max_innovation), axis=0)
+        excess_column[index1.num_connections == 0] = 0
+        excess = np.where(first_is_row, excess_row, excess_column)
+        disjoint = (N - matching - excess) + (index1.num_connections + index2.num_connections[j] - N - matching)
+
+        differences = np.abs(index1.weights[keys] - index2.weights[keys, j, np.newaxis])
+        differences *= present
+        differences += present & (index1.enabled[keys] != index2.enabled[keys, j, np.newaxis])
+        weight_diff = differences.sum(axis=0)
+
+        has_connections = N > 0
+        safe_N = np.maximum(N, 1)
+        distance += np.where(has_connections, excess_coefficient * excess / safe_N, 0.0)
+        distance += np.where(has_connections, disjoint_coefficient * disjoint / safe_N, 0.0)
+        distance += np.where(matching > 0, weight_coefficient * (weight_diff / np.maximum(matching, 1)), 0.0)
+
+        distances[:, j] = distance
+
+    return distances
+
+
+def _distance_matrix_job(args):
+    return distance_matrix(*args)
+
+
+def sharded_distance_matrix(index1, index2, coefficients, pool=None, shards=None):
+    """ distance_matrix, with the genomes of index1 split in 'shards' blocks of rows computed by a process pool. """
+    if pool is None or len(index1) == 0:
+        return distance_matrix(index1, index2, coefficients)
+
+    if shards is None:
+        shards = getattr(pool, '_processes', None) or 1
+    blocks = [genomes for genomes in np.array_split(np.arange(len(index1)), shards) if len(genomes)]
+    jobs = [(index1.take(genomes), index2, coefficients) for genomes in blocks]
+    return np.vstack(pool.map(_distance_matrix_job, jobs))
+
+
+def speciate(population, species, config, species_indexer, pool=None):
+    """
+    Places the genomes of 'population' into 'species' (a list of Species, extended with the new ones) as
+    Population._speciate does: each genome joins the species of the closest representative whose distance is
+    below compatibility_threshold, the first such species on a tie, or a new species otherwise, which the
+    following genomes can also join.
+
+    The distances to the current representatives are computed as one matrix (by 'pool' if not None), then
+    the distances to the representative of each new species as one column.
+    """
+    if not population:
+        return
+
+    threshold = config.compatibility_threshold
+    coefficients = (config.excess_coefficient, config.disjoint_coefficient, config.weight_coefficient)
+    index = GeneIndex(list(population) + [s.representative for s in species])
+    members = index.take(np.arange(len(population)))
+
+    num_species = len(species)
+    best_distance = np.full(len(population), np.inf)
+    best_species = np.full(len(population), -1, dtype=np.int64)
+    if num_species:
+        representatives = index.take(np.arange(len(population), len(population) + num_species))
+        distances = sharded_distance_matrix(members, representatives, coefficients, pool)
+        distances[distances >= threshold] = np.inf
+        best_species = np.argmin(distances, axis=1)
+        best_distance = distances[np.arange(len(population)), best_species]
+        best_species[np.isinf(best_distance)] = -1
+
+    for i, individual in enumerate(population):
+        if best_species[i] >= 0:
+            species[best_species[i]].add(individual)
+            continue
+
+        # No species is similar enough, create a new species for this individual; the next genomes join it if
+        # it is closer than their current best species (which comes first in the list on a tie).
+        species.append(Species(individual, species_indexer.next()))
+        if i + 1 < len(population):
+            rest = np.arange(i + 1, len(population))
+            column = distance_matrix(members.take(rest), members.take([i]), coefficients)[:, 0]
+            closer = (column < threshold) & (column < best_distance[rest])
+            best_distance[rest[closer]] = column[closer]
+            best_species[rest[closer]] = len(species) - 1
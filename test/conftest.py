@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from neatsociety.config import Config
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'neat', 'src', 'nn_config')
+
+
+@pytest.fixture(scope='session')
+def make_config(tmp_path_factory):
+    """
+    Returns a function loading neat/src/nn_config with some options overridden: make_config(sections, **options),
+    where sections maps the name of each option to the section it is (or is added) in.
+    """
+    def make(sections, **overrides):
+        with open(CONFIG) as f:
+            lines = f.read().splitlines()
+        for name, value in overrides.items():
+            lines = [l for l in lines if l.split('=')[0].strip() != name]
+            lines.insert(lines.index('[{}]'.format(sections[name])) + 1, '{} = {}'.format(name, value))
+        path = tmp_path_factory.mktemp('config') / 'nn_config'
+        path.write_text('\n'.join(lines) + '\n')
+        return Config(str(path))
+
+    return make
@@ -0,0 +1,88 @@
+from neatsociety.benchmark import create_genomes
+from neatsociety.distance_cache import DistanceCache
+from neatsociety.indexer import InnovationIndexer
+from neatsociety.population import Population
+
+SECTIONS = {'seed': 'genetic', 'pop_size': 'genetic', 'init_pop_size': 'genetic'}
+
+
+def counting(genome, other, calls):
+    def compute():
+        calls.append((genome.ID, other.ID))
+        return genome.distance(other)
+    return compute
+
+
+def test_pairs_looked_up_again_hit(make_config):
+    a, b = create_genomes(make_config(SECTIONS), 2, seed=1)
+    cache = DistanceCache()
+    calls = []
+
+    assert cache.distance(a, b, counting(a, b, calls)) == a.distance(b)
+    assert cache.distance(a, b, counting(a, b, calls)) == a.distance(b)
+    assert calls == [(a.ID, b.ID)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_mutated_genomes_miss(make_config):
+    a, b = create_genomes(make_config(SECTIONS), 2, seed=1)
+    cache = DistanceCache()
+    cache.distance(a, b)
+
+    version = a.version
+    a.mutate(InnovationIndexer(10000))
+    assert a.version == version + 1
+
+    assert cache.distance(a, b) == a.distance(b)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_pairs_are_ordered(make_config):
+    a, b = create_genomes(make_config(SECTIONS), 2, seed=1)
+    cache = DistanceCache()
+    calls = []
+
+    cache.distance(a, b, counting(a, b, calls))
+    assert cache.distance(b, a, counting(b, a, calls)) == b.distance(a)
+    assert calls == [(a.ID, b.ID), (b.ID, a.ID)]
+    assert len(cache.entries) == 2
+
+
+def test_least_recently_used_pairs_are_evicted(make_config):
+    a, b, c = create_genomes(make_config(SECTIONS), 3, seed=1)
+    cache = DistanceCache(max_entries=2)
+
+    cache.distance(a, b)
+    cache.distance(a, c)
+    cache.distance(a, b)
+    # (a, c) is the least recently used pair when (b, c) is added
+    cache.distance(b, c)
+    assert list(cache.entries) == [DistanceCache.key(a, b), DistanceCache.key(b, c)]
+
+    cache.distance(a, c)
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def species_history(config, distance_cache, generations):
+    pop = Population(config)
+    pop.distance_cache = distance_cache
+
+    def evaluate(genomes):
+        for g in genomes:
+            g.fitness = (g.ID * 7919 % 1000) / 1000.0 + len(g.conn_genes)
+
+    history = []
+    for _ in range(generations):
+        pop.run(evaluate, 1)
+        history.append([(s.ID, [m.ID for m in s.members], s.representative.ID) for s in pop.species])
+    return history
+
+
+def test_species_do_not_depend_on_the_cache(make_config):
+    config = make_config(SECTIONS, seed=7, pop_size=80, init_pop_size=80)
+    config.report = False
+    cache = DistanceCache()
+
+    assert species_history(config, cache, 5) == species_history(config, None, 5)
+    # the elites and the representatives were compared again
+    assert cache.hits > 0
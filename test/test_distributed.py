@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import pickle
+import signal
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from neatsociety.distributed import DistributedEvaluator, DistributedWorker
+
+spawn = multiprocessing.get_context('spawn')
+
+# set if the broker ever unpickles the payload of a peer which did not authenticate
+unpickled = threading.Event()
+
+
+class Genome(object):
+    def __init__(self, ID, value):
+        self.ID = ID
+        self.value = value
+        self.fitness = None
+
+
+def mark_unpickled():
+    unpickled.set()
+
+
+class Payload(object):
+    def __reduce__(self):
+        return mark_unpickled, ()
+
+
+def evaluate_slowly(genome):
+    time.sleep(0.05)
+    return genome.value * 2.0
+
+
+def run_worker(address, authkey, capacity, started):
+    def eval_function(genome):
+        if started is not None:
+            started.set()
+        return evaluate_slowly(genome)
+
+    DistributedWorker(eval_function, address, authkey, capacity=capacity, heartbeat_interval=0.5,
+                      connect_timeout=10).run()
+
+
+def start_worker(address, authkey, capacity, started=None):
+    # spawned, not forked: the threads of the broker may hold locks (e.g. of the imports) at any time
+    process = spawn.Process(target=run_worker, args=(address, authkey, capacity, started))
+    process.daemon = True
+    process.start()
+    return process
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@pytest.fixture
+def broker():
+    broker = DistributedEvaluator(heartbeat_timeout=3.0, max_retries=3, timeout=60)
+    yield broker
+    broker.close()
+
+
+def test_broker_listens_on_localhost(broker):
+    assert broker.address[0] == '127.0.0.1'
+
+
+def test_workers_survive_a_killed_worker(broker):
+    started = spawn.Event()
+    processes = [start_worker(broker.address, broker.authkey, capacity) for capacity in (1, 2, 3)]
+    victim = start_worker(broker.address, broker.authkey, 2, started)
+    assert wait_for(lambda: broker.num_workers() == 4)
+    assert broker.capacity() == 8
+
+    genomes = [Genome(i, float(i)) for i in range(60)]
+    evaluation = threading.Thread(target=broker.evaluate, args=(genomes,))
+    evaluation.start()
+
+    # the victim dies in the middle of its jobs, which are given to the other workers
+    assert started.wait(10)
+    os.kill(victim.pid, signal.SIGKILL)
+    evaluation.join(60)
+
+    assert not evaluation.is_alive()
+    assert [g.fitness for g in genomes] == [2.0 * i for i in range(60)]
+    assert broker.num_workers() == 3
+
+    for process in processes:
+        process.terminate()
+
+
+def test_unauthenticated_peers_are_rejected(broker):
+    # a peer with another authkey cannot connect
+    with pytest.raises(multiprocessing.AuthenticationError):
+        DistributedWorker(evaluate_slowly, broker.address, b'another key')._connect()
+
+    # and a raw pickle sent to the broker is never unpickled
+    payload = pickle.dumps(('hello', Payload()))
+    sock = socket.create_connection(broker.address)
+    sock.sendall(struct.pack('!i', len(payload)) + payload)
+    sock.settimeout(5)
+    try:
+        while sock.recv(1024):
+            pass
+    except OSError:
+        pass
+    sock.close()
+
+    assert not unpickled.is_set()
+    assert broker.num_workers() == 0
+
+    # while the workers with the authkey are served
+    process = start_worker(broker.address, broker.authkey, 1)
+    genomes = [Genome(i, float(i)) for i in range(3)]
+    broker.evaluate(genomes)
+    assert [g.fitness for g in genomes] == [0.0, 2.0, 4.0]
+    process.terminate()
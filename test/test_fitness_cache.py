@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+from neatsociety import fitness_cache
+from neatsociety.fitness_cache import FitnessCache
+from neatsociety.population import Population
+
+
+def genomes(*names):
+    return [SimpleNamespace(name=name, fitness=None) for name in names]
+
+
+def test_only_the_returned_genomes_are_cached(monkeypatch):
+    monkeypatch.setattr(fitness_cache, 'genome_hash', lambda g: g.name)
+    cache = FitnessCache(policy='always')
+
+    def staged(individuals):
+        # 'a' is raced in full, the fitness of 'b' is an estimate
+        for g in individuals:
+            g.fitness = {'a': 10.0, 'b': 3.0}[g.name]
+        return [g for g in individuals if g.name == 'a']
+
+    first = genomes('a', 'b')
+    assert cache.evaluate(staged, first, 0) == (0, 2)
+    assert [g.fitness for g in first] == [10.0, 3.0]
+
+    raced = []
+
+    def full(individuals):
+        raced.extend(g.name for g in individuals)
+        for g in individuals:
+            g.fitness = 7.0
+
+    second = genomes('a', 'b')
+    assert cache.evaluate(full, second, 1) == (1, 1)
+    assert raced == ['b']
+    assert [g.fitness for g in second] == [10.0, 7.0]
+
+
+def counting_evaluation(values):
+    """ Evaluation giving the next of 'values' to each genome it races, and recording their names. """
+    raced = []
+
+    def evaluate(individuals):
+        for g in individuals:
+            raced.append(g.name)
+            g.fitness = values[len(raced) - 1]
+
+    return evaluate, raced
+
+
+def test_average_policy(monkeypatch):
+    monkeypatch.setattr(fitness_cache, 'genome_hash', lambda g: g.name)
+    cache = FitnessCache(policy='average', samples=3)
+    evaluate, raced = counting_evaluation([1.0, 2.0, 6.0, 100.0])
+
+    fitness = []
+    for generation in range(5):
+        individuals = genomes('a')
+        cache.evaluate(evaluate, individuals, generation)
+        fitness.append(individuals[0].fitness)
+
+    # raced until 3 values are collected, then their mean is reused
+    assert raced == ['a', 'a', 'a']
+    assert fitness == [1.0, 1.5, 3.0, 3.0, 3.0]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_interval_policy(monkeypatch):
+    monkeypatch.setattr(fitness_cache, 'genome_hash', lambda g: g.name)
+    cache = FitnessCache(policy='interval', samples=2, interval=2)
+    evaluate, raced = counting_evaluation([1.0, 3.0, 8.0])
+
+    fitness = []
+    for generation in range(6):
+        individuals = genomes('a')
+        cache.evaluate(evaluate, individuals, generation)
+        fitness.append(individuals[0].fitness)
+
+    # raced again every 2 generations, the fitness is the mean of the last 2 values
+    assert len(raced) == 3
+    assert fitness == [1.0, 1.0, 2.0, 2.0, 5.5, 5.5]
+
+
+def test_context_changes_invalidate_the_entries(monkeypatch):
+    monkeypatch.setattr(fitness_cache, 'genome_hash', lambda g: g.name)
+    cache = FitnessCache(context=('aalborg.xml', 300))
+    evaluate, raced = counting_evaluation([1.0, 2.0, 3.0])
+
+    for context in [('aalborg.xml', 300), ('aalborg.xml', 300), ('forza.xml', 300), ('aalborg.xml', 300)]:
+        cache.set_context(context)
+        cache.evaluate(evaluate, genomes('a'), 0)
+
+    # the values raced in a context are only reused in the same context
+    assert raced == ['a', 'a']
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_entries_persist_across_save_and_reload(monkeypatch, tmp_path):
+    monkeypatch.setattr(fitness_cache, 'genome_hash', lambda g: g.name)
+    filename = str(tmp_path / 'fitness_cache.gz')
+    cache = FitnessCache(filename, context=('aalborg.xml',))
+    evaluate, raced = counting_evaluation([4.0, 5.0])
+    cache.evaluate(evaluate, genomes('a'), 0)
+    cache.save()
+
+    reloaded = FitnessCache(filename, context=('aalborg.xml',))
+    individuals = genomes('a', 'b')
+    assert reloaded.evaluate(evaluate, individuals, 1) == (1, 1)
+    assert raced == ['a', 'b']
+    assert [g.fitness for g in individuals] == [4.0, 5.0]
+
+
+def test_population_reports_the_cache_statistics(make_config, tmp_path):
+    # the elites are raced again each generation, and found in the cache
+    config = make_config({'seed': 'genetic', 'reevaluate': 'phenotype'}, seed=3, reevaluate=1)
+    config.report = False
+    pop = Population(config)
+    pop.fitness_cache = FitnessCache(str(tmp_path / 'fitness_cache.gz'))
+
+    def evaluate(individuals):
+        for g in individuals:
+            g.fitness = float(len(g.conn_genes))
+
+    pop.run(evaluate, 4)
+
+    history = pop.statistics.cache_history['fitness']
+    assert len(history) == 4
+    assert pop.fitness_cache.hits > 0
+    assert sum(hits for hits, misses in history) == pop.fitness_cache.hits
+    assert sum(misses for hits, misses in history) == pop.fitness_cache.misses == pop.total_evaluations
+    # the cache is saved after each generation
+    assert len(FitnessCache(str(tmp_path / 'fitness_cache.gz')).entries) == len(pop.fitness_cache.entries)
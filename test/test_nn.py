@@ -0,0 +1,228 @@
+import copy
+import os
+import random
+
+import numpy as np
+import pytest
+
+from neatsociety import activation_functions, activations
+from neatsociety.benchmark import create_genomes
+from neatsociety.config import Config
+from neatsociety.nn import (FeedForwardNetwork, PhenotypeCache, create_feed_forward_phenotype, create_population_batch,
+                            create_recurrent_phenotype, find_feed_forward_layers, genome_hash,
+                            required_for_output)
+from neatsociety.nn.benchmark import quadratic_feed_forward_layers, random_dag
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'neat', 'src', 'nn_config')
+
+
+@pytest.fixture(scope='module', params=['0', '1'])
+def genomes(request, tmp_path_factory):
+    with open(CONFIG) as f:
+        text = f.read().replace('feedforward          = 0', 'feedforward          = ' + request.param)
+    if request.param == '1':
+        # FFGenome does not order the initial hidden nodes of partially connected genomes
+        text = text.replace('hidden_nodes         = 13', 'hidden_nodes         = 0')
+    path = tmp_path_factory.mktemp('config') / 'nn_config'
+    path.write_text(text)
+    return create_genomes(Config(str(path)), 60, seed=1)
+
+
+def genome_graph(genome):
+    inputs = [ng.ID for ng in genome.node_genes.values() if ng.type == 'INPUT']
+    outputs = [ng.ID for ng in genome.node_genes.values() if ng.type == 'OUTPUT']
+    connections = [(cg.in_node_id, cg.out_node_id) for cg in genome.conn_genes.values() if cg.enabled]
+    return inputs, outputs, connections
+
+
+@pytest.mark.parametrize('num_connections', [0, 10, 500, 3000])
+def test_layers_of_random_dags(num_connections):
+    inputs, connections = random_dag(num_connections, fan_in=4, num_inputs=5, seed=num_connections)
+    assert find_feed_forward_layers(inputs, connections) == quadratic_feed_forward_layers(inputs, connections)
+
+
+def test_layers_of_genomes(genomes):
+    for genome in genomes:
+        inputs, outputs, connections = genome_graph(genome)
+        layers = quadratic_feed_forward_layers(inputs, connections)
+        assert find_feed_forward_layers(inputs, connections) == layers
+
+        # the pruned layers only drop the nodes which do not reach an output
+        required = required_for_output(outputs, connections)
+        pruned = [layer & required for layer in layers]
+        assert find_feed_forward_layers(inputs, connections, outputs) == [layer for layer in pruned if layer]
+
+
+def test_required_for_output():
+    connections = [(1, 3), (2, 3), (3, 4), (2, 5), (5, 6), (7, 4)]
+    assert required_for_output([4], connections) == {1, 2, 3, 4, 7}
+    assert required_for_output([4, 6], connections) == {1, 2, 3, 4, 5, 6, 7}
+    assert required_for_output([1], connections) == {1}
+
+
+def test_pruning_keeps_the_outputs(genomes):
+    rng = random.Random(0)
+    for genome in genomes:
+        if not genome.config.feedforward:
+            continue
+        inputs, outputs, connections = genome_graph(genome)
+        net = create_feed_forward_phenotype(genome)
+
+        # the reference network also evaluates the nodes which do not reach an output
+        node_evals = []
+        for layer in quadratic_feed_forward_layers(inputs, connections):
+            for node in layer:
+                links = [(a, cg.weight) for (a, b), cg in genome.conn_genes.items() if b == node and cg.enabled]
+                ng = genome.node_genes[node]
+                node_evals.append((node, activation_functions.get(ng.activation_type), ng.bias, ng.response, links))
+        reference = FeedForwardNetwork(max(genome.node_genes), inputs, outputs, node_evals)
+
+        for _ in range(3):
+            values = [rng.uniform(-1, 1) for _ in inputs]
+            assert net.serial_activate(values) == reference.serial_activate(values)
+
+
+# bounded activations, and the ones made array-safe for the compiled engines
+ACTIVATIONS = ['sigmoid', 'tanh', 'clamped', 'relu', 'inv']
+
+
+def with_activations(genomes, seed=0):
+    """ Copies of the genomes whose nodes get random activation functions. """
+    rng = random.Random(seed)
+    copies = copy.deepcopy(genomes)
+    for genome in copies:
+        for ng in genome.node_genes.values():
+            ng.activation_type = rng.choice(ACTIVATIONS)
+    return copies
+
+
+def test_array_safe_activations():
+    z = np.array([-4.0, 0.0, 2.0])
+    assert activations.relu_activation(z).tolist() == [0.0, 0.0, 2.0]
+    assert activations.inv_activation(z).tolist() == [-0.25, 0.0, 0.5]
+    assert activations.inv_activation(0.0) == 0.0
+    assert activations.inv_activation(4.0) == 0.25
+
+
+def test_compiled_recurrent_network_matches_the_recurrent_one(genomes):
+    rng = random.Random(1)
+    for genome in with_activations(genomes):
+        net = create_recurrent_phenotype(genome)
+        compiled = create_recurrent_phenotype(genome, compiled=True)
+        inputs = [[rng.uniform(-1, 1) for _ in net.input_nodes] for _ in range(4)]
+
+        # the state is kept between the steps, and reset brings both networks back to the start
+        for _ in range(2):
+            for values in inputs:
+                assert np.allclose(compiled.activate(values), net.activate(values), rtol=1e-9, atol=1e-12)
+            net.reset()
+            compiled.reset()
+
+
+def test_population_batch_matches_the_separate_networks(genomes):
+    rng = random.Random(2)
+    batch_genomes = with_activations(genomes[:20])
+    # a network without any evaluated node is only padding in the batch
+    for cg in batch_genomes[0].conn_genes.values():
+        cg.enabled = False
+
+    batch = create_population_batch(batch_genomes)
+    nets = [create_recurrent_phenotype(g) for g in batch_genomes]
+    # the networks have different sizes, so the others are padded with rows and nodes
+    assert len(set(net.max_node for net in nets)) > 1
+    assert len(set(len(net.node_evals) for net in nets)) > 1
+    assert not nets[0].node_evals
+
+    for _ in range(2):
+        for _ in range(4):
+            inputs = [[rng.uniform(-1, 1) for _ in net.input_nodes] for net in nets]
+            outputs = batch.activate(np.array(inputs))
+            for net, values, output in zip(nets, inputs, outputs):
+                assert np.allclose(output, net.activate(values), rtol=1e-9, atol=1e-12)
+        batch.reset()
+        for net in nets:
+            net.reset()
+
+
+def test_array_activate_matches_serial_activate(genomes):
+    if not genomes[0].config.feedforward:
+        pytest.skip('feed-forward phenotypes are built from feed-forward genomes')
+
+    rng = np.random.RandomState(3)
+    tested = 0
+    for genome in with_activations(genomes):
+        net = create_feed_forward_phenotype(genome)
+        inputs = rng.uniform(-1, 1, (10, len(net.input_nodes)))
+
+        outputs = net.array_activate(inputs)
+        for values, output in zip(inputs, outputs):
+            assert np.allclose(output, net.serial_activate(list(values)), rtol=1e-9, atol=1e-12)
+        tested += len(net.layers) > 1
+    # the layers of most networks are evaluated one after the other
+    assert tested
+
+
+def test_phenotype_cache_is_keyed_by_the_structure(genomes):
+    cache = PhenotypeCache()
+    genome = genomes[0]
+    clone = copy.deepcopy(genome)
+    clone.ID = genome.ID + 1000
+    clone.fitness = 123.0
+    assert genome_hash(clone) == genome_hash(genome)
+
+    create_recurrent_phenotype(genome, cache=cache)
+    create_recurrent_phenotype(clone, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # any weight change is another phenotype
+    changed = copy.deepcopy(genome)
+    cg = next(cg for cg in changed.conn_genes.values() if cg.enabled)
+    cg.weight += 0.5
+    assert genome_hash(changed) != genome_hash(genome)
+    create_recurrent_phenotype(changed, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert len(cache) == 2
+
+
+def test_phenotype_cache_evicts_the_least_recently_used(genomes):
+    nets = [create_recurrent_phenotype(g) for g in genomes[:3]]
+    sizes = [PhenotypeCache.estimate_size(net) for net in nets]
+    cache = PhenotypeCache(max_bytes=sum(sizes) - 1)
+
+    cache.put('first', nets[0])
+    cache.put('second', nets[1])
+    assert cache.get('first') is not None
+    # the third network does not fit with the two others: the least recently used one goes
+    cache.put('third', nets[2])
+    assert 'second' not in cache
+    assert 'first' in cache and 'third' in cache
+    assert cache.total_bytes == sizes[0] + sizes[2] <= cache.max_bytes
+
+    # a network larger than the bound is not cached
+    small = PhenotypeCache(max_bytes=sizes[0] - 1)
+    small.put('first', nets[0])
+    assert len(small) == 0 and small.total_bytes == 0
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_phenotype_cache_returns_independent_reset_copies(genomes, compiled):
+    rng = random.Random(4)
+    cache = PhenotypeCache()
+    genome = genomes[1]
+    first = create_recurrent_phenotype(genome, compiled=compiled, cache=cache)
+    inputs = [[rng.uniform(-1, 1) for _ in first.input_nodes] for _ in range(3)]
+    fresh = create_recurrent_phenotype(genome, compiled=compiled)
+    expected = [fresh.activate(values) for values in inputs]
+
+    # the race of the first genome leaves its network in some state...
+    for values in inputs:
+        first.activate(values)
+    first_state = copy.deepcopy(first.values)
+
+    # ...which the next genome with the same structure does not start from
+    second = create_recurrent_phenotype(genome, compiled=compiled, cache=cache)
+    assert second is not first
+    assert cache.hits == 1
+    for values, outputs in zip(inputs, expected):
+        assert second.activate(values) == outputs
+    assert np.array_equal(np.array(first.values), np.array(first_state))
@@ -0,0 +1,60 @@
+import copy
+import itertools
+
+import pytest
+
+from neatsociety.benchmark import create_genomes
+
+
+@pytest.fixture(scope='module')
+def genomes(make_config):
+    return create_genomes(make_config({}), 40, seed=2)
+
+
+def assert_same_distances(genome, other):
+    assert genome.pack().distance(other.pack()) == genome.distance(other)
+    assert other.pack().distance(genome.pack()) == other.distance(genome)
+
+
+def test_distances_of_mutated_genomes(genomes):
+    for genome, other in itertools.combinations(genomes, 2):
+        assert_same_distances(genome, other)
+
+
+def test_distances_with_the_same_number_of_connections(genomes):
+    # the genome compared to the other is chosen by the number of connection genes, so ties are order dependent
+    ties = [(g, o) for g, o in itertools.combinations(genomes, 2) if len(g.conn_genes) == len(o.conn_genes)]
+    changed = copy.deepcopy(genomes[0])
+    for cg in changed.conn_genes.values():
+        cg.weight *= 0.5
+    ties.append((genomes[0], changed))
+
+    assert any(genome.distance(other) != other.distance(genome) for genome, other in ties)
+    for genome, other in ties:
+        assert_same_distances(genome, other)
+
+
+def test_distances_to_a_genome_without_connections(genomes):
+    empty = copy.deepcopy(genomes[0])
+    empty.conn_genes = {}
+    other_empty = copy.deepcopy(genomes[1])
+    other_empty.conn_genes = {}
+
+    assert_same_distances(empty, other_empty)
+    for genome in genomes[:10]:
+        assert_same_distances(empty, genome)
+
+
+def test_distances_of_disjoint_innovation_ranges(genomes):
+    genome = max(genomes, key=lambda g: len(g.conn_genes))
+    genes = sorted(genome.conn_genes.values(), key=lambda cg: cg.innovation_id)
+    old = copy.deepcopy(genome)
+    new = copy.deepcopy(genome)
+    old.conn_genes = dict((cg.key, cg) for cg in copy.deepcopy(genes[:len(genes) // 2]))
+    new.conn_genes = dict((cg.key, cg) for cg in copy.deepcopy(genes[len(genes) // 2:]))
+    assert max(cg.innovation_id for cg in old.conn_genes.values()) < min(cg.innovation_id for cg in new.conn_genes.values())
+
+    assert_same_distances(old, new)
+    for other in genomes[:10]:
+        assert_same_distances(old, other)
+        assert_same_distances(new, other)
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from neatsociety.parallel import ParallelEvaluator
+
+
+class Genome(object):
+    def __init__(self, ID, delay):
+        self.ID = ID
+        self.delay = delay
+        self.fitness = None
+
+
+def sleep_then_score(genome):
+    # a broad except must not swallow the per-genome timeout
+    try:
+        time.sleep(genome.delay)
+    except Exception:
+        pass
+    return float(genome.ID)
+
+
+@pytest.fixture
+def genomes():
+    # genomes 2 and 5 hang
+    return [Genome(i, 30.0 if i in (2, 5) else 0.01) for i in range(8)]
+
+
+def test_genome_timeout(genomes):
+    evaluator = ParallelEvaluator(sleep_then_score, num_workers=2, genome_timeout=0.5, timeout_fitness=-1.0,
+                                  chunksize=3)
+    start = time.time()
+    evaluator.evaluate(genomes)
+    evaluator.close()
+
+    assert time.time() - start < 10
+    assert [g.fitness for g in genomes] == [0.0, 1.0, -1.0, 3.0, 4.0, -1.0, 6.0, 7.0]
+
+
+def test_generation_timeout(genomes):
+    evaluator = ParallelEvaluator(sleep_then_score, num_workers=2, timeout=1.0, timeout_fitness=-1.0)
+    start = time.time()
+    evaluator.evaluate(genomes)
+
+    # the workers stuck on the hanging genomes are killed
+    assert time.time() - start < 10
+    assert genomes[2].fitness == -1.0 and genomes[5].fitness == -1.0
+    assert all(g.fitness in (float(g.ID), -1.0) for g in genomes)
+
+    # and replaced by new ones
+    others = [Genome(i, 0.01) for i in range(4)]
+    evaluator.evaluate(others)
+    evaluator.close()
+    assert [g.fitness for g in others] == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_timeout_without_fitness_raises(genomes):
+    evaluator = ParallelEvaluator(sleep_then_score, num_workers=2, genome_timeout=0.5)
+    with pytest.raises(Exception, match='timed out'):
+        evaluator.evaluate(genomes)
+    evaluator.close()
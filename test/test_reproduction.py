@@ -0,0 +1,93 @@
+import pytest
+
+from neatsociety.population import Population
+
+SECTIONS = {'seed': 'genetic', 'pop_size': 'genetic', 'init_pop_size': 'genetic', 'workers': 'DefaultReproduction',
+            'distance_matrix': 'genotype compatibility'}
+
+
+@pytest.fixture
+def quiet_config(make_config):
+    def make(**overrides):
+        config = make_config(SECTIONS, **overrides)
+        config.report = False
+        return config
+
+    return make
+
+
+def evaluate(genomes):
+    # deterministic, and different for most genomes
+    for g in genomes:
+        g.fitness = (g.ID * 7919 % 1000) / 1000.0 + len(g.conn_genes)
+
+
+def population_state(pop):
+    return [(g.ID, g.species_id,
+             sorted((key, cg.innovation_id, cg.weight, cg.enabled) for key, cg in g.conn_genes.items()),
+             sorted((ng.ID, ng.bias, ng.response, ng.activation_type) for ng in g.node_genes.values()))
+            for s in pop.species for g in s.members]
+
+
+def run(config, generations):
+    pop = Population(config)
+    try:
+        pop.run(evaluate, generations)
+    finally:
+        pop.close()
+    return pop
+
+
+def test_parallel_reproduction_matches_the_serial_one(quiet_config):
+    serial = run(quiet_config(seed=11, pop_size=120, init_pop_size=120), 5)
+    parallel = run(quiet_config(seed=11, pop_size=120, init_pop_size=120, workers=2), 5)
+
+    assert population_state(parallel) == population_state(serial)
+    assert parallel.innovation_indexer.innovations == serial.innovation_indexer.innovations
+
+
+def test_provisional_innovations_are_renumbered(quiet_config):
+    pop = run(quiet_config(seed=5, pop_size=120, init_pop_size=120, workers=2), 5)
+
+    # the connections added in the workers got the number of the indexer, and the same connection the same number
+    innovations = pop.innovation_indexer.innovations
+    genes = [cg for s in pop.species for g in s.members for cg in g.conn_genes.values()]
+    assert len(set(cg.innovation_id for cg in genes)) > len(pop.species[0].members[0].conn_genes)
+    for cg in genes:
+        assert cg.innovation_id == innovations[cg.in_node_id, cg.out_node_id]
+
+
+def test_close_stops_the_reproduction_workers(quiet_config):
+    pop = Population(quiet_config(pop_size=60, init_pop_size=60, workers=2))
+    pop.run(evaluate, 2)
+    processes = list(pop.reproduction.pool._pool)
+    assert processes
+
+    pop.close()
+    assert pop.reproduction.pool is None
+    assert not any(p.is_alive() for p in processes)
+
+
+@pytest.mark.parametrize('overrides', [dict(workers=2), dict(distance_matrix=1), dict(workers=2, distance_matrix=1)])
+def test_seeded_runs_do_not_depend_on_the_parallelism(quiet_config, overrides):
+    expected = run(quiet_config(seed=11, pop_size=120, init_pop_size=120), 5)
+    pop = run(quiet_config(seed=11, pop_size=120, init_pop_size=120, **overrides), 5)
+    assert population_state(pop) == population_state(expected)
+
+
+def test_resumed_runs_match_uninterrupted_ones(quiet_config, tmp_path):
+    config = quiet_config(seed=11, pop_size=120, init_pop_size=120)
+    expected = run(config, 6)
+
+    checkpoint = str(tmp_path / 'checkpoint')
+    pop = run(config, 3)
+    pop.save_checkpoint(checkpoint)
+
+    # the new population is created (drawing random numbers and IDs) before the checkpoint is loaded
+    resumed = Population(config)
+    resumed.load_checkpoint(checkpoint)
+    resumed.run(evaluate, 3)
+
+    assert population_state(resumed) == population_state(expected)
+    assert resumed.genome_indexer.next_id == expected.genome_indexer.next_id
+    assert resumed.innovation_indexer.innovations == expected.innovation_indexer.innovations
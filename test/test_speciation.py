@@ -0,0 +1,51 @@
+import multiprocessing
+
+import pytest
+
+from neatsociety.benchmark import create_genomes
+from neatsociety.indexer import Indexer
+from neatsociety.population import Population
+from neatsociety.species import Species
+from neatsociety.speciation import speciate
+
+SECTIONS = {'packed_distance': 'genotype compatibility'}
+
+
+def initial_species(genomes, count):
+    species = [Species(g, i + 1) for i, g in enumerate(genomes[:count])]
+    for s in species:
+        s.members = []
+    return species
+
+
+def memberships(species):
+    return [(s.ID, [m.ID for m in s.members]) for s in species]
+
+
+@pytest.mark.parametrize('packed_distance', [0, 1])
+@pytest.mark.parametrize('workers', [0, 2])
+def test_speciate_matches_the_pairwise_loop(make_config, packed_distance, workers):
+    config = make_config(SECTIONS, packed_distance=packed_distance)
+    genomes = create_genomes(config, 150, seed=3)
+    population = genomes[5:]
+
+    pairwise = Population(config)
+    pairwise.species = initial_species(genomes, 5)
+    pairwise.species_indexer = Indexer(6)
+    pairwise._speciate_pairwise(population)
+    expected = memberships(pairwise.species)
+
+    species = initial_species(genomes, 5)
+    pool = multiprocessing.Pool(workers) if workers else None
+    try:
+        speciate(population, species, config, Indexer(6), pool)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    # some genomes join the initial species and others found new ones, which the following genomes join
+    assert len(expected) > 5
+    assert any(s.members for s in pairwise.species[:5])
+    assert any(len(s.members) > 1 for s in pairwise.species[5:])
+    assert memberships(species) == expected
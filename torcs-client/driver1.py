@@ -11,8 +11,8 @@ sys.path.insert(0, '../')
 
 
 class Driver1(MyDriver):
-    def __init__(self, parameters_file=None, out_file=None, unstuck=True):
-        super(Driver1, self).__init__(parameters_file, out_file, unstuck)
+    def __init__(self, parameters_file=None, out_file=None, unstuck=True, handoff_socket=None, net=None, early_stop=None):
+        super(Driver1, self).__init__(parameters_file, out_file, unstuck, handoff_socket, net, early_stop)
         
     def drive(self, carstate: State) -> Command:
             
@@ -68,6 +68,8 @@ class Driver1(MyDriver):
         
         
         
+        self.request_stop(command)
+        
         if self.data_logger:
             self.data_logger.log(carstate, command)
         
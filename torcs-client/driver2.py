@@ -11,8 +11,8 @@ sys.path.insert(0, '../')
 
 
 class Driver2(MyDriver):
-    def __init__(self, parameters_file=None, out_file=None, unstuck=True):
-        super(Driver2, self).__init__(parameters_file, out_file, unstuck)
+    def __init__(self, parameters_file=None, out_file=None, unstuck=True, handoff_socket=None, net=None, early_stop=None):
+        super(Driver2, self).__init__(parameters_file, out_file, unstuck, handoff_socket, net, early_stop)
         
     def drive(self, carstate: State) -> Command:
     
@@ -67,6 +67,8 @@ class Driver2(MyDriver):
             self.saveResults()
             raise
         
+        self.request_stop(command)
+        
         if self.data_logger:
             self.data_logger.log(carstate, command)
         
@@ -0,0 +1,101 @@
+"""
+Early termination of the races which can no longer reach a fitness threshold.
+
+While the race goes on, EarlyStop computes the most optimistic results the driver could still reach by the
+time limit (full speed for the remaining time, no more damage nor offroad penalty) and the fitness of these
+results, with the same formula used by the evolution (nn_evolve.compute_fitness with a time limit, and the
+fitness function of the experiment). When this upper bound falls below the threshold supplied by the parent
+(e.g. the fitness of the worst elite of the genome's species), the race is hopeless and can be stopped.
+
+The bound assumes the fitness function does not decrease with the distance, the laps and the average speed,
+and does not increase with the damage and the penalty.
+"""
+import importlib.util
+import math
+import os.path
+
+
+def default_fitness(duration, distance, laps, distance_from_start, damage, penalty, avg_speed):
+    """Fitness of a result row when there is no fitness function.
+
+    nn_evolve.compute_fitness imports it, so that the bound of the early
+    stop always uses the formula of the evolution.
+    """
+    #fitness = distance - 0.08*damage - 200*penalty
+    #fitness = avg_speed * duration - 0.08 * damage - 200 * penalty
+    fitness = avg_speed * duration - 0.2 * damage - 300 * penalty
+    if laps >= 2:
+        fitness += 50.0 * avg_speed
+    return fitness
+
+
+def load_fitness_function(path):
+    """Returns the evaluate function of a fitness file (as nn_evolve does)."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.evaluate
+
+
+class EarlyStop:
+    """Stop policy of a race: the race is hopeless when the fitness bound is below the threshold.
+
+    Attributes:
+        threshold: Fitness the race has to be able to reach.
+        timelimit: Duration of the race used for the fitness, s.
+        fitness_function: Function of the result row (default_fitness if None).
+        max_speed: Highest average speed the car could keep, m/s.
+        tick: Duration of a server time step, s.
+    """
+
+    def __init__(self, threshold, timelimit, fitness_function=None,
+                 max_speed=90.0, tick=0.02):
+        self.threshold = threshold
+        self.timelimit = timelimit
+        self.fitness_function = fitness_function or default_fitness
+        self.max_speed = max_speed
+        self.tick = tick
+        # the track is at least as long as the farthest distance from start
+        self.track_length = 0.0
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Creates the policy of a (threshold, timelimit, fitness file) spec."""
+        threshold, timelimit, fitness_path = spec
+        fitness_function = None
+        if fitness_path is not None:
+            fitness_function = load_fitness_function(fitness_path)
+        return cls(threshold, timelimit, fitness_function)
+
+    def optimistic_results(self, driver):
+        """Best result row the driver of a MyDriver can reach by the time limit."""
+        iterations = driver.iterations_count
+        duration = driver.time + driver.curr_time
+        self.track_length = max(self.track_length, driver.distance_from_start)
+
+        remaining = max(self.timelimit - duration, 0.0)
+        total_iterations = iterations + remaining / self.tick
+        reachable = self.max_speed * remaining
+        laps = driver.laps + 1 + math.ceil(
+            reachable / max(self.track_length, 1.0))
+
+        return [
+            self.timelimit,
+            driver.distance + reachable,
+            laps,
+            driver.distance_from_start,
+            driver.damage,
+            math.sqrt(driver.offroad_penalty / total_iterations),
+            (driver.avg_speed + self.max_speed * remaining / self.tick)
+            / total_iterations
+        ]
+
+    def upper_bound(self, driver):
+        return self.fitness_function(*self.optimistic_results(driver))
+
+    def __call__(self, driver):
+        """Whether the race of the driver can be stopped."""
+        if driver.iterations_count == 0:
+            return False
+        return self.upper_bound(driver) < self.threshold
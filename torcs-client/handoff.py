@@ -0,0 +1,125 @@
+"""
+In-memory handoff between the evolution process and a driver client, over an inherited Unix socket.
+
+The parent sends the pickled network and the client sends back its result rows, so that no model or
+results file has to go through the disk. Every message is a frame made of a 4 bytes big-endian length
+followed by the payload. Result frames hold two unsigned ints (number of rows and columns) followed by
+the rows as big-endian float64 values.
+
+A persistent client (worker) instead receives jobs, i.e. pickled (network, port, unstuck, early stop) tuples, and
+answers each of them with its result frames followed by an empty frame marking the end of the job.
+"""
+import pickle
+import select
+import socket
+import struct
+import time
+
+_LENGTH = struct.Struct('!I')
+_SHAPE = struct.Struct('!II')
+
+
+def send_frame(sock, payload):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    """Returns the payload of the next frame, or None if the other end has been closed."""
+    header = _recv_exactly(sock, _LENGTH.size)
+    if header is None:
+        return None
+    return _recv_exactly(sock, _LENGTH.unpack(header)[0])
+
+
+def send_model(sock, net):
+    send_frame(sock, pickle.dumps(net, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def recv_model(sock):
+    payload = recv_frame(sock)
+    if payload is None:
+        raise EOFError('Connection closed before receiving the model.')
+    return pickle.loads(payload)
+
+
+def send_results(sock, rows):
+    columns = len(rows[0]) if rows else 0
+    values = [float(v) for r in rows for v in r]
+    send_frame(sock, _SHAPE.pack(len(rows), columns) + struct.pack('!{}d'.format(len(values)), *values))
+
+
+def _parse_results(payload):
+    num_rows, columns = _SHAPE.unpack_from(payload)
+    values = struct.unpack_from('!{}d'.format(num_rows * columns), payload, _SHAPE.size)
+    return [list(values[i * columns:(i + 1) * columns]) for i in range(num_rows)]
+
+
+def recv_results(sock):
+    """
+    Reads result frames until the other end is closed and returns the rows of the last one
+    (the client may save its results more than once), or None if no results were received.
+    """
+    rows = None
+    while True:
+        payload = recv_frame(sock)
+        if payload is None:
+            return rows
+
+        rows = _parse_results(payload)
+
+
+def send_job(sock, net, port, unstuck, early_stop=None):
+    send_frame(sock, pickle.dumps((net, port, unstuck, early_stop), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def recv_job(sock):
+    """Returns the next (network, port, unstuck, early stop) job, or None if the other end has been closed."""
+    payload = recv_frame(sock)
+    if payload is None:
+        return None
+    return pickle.loads(payload)
+
+
+def send_done(sock):
+    send_frame(sock, b'')
+
+
+def recv_job_results(sock, timeout):
+    """
+    Reads the result frames of the current job until its end, for at most timeout seconds.
+    Returns the rows of the last result frame (None if there was none) and the reason the
+    reading stopped: 'done', 'timeout' or 'closed'.
+    """
+    rows = None
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            return rows, 'timeout'
+
+        try:
+            payload = recv_frame(sock)
+        except OSError:
+            payload = None
+        if payload is None:
+            return rows, 'closed'
+        if not payload:
+            return rows, 'done'
+
+        rows = _parse_results(payload)
+
+
+def from_fd(fd):
+    """Wraps an inherited socket file descriptor."""
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, fileno=fd)
@@ -1,8 +1,11 @@
 from pytocl.driver import Driver
 from pytocl.car import State, Command
 from model import *
+import handoff
+from early_stop import EarlyStop
 import pickle
 import math
+import signal
 import time as tm
 import sys
 from abc import ABC, abstractmethod
@@ -12,15 +15,38 @@ sys.path.insert(0, '../')
 
 class MyDriver(Driver, ABC):
     
-    def __init__(self, parameters_file=None, out_file=None, unstuck=True):
+    def __init__(self, parameters_file=None, out_file=None, unstuck=True, handoff_socket=None, net=None, early_stop=None):
         super(MyDriver, self).__init__(logdata=False)
         
-        with open(parameters_file, 'rb') as f:
-            self.net = pickle.load(f)
-            self.net.reset()
+        # if a handoff socket is given, the model is received and the results are sent back through it
+        self.handoff_socket = handoff_socket
+        
+        if net is None:
+            if handoff_socket is not None:
+                net = handoff.recv_model(handoff_socket)
+            else:
+                with open(parameters_file, 'rb') as f:
+                    net = pickle.load(f)
             
         self.out_file = out_file
         
+        self.start_race(net, unstuck, early_stop)
+        
+        print('Driver initialization completed')
+    
+    def start_race(self, net, unstuck, early_stop=None):
+        """
+        Prepares the driver for a new race with the given network, resetting all the race counters.
+        early_stop is the (threshold, timelimit, fitness file) spec of an EarlyStop policy, or None.
+        """
+        
+        self.early_stop = EarlyStop.from_spec(early_stop) if early_stop is not None else None
+        #set when the race became hopeless: the driver then asks the server to stop it
+        self.stop_requested = False
+        
+        self.net = net
+        self.net.reset()
+        
         self.last_lap_time = 0
         self.curr_time = -10.0
         self.time = 0.0
@@ -35,12 +61,11 @@ class MyDriver(Driver, ABC):
         
         self.stopped = False
         self.projected_speed = 0
+        self.stuck_count = 0
         self.unstuck = unstuck
         
         
         self.results = []
-        
-        print('Driver initialization completed')
     
     @abstractmethod
     def drive(self, carstate: State):
@@ -95,12 +120,20 @@ class MyDriver(Driver, ABC):
         command.steering = left - right
     
     def saveResults(self):
-        if self.out_file is not None:
-            with open(self.out_file, 'w') as f:
-                for r in self.results:
-                    # f.write("{}: {}, {}".format(self.name, self.distance, self.curr_time))
-                    f.write("{}, {}, {}, {}, {}, {}, {}\n".format(*r))
-                f.close()
+        # the SIGTERM/SIGINT handler of run.py saves the results too: it must not write its frame (or file)
+        # in the middle of this one, so the signals are blocked until the save is complete, then handled
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, (signal.SIGTERM, signal.SIGINT))
+        try:
+            if self.handoff_socket is not None:
+                handoff.send_results(self.handoff_socket, self.results)
+            elif self.out_file is not None:
+                with open(self.out_file, 'w') as f:
+                    for r in self.results:
+                        # f.write("{}: {}, {}".format(self.name, self.distance, self.curr_time))
+                        f.write("{}, {}, {}, {}, {}, {}, {}\n".format(*r))
+                    f.close()
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
                 
     
     def on_shutdown(self):
@@ -151,6 +184,20 @@ class MyDriver(Driver, ABC):
         
         if self.iterations_count % 100 == 0:
             self.append_current_results()
+            
+            if self.early_stop is not None and not self.stop_requested and self.early_stop(self):
+                print('Fitness bound below', self.early_stop.threshold, ': stopping the race')
+                self.stop_requested = True
+    
+    def request_stop(self, command):
+        """ Asks the server to stop (restart) the race, if it became hopeless """
+        if self.stop_requested:
+            command.meta = 1
+    
+    def on_restart(self):
+        """ The race restarted after our request: stop the client, as if the server shut down """
+        print('Client Restart')
+        return self.stop_requested
     
     def append_current_results(self):
         self.results.append([
@@ -33,6 +33,10 @@ class DataLogWriter:
     def log(self, state, command):
         """Log pair of data."""
         if self.logging:
+            # the client passes the same state object (and sensor array) on
+            # every tick: without clearing the memo, the pickler would only
+            # write a reference to the first snapshot
+            self.pickler.clear_memo()
             self.pickler.dump((state, command))
             self.numlogged += 1
         else:
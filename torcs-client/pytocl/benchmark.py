@@ -0,0 +1,55 @@
+"""Microbenchmark of the per-tick protocol cost: decoding a sensor packet and
+encoding the command sent back.
+
+Run with ``python -m pytocl.benchmark``.
+"""
+import logging
+import timeit
+
+from pytocl.car import State as CarState, Command
+from pytocl.protocol import Serializer, SensorDecoder
+
+# packet as sent by the server (opponents and track sensors shortened to
+# constant values):
+SENSOR_PACKET = b'(angle 0.008838)(curLapTime 4.052)(damage 0)' \
+                b'(distFromStart 1015.56)(distRaced 42.6238)(fuel 93.9356)' \
+                b'(gear 3)(lastLapTime 0)(opponents' + b' 200' * 36 + b')' \
+                b'(racePos 1)(rpm 4509.31)(speedX 81.5135)(speedY 0.40771)' \
+                b'(speedZ -2.4422)(track' + b' 12.3456' * 19 + b')' \
+                b'(trackPos 0.126012)(wheelSpinVel 67.9393 68.8267 71.4009 71.7363)' \
+                b'(z 0.336726)(focus 26.0077 27.9798 30.2855 33.0162 36.3006)\x00'
+
+
+def benchmark(number=20000, repeat=5):
+    """Returns the best time per call, in microseconds, of each step."""
+    serializer = Serializer()
+    decoder = SensorDecoder()
+    carstate = CarState(sensors=decoder.decode(SENSOR_PACKET))
+    command = Command()
+    command.accelerator = 0.75
+    command.steering = -0.125
+    command.gear = 3
+
+    steps = {
+        'decode (dict + State)':
+            lambda: CarState(serializer.decode(SENSOR_PACKET)),
+        'decode (SensorDecoder)':
+            lambda: decoder.decode(SENSOR_PACKET),
+        'State.to_input_array':
+            lambda: carstate.to_input_array(),
+        'encode (actuator_dict)':
+            lambda: serializer.encode(command.actuator_dict),
+        'encode (template)':
+            lambda: serializer.encode_command(command),
+    }
+
+    return {
+        name: min(timeit.repeat(step, number=number, repeat=repeat)) / number * 1e6
+        for name, step in steps.items()
+    }
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    for name, microseconds in benchmark().items():
+        print('{:<25}{:8.2f} us'.format(name, microseconds))
@@ -1,7 +1,6 @@
 import logging
 import math
-from collections import Iterable
-from functools import partialmethod
+from collections.abc import Iterable
 import numpy as np
 
 _logger = logging.getLogger(__name__)
@@ -9,10 +8,77 @@ _logger = logging.getLogger(__name__)
 DEGREE_PER_RADIANS = 180 / math.pi
 MPS_PER_KMH = 1000 / 3600
 
+# fields of the sensor packet, in the order sent by the server, with their
+# number of values:
+SENSOR_LAYOUT = (
+    ('angle', 1),
+    ('curLapTime', 1),
+    ('damage', 1),
+    ('distFromStart', 1),
+    ('distRaced', 1),
+    ('fuel', 1),
+    ('gear', 1),
+    ('lastLapTime', 1),
+    ('opponents', 36),
+    ('racePos', 1),
+    ('rpm', 1),
+    ('speedX', 1),
+    ('speedY', 1),
+    ('speedZ', 1),
+    ('track', 19),
+    ('trackPos', 1),
+    ('wheelSpinVel', 4),
+    ('z', 1),
+    ('focus', 5),
+)
+
+
+def sensor_offsets(layout):
+    """Returns the array slice of each key of the layout and the total size."""
+    offsets = {}
+    position = 0
+    for key, size in layout:
+        offsets[key] = slice(position, position + size)
+        position += size
+    return offsets, position
+
+
+SENSOR_OFFSETS, SENSOR_SIZE = sensor_offsets(SENSOR_LAYOUT)
+
+
+def fill_sensors(sensor_dict, sensors, layout=SENSOR_LAYOUT):
+    """
+    Stores the values of a sensor dictionary (in string form) at their offsets
+    in the sensors array. Missing or invalid values are set to NaN.
+    """
+    offsets, _ = sensor_offsets(layout)
+    sensors.fill(np.nan)
+    for key, size in layout:
+        value = sensor_dict.get(key)
+        if value is None:
+            _logger.warning(
+                'Expected sensor value {!r} not found.'.format(key)
+            )
+            continue
+
+        if isinstance(value, str):
+            value = [value]
+        try:
+            if len(value) != size:
+                raise ValueError('{} values instead of {}'.format(len(value), size))
+            sensors[offsets[key]] = [float(v) for v in value]
+        except ValueError as ex:
+            _logger.warning(
+                'Invalid sensor value {!r} ({}).'.format(key, ex)
+            )
+    return sensors
+
 
 class Value:
     """Base class for value objects."""
 
+    __slots__ = ()
+
     def __str__(self):
         return '\n'.join(
             '{}: {}'.format(k, v) for k, v in self.__dict__.items()
@@ -28,14 +94,54 @@ class Value:
                 yield value
 
 
+def _sensor_property(key, scale=1.0, converter=float, doc=None):
+    """
+    Property reading (and writing) the value(s) of a sensor in the state array,
+    converted to the units of the State attribute. NaN values read as None.
+    """
+    index = SENSOR_OFFSETS[key]
+
+    if index.stop - index.start == 1:
+        index = index.start
+
+        def getter(self):
+            value = self.sensors[index]
+            if value != value:
+                return None
+            return converter(value * scale)
+
+        def setter(self, value):
+            self.sensors[index] = np.nan if value is None else value / scale
+
+    else:
+        def getter(self):
+            values = self.sensors[index]
+            if np.isnan(values).any():
+                return None
+            if scale != 1.0:
+                values = values * scale
+            return tuple(values.tolist())
+
+        def setter(self, values):
+            if values is None:
+                self.sensors[index] = np.nan
+            else:
+                self.sensors[index] = np.asarray(values, dtype=float) / scale
+
+    return property(getter, setter, doc=doc)
+
+
 class State(Value):
     """State of car and environment, sent periodically by racing server.
 
-    Update the state's dictionary and use properties to access the various
-    sensor values. Value ``None`` means the sensor value is invalid or unset.
+    The sensor values are stored, in the units sent by the server, in a float64
+    array (see SENSOR_LAYOUT and SENSOR_OFFSETS) and the properties below
+    convert them. Value ``None`` means the sensor value is invalid or unset.
+    The client reuses the same State (and array) for every message: copy it to
+    keep the values of a past tick.
 
     Attributes:
-        sensor_dict: Dictionary of sensor key value pairs in string form.
+        sensors: Array of the raw sensor values.
         angle: Angle between car direction and track axis, [-180;180], deg.
         current_lap_time: Time spent in current lap, [0;inf[, s.
         damage: Damage points, 0 means no damage, [0;inf[, points.
@@ -66,41 +172,70 @@ class State(Value):
         z: Distance of car center of mass to track surface, ]-inf;inf[, m.
     """
 
-    def __init__(self, sensor_dict):
-        """Creates decoded car state from sensor value dictionary."""
-        self.angle = self.float_value(sensor_dict, 'angle') * \
-            DEGREE_PER_RADIANS
-        self.current_lap_time = self.float_value(sensor_dict, 'curLapTime')
-        self.damage = self.int_value(sensor_dict, 'damage')
-        self.distance_from_start = self.float_value(
-            sensor_dict,
-            'distFromStart'
-        )
-        self.distance_raced = self.float_value(sensor_dict, 'distRaced')
-        self.fuel = self.float_value(sensor_dict, 'fuel')
-        self.gear = self.int_value(sensor_dict, 'gear')
-        self.last_lap_time = self.float_value(sensor_dict, 'lastLapTime')
-        self.opponents = self.floats_value(sensor_dict, 'opponents')
-        self.race_position = self.int_value(sensor_dict, 'racePos')
-        self.rpm = self.float_value(sensor_dict, 'rpm')
-        self.speed_x = self.float_value(sensor_dict, 'speedX') * MPS_PER_KMH
-        self.speed_y = self.float_value(sensor_dict, 'speedY') * MPS_PER_KMH
-        self.speed_z = self.float_value(sensor_dict, 'speedZ') * MPS_PER_KMH
-        self.distances_from_edge = self.floats_value(sensor_dict, 'track')
-        self.distance_from_center = self.float_value(sensor_dict, 'trackPos')
-        self.wheel_velocities = tuple(
-            v * DEGREE_PER_RADIANS for v in self.floats_value(
-                sensor_dict,
-                'wheelSpinVel'
-            )
-        )
-        self.z = self.float_value(sensor_dict, 'z')
+    __slots__ = ('sensors', '_inputs')
+
+    attributes = ('angle', 'current_lap_time', 'damage', 'distance_from_start',
+                  'distance_raced', 'fuel', 'gear', 'last_lap_time',
+                  'opponents', 'race_position', 'rpm', 'speed_x', 'speed_y',
+                  'speed_z', 'distances_from_edge', 'distance_from_center',
+                  'wheel_velocities', 'z', 'focused_distances_from_edge')
+
+    angle = _sensor_property('angle', DEGREE_PER_RADIANS)
+    current_lap_time = _sensor_property('curLapTime')
+    damage = _sensor_property('damage', converter=int)
+    distance_from_start = _sensor_property('distFromStart')
+    distance_raced = _sensor_property('distRaced')
+    fuel = _sensor_property('fuel')
+    gear = _sensor_property('gear', converter=int)
+    last_lap_time = _sensor_property('lastLapTime')
+    opponents = _sensor_property('opponents')
+    race_position = _sensor_property('racePos', converter=int)
+    rpm = _sensor_property('rpm')
+    speed_x = _sensor_property('speedX', MPS_PER_KMH)
+    speed_y = _sensor_property('speedY', MPS_PER_KMH)
+    speed_z = _sensor_property('speedZ', MPS_PER_KMH)
+    distances_from_edge = _sensor_property('track')
+    distance_from_center = _sensor_property('trackPos')
+    wheel_velocities = _sensor_property('wheelSpinVel', DEGREE_PER_RADIANS)
+    z = _sensor_property('z')
+    focused_distances_from_edge = _sensor_property('focus')
+
+    def __init__(self, sensor_dict=None, sensors=None):
+        """
+        Creates decoded car state from sensor value dictionary, or on top of
+        an array of raw sensor values (e.g. filled by a SensorDecoder).
+        """
+        if sensors is None:
+            sensors = np.full(SENSOR_SIZE, np.nan)
+            if sensor_dict is not None:
+                fill_sensors(sensor_dict, sensors)
+        self.sensors = sensors
+        # input buffers of to_input_array, by size
+        self._inputs = {}
 
-        self.focused_distances_from_edge = self.floats_value(
-            sensor_dict,
-            'focus'
+    def __str__(self):
+        return '\n'.join(
+            '{}: {}'.format(k, getattr(self, k)) for k in self.attributes
         )
 
+    def __copy__(self):
+        return State(sensors=self.sensors.copy())
+
+    def __getstate__(self):
+        return self.sensors
+
+    def __setstate__(self, sensors):
+        self._inputs = {}
+        if isinstance(sensors, dict):
+            # attributes of a State pickled before it was array-backed (e.g.
+            # in old drive logs)
+            attributes = sensors
+            self.sensors = np.full(SENSOR_SIZE, np.nan)
+            for name in self.attributes:
+                setattr(self, name, attributes.get(name))
+        else:
+            self.sensors = sensors
+
     @property
     def distances_from_egde_valid(self):
         """Flag whether regular distances are currently valid."""
@@ -111,89 +246,59 @@ class State(Value):
         """Flag whether focus distances are currently valid."""
         return -1 not in self.focused_distances_from_edge
 
-    # def to_input_array(self):
-    #
-    #     array = []
-    #
-    #     array.append(self.speed_x)
-    #
-    #     array.append(self.distance_from_center)
-    #
-    #     array.append(self.angle)
-    #
-    #     for j in range(19):
-    #         array.append(self.distances_from_edge[j])
-    #
-    #     return np.array(array)/200
-    
-    def to_input_array(self, smaller=False):
-
-        array = []
-
-        # self.current_lap_time
-        # array.append(self.distance_from_start)
-        # array.append(self.distance_raced)
-        # array.append(self.fuel)
-        # gear = np.sign(self.gear)
-        # for g in range(-1, 2):
-        #     if g == gear:
-        #         array.append(1)
-        #     else:
-        #         array.append(0)
-        # array.append(np.sign(self.gear))
-        # self.last_lap_time
-        # for j in range(36):
-        #     array.append(self.opponents[j]/200.0)
-        # self.race_position
-        # array.append((self.rpm - 2000.0)/5000.0)
-
-        array.append(self.angle / 180.0)
-
-        # TODO - TO ADD BACK IF USING THE CIRCUIT MODEL
-        # array.append(self.damage/10000.0)
-
-        array.append(self.speed_x / 40.0)
-        array.append(self.speed_y / 40.0)
-
-        for j in range(0, 19, 3 if smaller else 1):
-            if math.fabs(self.distance_from_center) > 1 or self.distances_from_edge[j] < 0:
-                array.append(-1)
-            else:
-                array.append(self.distances_from_edge[j] / 200.0)
+    def to_input_array(self, smaller=False, out=None):
+        """
+        Fills the normalized network inputs: angle, speeds along x and y, the
+        range finders (one every three if smaller; -1 when invalid or off
+        track), the distance from the track center, z and the speed along z.
+
+        The values are written in place into out or, by default, into a buffer
+        owned by the state, which is overwritten by the next call.
+        """
+        edges_step = 3 if smaller else 1
+        buffers = self._inputs.get(edges_step)
+        if buffers is None or buffers[0] is not self.sensors:
+            # views on the sensors and on the input buffer, reused by every call
+            num_edges = len(range(0, 19, edges_step))
+            inputs = np.empty(num_edges + 6)
+            buffers = self._inputs[edges_step] = (
+                self.sensors,
+                self.sensors[_TRACK][::edges_step],
+                inputs,
+                inputs[3:3 + num_edges],
+                np.empty(num_edges, dtype=bool)
+            )
+        s, edges, inputs, edges_inputs, invalid = buffers
+        if out is not None:
+            inputs, edges_inputs = out, out[3:3 + len(edges)]
 
-        array.append(self.distance_from_center)
+        distance_from_center = s.item(_TRACK_POS)
+        inputs[0] = s.item(_ANGLE) * DEGREE_PER_RADIANS / 180.0
+        inputs[1] = s.item(_SPEED_X) * MPS_PER_KMH / 40.0
+        inputs[2] = s.item(_SPEED_Y) * MPS_PER_KMH / 40.0
 
-        # TODO - TO REMOVE FOR THE CIRCUIT MODEL
-        # for j in range(4):
-        #     array.append(self.wheel_velocities[j] / 3000.0)  # /150.0
-        array.append(self.z-0.36)
-        array.append(self.speed_z / 10.0)
+        if math.fabs(distance_from_center) > 1:
+            edges_inputs.fill(-1)
+        else:
+            np.divide(edges, 200.0, out=edges_inputs)
+            np.less(edges, 0, out=invalid)
+            if invalid.any():
+                edges_inputs[invalid] = -1
 
+        inputs[-3] = distance_from_center
+        inputs[-2] = s.item(_Z) - 0.36
+        inputs[-1] = s.item(_SPEED_Z) * MPS_PER_KMH / 10.0
 
-        # TODO - deal with problem that those values are reliable only once every second
-        # for i in range(5):
-        #     array.append(self.focused_distances_from_edge[i]/200.0)
+        return inputs
 
-        return np.array(array)
-        
-    
-    
-    @staticmethod
-    def converted_value(sensor_dict, key, converter):
-        try:
-            return converter(sensor_dict[key])
-        except (ValueError, KeyError):
-            _logger.warning(
-                'Expected sensor value {!r} not found.'.format(key)
-            )
-            return None
 
-    float_value = partialmethod(converted_value, converter=float)
-    floats_value = partialmethod(
-        converted_value,
-        converter=lambda l: tuple(float(v) for v in l)
-    )
-    int_value = partialmethod(converted_value, converter=int)
+_ANGLE = SENSOR_OFFSETS['angle'].start
+_SPEED_X = SENSOR_OFFSETS['speedX'].start
+_SPEED_Y = SENSOR_OFFSETS['speedY'].start
+_SPEED_Z = SENSOR_OFFSETS['speedZ'].start
+_TRACK = SENSOR_OFFSETS['track']
+_TRACK_POS = SENSOR_OFFSETS['trackPos'].start
+_Z = SENSOR_OFFSETS['z'].start
 
 
 class Command(Value):
@@ -209,6 +314,7 @@ class Command(Value):
             rotation of 21 degrees.
         focus: Direction of driver's focus, resulting in corresponding
             ``State.focused_distances_from_edge``, [-90;90], deg.
+        meta: 1 asks the server to restart the race, 0 otherwise.
     """
 
     def __init__(self):
@@ -217,6 +323,7 @@ class Command(Value):
         self.gear = 0
         self.steering = 0.0
         self.focus = 0.0
+        self.meta = 0
 
     @property
     def actuator_dict(self):
@@ -227,5 +334,5 @@ class Command(Value):
             steer=[self.steering],
             clutch=[0],  # server car does not need clutch control?
             focus=[self.focus],
-            meta=[0]  # no support for server restart via meta=1
+            meta=[self.meta]
         )
@@ -53,6 +53,14 @@ class Driver:
             self.data_logger.close()
             self.data_logger = None
 
+    def on_restart(self):
+        """
+        Server restarted the race (e.g. after a command with ``meta`` 1).
+
+        Returns whether the client should stop instead of racing again.
+        """
+        return False
+
     def drive(self, carstate: State) -> Command:
         """
         Produces driving command in response to newly received car state.
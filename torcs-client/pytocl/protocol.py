@@ -1,8 +1,12 @@
+import asyncio
 import enum
 import logging
+import operator
 import socket
 
-from pytocl.car import State as CarState
+import numpy as np
+
+from pytocl.car import State as CarState, SENSOR_LAYOUT, sensor_offsets, fill_sensors
 from pytocl.driver import Driver
 
 #logging.basicConfig(level=3)
@@ -17,6 +21,9 @@ MSG_RESTART = b'***restart***'
 TO_SOCKET_SEC = 1
 TO_SOCKET_MSEC = TO_SOCKET_SEC * 1000
 
+# command packet, in the same format as Serializer.encode(Command().actuator_dict):
+COMMAND_TEMPLATE = '(accel {})(brake {})(gear {})(steer {})(clutch 0)(focus {})(meta {})'
+
 
 class Client:
     """Client for TORCS racing car simulation with SCRC network server.
@@ -37,6 +44,9 @@ class Client:
         self.serializer = serializer or Serializer()
         self.state = State.STOPPED
         self.socket = None
+        # every sensor packet is decoded into the same array and state:
+        self.decoder = SensorDecoder()
+        self.carstate = CarState(sensors=self.decoder.array)
         
         if data_file is not None:
             self.data_file = open(data_file, 'a')
@@ -64,8 +74,9 @@ class Client:
                     
                 self._configure_udp_socket()
                 self._register_driver()
-                self.state = State.RUNNING
-                _logger.info('Connection successful.')
+                if self.state is State.STARTING:
+                    self.state = State.RUNNING
+                    _logger.info('Connection successful.')
 
             except socket.error as ex:
                 _logger.error('Cannot connect to server: {}'.format(ex))
@@ -83,16 +94,16 @@ class Client:
             _logger.info('Disconnecting from racing server.')
             self.state = State.STOPPING
             self.driver.on_shutdown()
+        elif self.state is State.STARTING:
+            _logger.info('Giving up connecting to racing server.')
+            self.state = State.STOPPING
 
     def _configure_udp_socket(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.settimeout(TO_SOCKET_SEC)
 
-    def _register_driver(self):
-        """
-        Sends driver's initialization data to server and waits for acceptance
-        response.
-        """
+    def _init_buffer(self):
+        """Encodes the driver's initialization data."""
 
         angles = self.driver.range_finder_angles
         assert len(angles) == 19, \
@@ -101,11 +112,19 @@ class Client:
             )
 
         data = {'init': angles}
-        buffer = self.serializer.encode(
+        return self.serializer.encode(
             data,
             prefix='SCR-{}'.format(self.hostaddr[1])
         )
 
+    def _register_driver(self):
+        """
+        Sends driver's initialization data to server and waits for acceptance
+        response.
+        """
+
+        buffer = self._init_buffer()
+
         _logger.info('Registering client.')
 
         connected = False
@@ -123,39 +142,53 @@ class Client:
             except socket.error as ex:
                 _logger.debug('No connection to server yet ({}).'.format(ex))
 
-    def _process_server_msg(self):
-        try:
-            buffer, _ = self.socket.recvfrom(TO_SOCKET_MSEC)
-            _logger.debug('Received buffer {!r}.'.format(buffer))
+    def _handle_server_msg(self, buffer):
+        """
+        Reacts to a message of the server and returns the buffer to send back,
+        if any.
+        """
+        _logger.debug('Received buffer {!r}.'.format(buffer))
 
-            if not buffer:
-                return
+        if not buffer:
+            return None
+
+        elif MSG_SHUTDOWN in buffer:
+            _logger.info('Server requested shutdown.')
+            self.stop()
 
-            elif MSG_SHUTDOWN in buffer:
-                _logger.info('Server requested shutdown.')
+        elif MSG_RESTART in buffer:
+            _logger.info('Server requested restart of driver.')
+            if self.driver.on_restart():
+                # the driver asked for the restart to end its race
                 self.stop()
 
-            elif MSG_RESTART in buffer:
-                _logger.info('Server requested restart of driver.')
-                self.driver.on_restart()
+        else:
+            self.decoder.decode(buffer)
+            carstate = self.carstate
+            _logger.debug(carstate)
+            command = self.driver.drive(carstate)
+            
+            if self.data_file is not None:
+                data_to_store = []
+                data_to_store += [command.accelerator, command.brake, command.steering]
+                data_to_store += [carstate.speed_x, carstate.distance_from_center, carstate.angle]
+                data_to_store += carstate.distances_from_edge
+                data_to_store = [str(v) for v in data_to_store]
+                self.data_file.write(', '.join(data_to_store) + '\n')
+            
+            _logger.debug(command)
+            buffer = self.serializer.encode_command(command)
+            _logger.debug('Sending buffer {!r}.'.format(buffer))
+            return buffer
 
-            else:
-                sensor_dict = self.serializer.decode(buffer)
-                carstate = CarState(sensor_dict)
-                _logger.debug(carstate)
-                command = self.driver.drive(carstate)
-                
-                if self.data_file is not None:
-                    data_to_store = []
-                    data_to_store += [command.accelerator, command.brake, command.steering]
-                    data_to_store += [carstate.speed_x, carstate.distance_from_center, carstate.angle]
-                    data_to_store += carstate.distances_from_edge
-                    data_to_store = [str(v) for v in data_to_store]
-                    self.data_file.write(', '.join(data_to_store) + '\n')
-                
-                _logger.debug(command)
-                buffer = self.serializer.encode(command.actuator_dict)
-                _logger.debug('Sending buffer {!r}.'.format(buffer))
+        return None
+
+    def _process_server_msg(self):
+        try:
+            buffer, _ = self.socket.recvfrom(TO_SOCKET_MSEC)
+
+            buffer = self._handle_server_msg(buffer)
+            if buffer is not None:
                 self.socket.sendto(buffer, self.hostaddr)
 
         except socket.error as ex:
@@ -166,6 +199,154 @@ class Client:
             self.stop()
 
 
+class AsyncClient(Client):
+    """Client running on an asyncio event loop instead of a blocking socket.
+
+    The UDP traffic is handled by a DatagramProtocol, so that a single process
+    (and event loop) can host several clients, e.g. one for each of the ten
+    SCRC ports (see run_clients).
+
+    This is only a library entry point: run.py and the evaluation farm of
+    neat/src/simulation.py still start one blocking client process per slot.
+    """
+
+    def __init__(self, hostname='localhost', port=3001, **kwargs):
+        super().__init__(hostname, port, **kwargs)
+        self.transport = None
+        self._loop = None
+        self._changed = None
+        self._error = None
+
+    def run(self):
+        """Runs the client on its own event loop, until it stops."""
+        run_clients([self])
+
+    async def run_async(self):
+        """Coroutine connecting to the server and driving until the client stops."""
+
+        if self.state is not State.STOPPED:
+            return
+
+        _logger.debug('Starting asynchronous execution.')
+
+        self._loop = asyncio.get_event_loop()
+        self._changed = asyncio.Event()
+        self.state = State.STARTING
+
+        _logger.info('Registering driver client with server {}.'
+                     .format(self.hostaddr))
+
+        try:
+            self.transport, _ = await self._loop.create_datagram_endpoint(
+                lambda: _ClientProtocol(self),
+                family=socket.AF_INET,
+                remote_addr=self.hostaddr
+            )
+        except OSError as ex:
+            _logger.error('Cannot connect to server: {}'.format(ex))
+            self.state = State.STOPPED
+            return
+
+        try:
+            buffer = self._init_buffer()
+            _logger.info('Registering client.')
+
+            while self.state is State.STARTING:
+                _logger.debug('Sending init buffer {!r}.'.format(buffer))
+                self.transport.sendto(buffer)
+                await self._wait_for_change(TO_SOCKET_SEC)
+
+            if self.state is State.RUNNING:
+                _logger.info('Connection successful.')
+
+            while self.state is State.RUNNING:
+                await self._wait_for_change()
+
+        finally:
+            self.transport.close()
+            self.transport = None
+
+        _logger.info('Client stopped.')
+        self.state = State.STOPPED
+
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def stop(self):
+        """Exits client execution (also from signal handlers and other threads)."""
+        super().stop()
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._changed.set)
+
+    async def _wait_for_change(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
+
+    def _datagram_received(self, buffer):
+        if self.state is State.STARTING:
+            _logger.debug('Received buffer {!r}.'.format(buffer))
+            if MSG_IDENTIFIED in buffer:
+                _logger.debug('Server accepted connection.')
+                self.state = State.RUNNING
+                self._changed.set()
+
+        elif self.state is State.RUNNING:
+            try:
+                buffer = self._handle_server_msg(buffer)
+            except Exception as ex:
+                # stop and raise it from run_async, as the blocking client would
+                self._error = ex
+                self.stop()
+                return
+
+            if buffer is not None and self.transport is not None:
+                self.transport.sendto(buffer)
+
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    """Forwards the datagrams of the server to an AsyncClient."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        self.client._datagram_received(data)
+
+    def error_received(self, exc):
+        # e.g. the server is not listening yet while registering
+        _logger.debug('Communication with server failed: {}.'.format(exc))
+
+
+async def gather_clients(clients):
+    """Coroutine running all the (asynchronous) clients concurrently."""
+    await asyncio.gather(*[c.run_async() for c in clients])
+
+
+def run_clients(clients):
+    """Runs the given AsyncClients on a new event loop, until all of them stop.
+
+    Not used by run.py, which runs a single blocking Client.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        task = loop.create_task(gather_clients(clients))
+        try:
+            loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            _logger.info('User requested shutdown.')
+            for client in clients:
+                client.stop()
+            loop.run_until_complete(task)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
 class State(enum.Enum):
     """The runtime state of the racing client."""
 
@@ -209,6 +390,15 @@ class Serializer:
 
         return ''.join(elements).encode()
 
+    @staticmethod
+    def encode_command(command):
+        """Encodes a car command (same bytes as encoding its actuator_dict)."""
+        values = (command.accelerator, command.brake, command.gear,
+                  command.steering, command.focus, command.meta)
+        if None in values:
+            return Serializer.encode(command.actuator_dict)
+        return COMMAND_TEMPLATE.format(*values).encode()
+
     @staticmethod
     def decode(buff):
         """
@@ -249,3 +439,56 @@ class Serializer:
             pos = end + 1
 
         return d
+
+
+class SensorDecoder:
+    """Decoder of sensor packets into a float64 array, without intermediate dictionary.
+
+    Every field of the layout has a fixed position in the array (see offsets),
+    e.g. the 19 track sensors are array[offsets['track']], which is the array
+    layout of car.State. Packets with the expected layout are parsed with a
+    single split, the others fall back to Serializer.decode; fields that are
+    missing or have the wrong number of values are set to NaN.
+
+    Attributes:
+        layout: Tuple of (key, number of values) pairs, in packet order.
+        offsets: Dictionary of the array slice of each key.
+        size: Length of the decoded array.
+        array: Default output array, overwritten by every decode.
+    """
+
+    def __init__(self, layout=SENSOR_LAYOUT):
+        self.layout = layout
+        self.offsets, self.size = sensor_offsets(layout)
+
+        key_tokens = []
+        value_tokens = []
+        for key, size in layout:
+            key_tokens.append(len(key_tokens) + len(value_tokens))
+            value_tokens.extend(range(key_tokens[-1] + 1, key_tokens[-1] + 1 + size))
+
+        self.array = np.zeros(self.size)
+        self._num_tokens = len(key_tokens) + len(value_tokens)
+        self._keys = operator.itemgetter(*key_tokens)
+        self._values = operator.itemgetter(*value_tokens)
+        self._expected_keys = tuple(key.encode() for key, _ in layout)
+
+    def decode(self, buff, out=None):
+        """Parses a sensor packet into out (by default the decoder's array) and returns it."""
+        if out is None:
+            out = self.array
+
+        tokens = buff.replace(b')(', b' ').strip(b'()\x00').split(b' ')
+        if len(tokens) == self._num_tokens and \
+                self._keys(tokens) == self._expected_keys:
+            try:
+                out[:] = self._values(tokens)
+                return out
+            except ValueError:
+                pass
+
+        return self._decode_slow(buff, out)
+
+    def _decode_slow(self, buff, out):
+        sensor_dict = Serializer.decode(buff.rstrip(b'\x00'))
+        return fill_sensors(sensor_dict, out, self.layout)
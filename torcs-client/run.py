@@ -1,17 +1,21 @@
 #! /usr/bin/env python3
 
 from pytocl.main import main
+from pytocl.protocol import Client
 from driver1 import Driver1
 from driver2 import Driver2
 from my_driver import MyDriver
 from pytocl.driver import Driver
+import handoff
 import argparse
 import sys
 import traceback
 import signal
+import logging
 
 
 driver = None
+client = None
 
 
 def sigterm_handler(_signo, _stack_frame):
@@ -22,13 +26,51 @@ def sigterm_handler(_signo, _stack_frame):
     sys.exit(0)
 
 
+def sigusr1_handler(_signo, _stack_frame):
+    # in worker mode, stop the current race (e.g. the server timed out) and report its results
+    print('Race interrupted')
+    if client is not None:
+        client.stop()
+
+
 signal.signal(signal.SIGINT, sigterm_handler)
 signal.signal(signal.SIGTERM, sigterm_handler)
+signal.signal(signal.SIGUSR1, sigusr1_handler)
 
 registry = {'Driver1': Driver1,
            'Driver2': Driver2}
 
 
+def serve_jobs(sock, driver_type, hostname='localhost'):
+    """
+    Worker mode: races the networks received on the socket, one job at a time, reusing the same
+    process (and driver) until the other end closes the socket.
+    """
+    global driver, client
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)7s %(name)s %(message)s"
+    )
+    
+    while True:
+        job = handoff.recv_job(sock)
+        if job is None:
+            break
+        
+        net, port, unstuck, early_stop = job
+        if driver is None:
+            driver = registry[driver_type](handoff_socket=sock, unstuck=unstuck, net=net, early_stop=early_stop)
+        else:
+            driver.start_race(net, unstuck, early_stop)
+        
+        client = Client(hostname=hostname, port=port, driver=driver)
+        client.run()
+        client = None
+        
+        handoff.send_done(sock)
+
+
 if __name__ == '__main__':
     
     parser = argparse.ArgumentParser(
@@ -49,6 +91,19 @@ if __name__ == '__main__':
         type=str
     )
 
+    parser.add_argument(
+        '-s',
+        '--handoff_fd',
+        help='Inherited socket to receive the model from and send the results to (instead of -w and -o).',
+        type=int
+    )
+
+    parser.add_argument(
+        '--worker',
+        help='Keep running and race the jobs received on the --handoff_fd socket.',
+        action='store_true'
+    )
+
     parser.add_argument(
         '-d',
         '--driver',
@@ -64,6 +119,24 @@ if __name__ == '__main__':
         action='store_true'
     )
     
+    parser.add_argument(
+        '--stop_threshold',
+        help='Stop the race as soon as the driver cannot reach this fitness anymore (needs --timelimit).',
+        type=float
+    )
+
+    parser.add_argument(
+        '--timelimit',
+        help='Duration of the race considered by the fitness, in seconds.',
+        type=float
+    )
+
+    parser.add_argument(
+        '--fitness',
+        help='Python file containing the fitness function of the early stop (by default, the one of nn_evolve).',
+        type=str
+    )
+    
     args, _ = parser.parse_known_args()
     
     print(args.parameters_file)
@@ -71,8 +144,20 @@ if __name__ == '__main__':
     print(args.driver)
     
     
-    if args.parameters_file is not None:
-        driver = registry[args.driver](args.parameters_file, out_file=args.output_file, unstuck=args.unstuck)
+    if args.worker:
+        serve_jobs(handoff.from_fd(args.handoff_fd), args.driver)
+        sys.exit(0)
+    
+    early_stop = None
+    if args.stop_threshold is not None and args.timelimit is not None:
+        early_stop = (args.stop_threshold, args.timelimit, args.fitness)
+    
+    if args.handoff_fd is not None:
+        driver = registry[args.driver](handoff_socket=handoff.from_fd(args.handoff_fd), unstuck=args.unstuck,
+                                       early_stop=early_stop)
+    elif args.parameters_file is not None:
+        driver = registry[args.driver](args.parameters_file, out_file=args.output_file, unstuck=args.unstuck,
+                                       early_stop=early_stop)
     else:
         driver = Driver()
     
@@ -82,7 +167,7 @@ if __name__ == '__main__':
     except Exception as exc:
         traceback.print_exc()
 
-        if args.parameters_file is not None:
+        if isinstance(driver, MyDriver):
             driver.saveResults()
             
         raise
@@ -1,4 +1,4 @@
 #!/bin/bash
 
 
-python run.py $@
+exec python run.py "$@"
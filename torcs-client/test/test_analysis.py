@@ -3,15 +3,17 @@ import os
 import numpy as np
 import pytest
 
-from pytocl.analysis import DataLogReader
+from pytocl.analysis import DataLogReader, DataLogWriter
+from pytocl.car import Command, State
 
 
-@pytest.fixture(scope='module', autouse=True)
+@pytest.fixture(scope='module')
 def working_dir():
     moddir = os.path.dirname(__file__)
     os.chdir(os.path.join(moddir, 'resources'))
 
 
+@pytest.mark.usefixtures('working_dir')
 def test_data_log_reader_time():
     reader = DataLogReader('drivelog-2016-08-20-17-50-03.pickle')
     a = reader.array
@@ -25,6 +27,7 @@ def test_data_log_reader_time():
     assert a[10000] == 206.866
 
 
+@pytest.mark.usefixtures('working_dir')
 def test_data_log_reader():
     reader = DataLogReader('drivelog-2016-08-20-17-50-03.pickle',
                            ('angle', 'wheel_velocities', 'current_lap_time'),
@@ -39,3 +42,25 @@ def test_data_log_reader():
     assert a[0, 6] == -0.982
     assert a[0, 7] == 1
     assert a[0, 8] == 0.61104317802525454
+
+
+def test_data_log_writer_logs_each_tick(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writer = DataLogWriter()
+    path = writer.file.name
+
+    # the client decodes every tick into the same state
+    state = State()
+    command = Command()
+    for lap_time, angle in ((1.0, 0.3357), (1.02, 28.65)):
+        state.current_lap_time = lap_time
+        state.angle = angle
+        command.steering = angle / 100
+        writer.log(state, command)
+    writer.close()
+
+    a = DataLogReader(path, ('angle',), ('steering',)).array
+    assert a.shape == (2, 3)
+    assert np.allclose(a[:, 0], (1.0, 1.02))
+    assert np.allclose(a[:, 1], (0.3357, 28.65))
+    assert np.allclose(a[:, 2], (0.003357, 0.2865))
@@ -1,4 +1,8 @@
-from pytocl.car import State, Command
+import math
+
+import numpy as np
+
+from pytocl.car import State, Command, SENSOR_OFFSETS
 
 
 def test_command_array():
@@ -31,3 +35,44 @@ def test_state_array():
         3892.635153073154, 3943.4794278130635, 4090.970223435639, 4110.1872278843275,
         4.052
     )
+
+
+def _input_list(state, smaller):
+    inputs = [state.angle / 180.0, state.speed_x / 40.0, state.speed_y / 40.0]
+    for j in range(0, 19, 3 if smaller else 1):
+        if math.fabs(state.distance_from_center) > 1 or state.distances_from_edge[j] < 0:
+            inputs.append(-1)
+        else:
+            inputs.append(state.distances_from_edge[j] / 200.0)
+    inputs += [state.distance_from_center, state.z - 0.36, state.speed_z / 10.0]
+    return inputs
+
+
+def test_state_input_array():
+    s = State({'angle': '0.008838', 'speedX': '81.5135', 'speedY': '0.40771', 'speedZ': '-2.4422',
+               'trackPos': '0.126012', 'z': '0.336726',
+               'track': ['4.3701', '-1', '5.02757', '6.07753', '8.25773', '11.1429', '13.451',
+                         '16.712', '21.5022', '30.2855', '51.8667', '185.376', '69.9077', '-1',
+                         '12.6621', '8.2019', '6.5479', '5.82979', '5.63029']})
+
+    for smaller in (False, True):
+        inputs = s.to_input_array(smaller=smaller)
+        assert inputs.tolist() == _input_list(s, smaller)
+        # the buffer is reused
+        assert s.to_input_array(smaller=smaller) is inputs
+
+    s.distance_from_center = 1.5
+    assert s.sensors[SENSOR_OFFSETS['trackPos']] == [1.5]
+    assert s.to_input_array().tolist() == _input_list(s, False)
+    assert s.to_input_array()[3:22].tolist() == [-1] * 19
+
+
+def test_state_missing_values():
+    s = State({'angle': '0.008838', 'gear': '2'})
+    assert s.gear == 2
+    assert s.rpm is None
+    assert s.distances_from_edge is None
+
+    s.gear = 1
+    assert s.gear == 1
+    assert np.isnan(s.sensors).sum() == len(s.sensors) - 2
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from early_stop import EarlyStop, default_fitness
+
+
+def driver_state(duration, distance, laps=-1, damage=0, offroad_penalty=0.0,
+                 speed=20.0, tick=0.02):
+    """Counters of a MyDriver which raced 'duration' seconds at 'speed'."""
+    iterations = int(round(duration / tick))
+    return SimpleNamespace(iterations_count=iterations, time=0.0,
+                           curr_time=duration, distance=distance, laps=laps,
+                           distance_from_start=distance, damage=damage,
+                           offroad_penalty=offroad_penalty,
+                           avg_speed=speed * iterations)
+
+
+def test_bound_is_reached_at_full_speed():
+    policy = EarlyStop(threshold=0.0, timelimit=60.0, max_speed=20.0)
+    driver = driver_state(30.0, 600.0)
+
+    row = policy.optimistic_results(driver)
+    assert row[0] == 60.0
+    assert row[1] == 1200.0
+    assert abs(row[6] - 20.0) < 1e-9
+    assert abs(policy.upper_bound(driver)
+               - default_fitness(*row)) < 1e-9
+
+
+def test_hopeless_race_is_stopped():
+    # stuck against a wall with a lot of damage
+    driver = driver_state(50.0, 100.0, damage=20000, offroad_penalty=2500.0,
+                          speed=0.0)
+
+    assert EarlyStop(threshold=500.0, timelimit=60.0)(driver)
+    assert not EarlyStop(threshold=-1e6, timelimit=60.0)(driver)
+    # nothing to decide before the first step
+    assert not EarlyStop(threshold=500.0, timelimit=60.0)(
+        driver_state(0.0, 0.0))
+
+
+def test_fitness_file(tmp_path):
+    path = tmp_path / 'fitness.py'
+    path.write_text('def evaluate(duration, distance, laps, distance_from_start,'
+                    ' damage, penalty, avg_speed):\n'
+                    '    return distance - damage\n')
+
+    policy = EarlyStop.from_spec((1000.0, 60.0, str(path)))
+    driver = driver_state(55.0, 500.0, damage=100)
+    policy.max_speed = 50.0
+
+    # at most 500 + 5 * 50 m can be raced by the time limit
+    assert policy.upper_bound(driver) == 650.0
+    assert policy(driver)
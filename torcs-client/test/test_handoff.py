@@ -0,0 +1,66 @@
+import os
+import signal
+import socket
+from types import SimpleNamespace
+
+import handoff
+from my_driver import MyDriver
+
+
+def test_model_roundtrip():
+    parent, child = socket.socketpair()
+    handoff.send_model(parent, {'weights': [0.5, -1.0]})
+    assert handoff.recv_model(child) == {'weights': [0.5, -1.0]}
+
+
+def test_results_last_frame_wins():
+    parent, child = socket.socketpair()
+    handoff.send_results(child, [[1, 2, 3, 4, 5, 6, 7]])
+    handoff.send_results(child, [[1, 2, 3, 4, 5, 6, 7], [10.5, 100.25, 1, 50, 0, 0.125, 20]])
+    child.close()
+
+    assert handoff.recv_results(parent) == [[1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+                                            [10.5, 100.25, 1.0, 50.0, 0.0, 0.125, 20.0]]
+
+
+def test_no_results():
+    parent, child = socket.socketpair()
+    child.close()
+    assert handoff.recv_results(parent) is None
+
+    parent, child = socket.socketpair()
+    handoff.send_results(child, [])
+    child.close()
+    assert handoff.recv_results(parent) == []
+
+
+def test_job_roundtrip():
+    parent, child = socket.socketpair()
+    handoff.send_job(parent, {'weights': [0.5]}, 3002, True, (100.0, 60.0, None))
+    handoff.send_job(parent, {'weights': [1.5]}, 3001, False)
+    parent.close()
+
+    assert handoff.recv_job(child) == ({'weights': [0.5]}, 3002, True, (100.0, 60.0, None))
+    assert handoff.recv_job(child) == ({'weights': [1.5]}, 3001, False, None)
+    assert handoff.recv_job(child) is None
+
+
+def test_sigterm_waits_for_the_results_being_sent(monkeypatch):
+    parent, child = socket.socketpair()
+    driver = SimpleNamespace(handoff_socket=child, out_file=None, results=[[1, 2, 3, 4, 5, 6, 7]])
+    events = []
+
+    def send_results(sock, rows):
+        # SIGTERM arrives in the middle of the frame
+        events.append('start')
+        os.kill(os.getpid(), signal.SIGTERM)
+        events.append('end')
+
+    previous = signal.signal(signal.SIGTERM, lambda signo, frame: events.append('handler'))
+    monkeypatch.setattr(handoff, 'send_results', send_results)
+    try:
+        MyDriver.saveResults(driver)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+    assert events == ['start', 'end', 'handler']
@@ -1,6 +1,10 @@
+import socket
+import threading
 from unittest import mock
 
-from pytocl.protocol import Serializer, Client, State
+import math
+
+from pytocl.protocol import Serializer, SensorDecoder, Client, AsyncClient, State, run_clients
 from pytocl.driver import Driver
 from pytocl.car import State as CarState, Command
 
@@ -83,6 +87,7 @@ def test_special_messages(mock_socket_ctor):
     mock_socket_ctor.return_value = mock_socket
     mock_driver = mock.MagicMock()
     mock_driver.range_finder_angles = Driver(False).range_finder_angles
+    mock_driver.on_restart.return_value = False
     client = Client(driver=mock_driver)
     assert client.state is State.STOPPED
 
@@ -98,6 +103,74 @@ def test_special_messages(mock_socket_ctor):
     assert mock_driver.on_shutdown.call_count == 1
 
 
+@mock.patch('pytocl.protocol.socket.socket')
+def test_restart_requested_by_driver(mock_socket_ctor):
+    mock_socket = mock.MagicMock()
+    mock_socket_ctor.return_value = mock_socket
+    mock_driver = mock.MagicMock()
+    mock_driver.range_finder_angles = Driver(False).range_finder_angles
+    mock_driver.on_restart.return_value = True
+    client = Client(driver=mock_driver)
+
+    mock_socket.recvfrom = mock.MagicMock(side_effect=[(b'***identified***', None),
+                                                       (b'***restart***', None),
+                                                       (b'***identified***', None)])
+
+    # the driver ends its race instead of racing again
+    client.run()
+    assert client.state is State.STOPPED
+    assert mock_socket.recvfrom.call_count == 2
+    assert mock_driver.on_shutdown.call_count == 1
+
+
+SENSOR_BUFFER = b'(angle 0.00585968)(curLapTime -0.982)(damage 0)(distFromStart 972.935)' \
+                b'(distRaced 0)(fuel 94)(gear 0)(lastLapTime 0)(opponents' + b' 200' * 36 + b')' \
+                b'(racePos 1)(rpm 942.478)(speedX 0.0206057)(speedY 0.000264679)(speedZ -0.000624058)' \
+                b'(track' + b' 10.0' * 19 + b')(trackPos -0.000529385)(wheelSpinVel 0 0 0 0)' \
+                b'(z 0.355918)(focus -1 -1 -1 -1 -1)'
+
+
+def _fake_server(server_socket, steps):
+    """Accepts one client, exchanges steps sensor/command messages and shuts it down."""
+    buffer, address = server_socket.recvfrom(1000)
+    assert buffer.startswith(b'SCR-')
+    server_socket.sendto(b'***identified***', address)
+    for _ in range(steps):
+        server_socket.sendto(SENSOR_BUFFER, address)
+        buffer, _ = server_socket.recvfrom(1000)
+        assert b'(accel' in buffer
+    server_socket.sendto(b'***shutdown***', address)
+    server_socket.close()
+
+
+def test_async_clients_share_one_loop():
+    servers = []
+    clients = []
+    drivers = []
+    for _ in range(3):
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server_socket.bind(('localhost', 0))
+        server_socket.settimeout(5)
+        thread = threading.Thread(target=_fake_server, args=(server_socket, 5))
+        thread.start()
+        servers.append(thread)
+
+        mock_driver = mock.MagicMock()
+        mock_driver.range_finder_angles = Driver(False).range_finder_angles
+        mock_driver.drive.return_value = Command()
+        drivers.append(mock_driver)
+        clients.append(AsyncClient(port=server_socket.getsockname()[1], driver=mock_driver))
+
+    run_clients(clients)
+
+    for thread in servers:
+        thread.join()
+    for client, mock_driver in zip(clients, drivers):
+        assert client.state is State.STOPPED
+        assert mock_driver.drive.call_count == 5
+        assert mock_driver.on_shutdown.call_count == 1
+
+
 def test_buffer_regression_1():
     buffer = b'(angle 0.00585968)(curLapTime -0.982)(damage 0)(distFromStart 972.935)' \
              b'(distRaced 0)(fuel 94)(gear 0)(lastLapTime 0)(opponents 200 200 200 200 ' \
@@ -118,3 +191,40 @@ def test_encode_command():
     buffer = Serializer().encode(c.actuator_dict)
     assert b'(accel 0.0)' in buffer
     assert b'(clutch 0)' in buffer
+
+
+def test_sensor_decoder_matches_serializer():
+    buffer = SENSOR_BUFFER + b'\x00'
+    d = Serializer().decode(buffer)
+    decoder = SensorDecoder()
+    array = decoder.decode(buffer)
+
+    assert array is decoder.array
+    assert len(array) == decoder.size == 79
+    for key, offset in decoder.offsets.items():
+        expected = d[key] if isinstance(d[key], list) else [d[key]]
+        assert list(array[offset]) == [float(v) for v in expected]
+
+
+def test_sensor_decoder_unexpected_layout():
+    decoder = SensorDecoder()
+    array = decoder.decode(b'(speedX 81.5)(angle 0.5)(track 1 2 3)')
+
+    assert array[decoder.offsets['angle']][0] == 0.5
+    assert array[decoder.offsets['speedX']][0] == 81.5
+    # wrong number of values and missing fields:
+    assert all(math.isnan(v) for v in array[decoder.offsets['track']])
+    assert math.isnan(array[decoder.offsets['rpm']][0])
+
+
+def test_encode_command_template():
+    c = Command()
+    c.accelerator = 0.75
+    c.brake = 0.1
+    c.gear = -1
+    c.steering = -0.3333333333333333
+    assert Serializer.encode_command(c) == Serializer().encode(c.actuator_dict)
+
+    c.meta = 1
+    assert Serializer.encode_command(c).endswith(b'(meta 1)')
+    assert Serializer.encode_command(c) == Serializer().encode(c.actuator_dict)